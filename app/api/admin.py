@@ -0,0 +1,98 @@
+# app/api/admin.py
+from typing import Any, Dict, Literal
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+
+from app.core.memory_diagnostics import TracemallocSession, process_stats
+from app.core.settings import get_settings
+from app.db.session import engine
+from app.rag.processor import QueryCachingEmbeddings
+
+cfg = get_settings()
+
+# Snapshots, statistics, gc.get_objects() and collection counts can take seconds on a
+# large heap, so every endpoint here is a plain `def`: FastAPI runs it in its
+# threadpool instead of on the event loop.
+router = APIRouter(prefix="/admin/memory", tags=["admin"])
+
+tracemalloc_session = TracemallocSession(max_snapshots=cfg.MEMORY_SNAPSHOTS_KEPT)
+GroupBy = Literal["module", "package", "line"]
+
+
+def cache_sizes(request: Request) -> Dict[str, Any]:
+    """Entries held by each in-process cache and pool, next to its configured bound."""
+    sizes: Dict[str, Any] = {
+        "query_embedding_cache": {"size": len(QueryCachingEmbeddings._cache), "max": cfg.QUERY_EMBEDDING_CACHE_SIZE},
+        "db_pool": engine.pool.status(),
+    }
+    orchestrator = getattr(request.app.state, "rag_orchestrator", None)
+    if orchestrator is None:
+        return sizes
+    for name, attribute, bound in (
+        ("session_memory", "memory", "max_sessions"),
+        ("conversation_retrieval", "conversations", "max_conversations"),
+        ("persona_digests", "persona_digests", "max_users"),
+        ("session_summaries", "session_summaries", "max_sessions"),
+    ):
+        cache = getattr(orchestrator, attribute, None)
+        if cache is not None:
+            sizes[name] = {"size": len(cache), "max": getattr(cache, bound, None)}
+    processors = getattr(orchestrator, "_processors", {})
+    # One Chroma client and one embeddings client per namespace
+    sizes["chroma_collections"] = {p.namespace: p.vectordb._collection.count() for p in processors.values()}
+    return sizes
+
+
+@router.get("", status_code=status.HTTP_200_OK, response_model=dict)
+def memory_status(request: Request):
+    """Process RSS and GC counters, tracemalloc state and snapshots, and cache/pool sizes."""
+    return {"process": process_stats(), "tracemalloc": tracemalloc_session.status(), "caches": cache_sizes(request)}
+
+
+@router.post("/tracemalloc/start", status_code=status.HTTP_200_OK, response_model=dict)
+def start_tracemalloc(frames: int = Query(1, ge=1, le=50)):
+    """Starts tracing allocations (slows every allocation while on); `frames` is the stored traceback depth."""
+    tracemalloc_session.start(frames)
+    return tracemalloc_session.status()
+
+
+@router.post("/tracemalloc/stop", status_code=status.HTTP_200_OK, response_model=dict)
+def stop_tracemalloc():
+    tracemalloc_session.stop()
+    return tracemalloc_session.status()
+
+
+@router.get("/top", status_code=status.HTTP_200_OK, response_model=dict)
+def top_allocations(limit: int = Query(20, ge=1, le=500), group_by: GroupBy = "module"):
+    """Largest live allocation sites, grouped by module, top-level package or source line."""
+    try:
+        rows = tracemalloc_session.top(limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"group_by": group_by, "rows": rows}
+
+
+@router.post("/snapshots", status_code=status.HTTP_201_CREATED, response_model=dict)
+def take_snapshot():
+    try:
+        snapshot_id = tracemalloc_session.take_snapshot()
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"id": snapshot_id, "snapshots": tracemalloc_session.snapshots()}
+
+
+@router.get("/diff", status_code=status.HTTP_200_OK, response_model=dict)
+def diff_snapshots(
+    base: int,
+    compare: int | None = None,
+    limit: int = Query(20, ge=1, le=500),
+    group_by: GroupBy = "module",
+):
+    """What grew (or shrank) most between snapshot `base` and snapshot `compare` (default: now)."""
+    try:
+        rows = tracemalloc_session.diff(base, compare, limit, group_by)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e.args[0]))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"base": base, "compare": compare, "group_by": group_by, "rows": rows}
@@ -1,9 +1,27 @@
 import asyncio
+import json
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from starlette.websockets import WebSocketDisconnect
 
+from app.api.history import history_page, record_turn
+from app.api.memory import SessionOwnershipError
 from app.api.orchestrator import Orchestrator, get_orchestrator
+from app.auth.router import user_from_token
 from app.core.settings import get_settings
 
 # Load configuration
@@ -12,17 +30,22 @@ cfg = get_settings()
 # Limits from settings
 _MAX_MSG = cfg.MAX_MESSAGE_LENGTH
 _ASR_TIMEOUT = cfg.ASR_TIMEOUT_SECONDS
+_WS_AUTH_TIMEOUT = 10.0  # seconds a WebSocket client gets to send its auth frame
 
 # Router without auth dependency
 router = APIRouter(tags=["chat"])
+# WebSocket routes authenticate the connection themselves (see chat_socket)
+ws_router = APIRouter(tags=["chat"])
 
 
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=_MAX_MSG)
+    session_id: str | None = None  # conversation id; enables retrieval reuse across turns
 
 
 class ChatResponse(BaseModel):
     reply: str
+    session_id: str | None = None
 
 
 @router.post(
@@ -32,15 +55,20 @@ class ChatResponse(BaseModel):
 )
 async def chat_text(
     req: ChatRequest,
+    request: Request,
+    background_tasks: BackgroundTasks,
     orchestrator: Orchestrator = Depends(get_orchestrator),
 ):
     """
     Accepts a user message, routes through the Orchestrator (crisis vs RAG),
     and returns a single reply.
     """
+    # Set by the auth dependency in create_app(); absent when SKIP_AUTH is on
+    user = getattr(request.state, "user", None)
+    user_id = str(user.id) if user is not None else None
     try:
         reply = await asyncio.wait_for(
-            orchestrator.answer(req.message),
+            orchestrator.answer(req.message, user_id=user_id, session_id=req.session_id),
             timeout=_ASR_TIMEOUT,
         )
     except asyncio.TimeoutError:
@@ -48,7 +76,220 @@ async def chat_text(
             status_code=status.HTTP_504_GATEWAY_TIMEOUT,
             detail="LLM orchestrator timed out",
         )
+    except SessionOwnershipError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
     # The 'reply' variable from orchestrator.answer() is a dictionary like {"reply": "actual_message"}.
     # We need to extract the string value for the ChatResponse model.
     actual_reply_string = reply.get("reply", "Error: No reply content found.")
-    return ChatResponse(reply=actual_reply_string)
+    if req.session_id and cfg.CHAT_HISTORY_ENABLED:
+        # Stored after the response is sent, so the write adds no latency to the turn
+        background_tasks.add_task(record_turn, req.session_id, user_id, req.message, actual_reply_string)
+    return ChatResponse(reply=actual_reply_string, session_id=req.session_id)
+
+
+def _ndjson(item: dict) -> bytes:
+    return (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _relay(
+    orchestrator: Orchestrator, message: str, user_id: str | None, session_id: str | None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs the turn in its own task and relays its chunks as `{"delta"}` items,
+    then `{"reply", "session_id"}`, or `{"error"}`. Each chunk must arrive
+    within ASR_TIMEOUT_SECONDS of the previous one; if the consumer goes away
+    or is cancelled, the task (and with it the upstream LLM call) is cancelled.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def produce() -> None:
+        try:
+            async for chunk in orchestrator.answer_stream(message, user_id=user_id, session_id=session_id):
+                await queue.put(chunk)
+        except SessionOwnershipError as e:
+            await queue.put(e)
+        except Exception as e:
+            logging.exception(f"Error while streaming a chat reply: {e}")
+            await queue.put(e)
+        await queue.put(done)
+
+    task = asyncio.create_task(produce())
+    parts = []
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=_ASR_TIMEOUT)
+            except asyncio.TimeoutError:
+                yield {"error": "LLM orchestrator timed out"}
+                return
+            if item is done:
+                break
+            if isinstance(item, SessionOwnershipError):
+                yield {"error": str(item)}
+                return
+            if isinstance(item, Exception):
+                yield {"error": "An unexpected error occurred. Please try again."}
+                return
+            parts.append(item)
+            yield {"delta": item}
+        yield {"reply": "".join(parts), "session_id": session_id}
+        if session_id and cfg.CHAT_HISTORY_ENABLED:
+            await record_turn(session_id, user_id, message, "".join(parts))
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def _stream_reply(
+    orchestrator: Orchestrator, message: str, user_id: str | None, session_id: str | None
+) -> AsyncIterator[bytes]:
+    async for item in _relay(orchestrator, message, user_id, session_id):
+        yield _ndjson(item)
+
+
+@router.post("/chat/stream", status_code=status.HTTP_200_OK)
+async def chat_stream(
+    req: ChatRequest,
+    request: Request,
+    orchestrator: Orchestrator = Depends(get_orchestrator),
+):
+    """
+    Like `/chat/text`, but streams the reply as NDJSON while it is generated:
+    `{"delta": "..."}` lines, then `{"reply": "<full text>", "session_id": ...}`,
+    or `{"error": "..."}` if the turn fails after the response has started.
+    """
+    user = getattr(request.state, "user", None)
+    user_id = str(user.id) if user is not None else None
+    if req.session_id:
+        try:
+            await orchestrator.memory.get(req.session_id, user_id)  # a 403 now, not an error line mid-stream
+        except SessionOwnershipError as e:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    return StreamingResponse(
+        _stream_reply(orchestrator, req.message, user_id, req.session_id), media_type="application/x-ndjson"
+    )
+
+
+@router.get("/chat/history", status_code=status.HTTP_200_OK, response_model=dict)
+async def chat_history(
+    request: Request,
+    session_id: str,
+    before: int | None = Query(None, description="`next_before` of the previous page; omit for the latest messages"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """One page of a conversation's messages (oldest first), newest page first; only the caller's own."""
+    user = getattr(request.state, "user", None)
+    return await history_page(session_id, str(user.id) if user is not None else None, before, limit)
+
+
+async def _authenticate_socket(websocket: WebSocket) -> str | None:
+    """
+    The user id for a chat WebSocket, or raises PermissionError. The token comes
+    from the Authorization header or, for clients that cannot set headers
+    (browsers), from a first `{"type": "auth", "token": "..."}` frame.
+    """
+    header = websocket.headers.get("authorization", "")
+    token = header[len("bearer ") :].strip() if header.lower().startswith("bearer ") else None
+    if token is None:
+        try:
+            frame = await asyncio.wait_for(websocket.receive_json(), timeout=_WS_AUTH_TIMEOUT)
+        except (asyncio.TimeoutError, ValueError):
+            raise PermissionError("Send {'type': 'auth', 'token': ...} first")
+        if isinstance(frame, dict) and frame.get("type") == "auth":
+            token = frame.get("token")
+    user = await user_from_token(token)
+    if user is None:
+        raise PermissionError("Not authenticated")
+    return str(user.id)
+
+
+@ws_router.websocket("/chat/ws")
+async def chat_socket(
+    websocket: WebSocket,
+    session_id: str | None = None,
+    orchestrator: Orchestrator = Depends(get_orchestrator),
+):
+    """
+    A chat conversation over one WebSocket, authenticated once when it opens.
+
+    The server sends `{"type": "ready", "session_id"}`; every turn after that
+    is client `{"type": "message", "message": "..."}`, answered with `delta`
+    frames and a closing `reply` (or `error`) frame, shaped like the
+    `/chat/stream` lines plus a "type". `{"type": "cancel"}` abandons the
+    answer in flight, cancelling the upstream LLM call, and is acknowledged
+    with `{"type": "cancelled"}`. Omit `session_id` to start a new conversation.
+    """
+    await websocket.accept()
+    user_id = None
+    if not get_settings().SKIP_AUTH:
+        try:
+            user_id = await _authenticate_socket(websocket)
+        except PermissionError as e:
+            await websocket.send_json({"type": "error", "error": str(e)})
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        except WebSocketDisconnect:
+            return
+    if session_id:
+        try:
+            await orchestrator.memory.get(session_id, user_id)  # refuse someone else's session up front
+        except SessionOwnershipError as e:
+            await websocket.send_json({"type": "error", "error": str(e)})
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+    session_id = session_id or uuid.uuid4().hex
+    send_lock = asyncio.Lock()  # frames come from both the receive loop and the answer task
+
+    async def send(frame: Dict[str, Any]) -> None:
+        async with send_lock:
+            await websocket.send_json(frame)
+
+    answering = False  # until the reply/error frame; the task may still be storing the turn after it
+
+    async def answer(message: str) -> None:
+        nonlocal answering
+        try:
+            async for item in _relay(orchestrator, message, user_id, session_id):
+                if "delta" not in item:
+                    answering = False
+                await send({"type": next(iter(item)), **item})
+        except (WebSocketDisconnect, RuntimeError) as e:  # the socket closed mid-answer
+            logging.info(f"Chat WebSocket closed while answering: {e!r}")
+
+    await send({"type": "ready", "session_id": session_id})
+    task: asyncio.Task | None = None
+    try:
+        while True:
+            try:
+                frame = await websocket.receive_json()
+            except ValueError:
+                await send({"type": "error", "error": "Frames must be JSON objects"})
+                continue
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == "cancel":
+                if answering and task is not None:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    task, answering = None, False
+                    await send({"type": "cancelled"})
+            elif kind == "message":
+                message = frame.get("message")
+                if answering:
+                    await send({"type": "error", "error": "An answer is still in progress; cancel it first"})
+                elif not isinstance(message, str) or not 1 <= len(message) <= _MAX_MSG:
+                    await send({"type": "error", "error": f"message must be 1-{_MAX_MSG} characters"})
+                else:
+                    if task is not None:
+                        await task  # the previous turn is being stored; keeps history in order
+                    answering = True
+                    task = asyncio.create_task(answer(message))
+            elif kind != "auth":  # a late auth frame (e.g. under SKIP_AUTH) is harmless
+                await send({"type": "error", "error": f"Unknown frame type: {kind!r}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if task is not None:
+            if answering:  # an abandoned connection must not keep paying for tokens nobody will read
+                task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,58 @@
+# app/api/history.py
+"""
+Chat transcript storage for paginated history.
+
+Session memory (app/api/memory.py) keeps only what the prompt needs; this
+keeps every message so clients can show a long conversation a page at a time
+instead of holding (and re-rendering) all of it. Pages are keyset-paginated
+on the autoincrement id, newest first, so fetching an older page costs the
+same however long the conversation is.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+
+from app.db.models import ChatMessageTable
+from app.db.session import AsyncSessionMaker
+
+
+async def record_turn(session_id: str, user_id: Optional[str], user_message: str, reply: str) -> None:
+    """Appends one user message and its reply; failures are logged, never raised into the chat turn."""
+    try:
+        async with AsyncSessionMaker() as session:
+            session.add_all(
+                [
+                    ChatMessageTable(session_id=session_id, user_id=user_id, role="user", content=user_message),
+                    ChatMessageTable(session_id=session_id, user_id=user_id, role="assistant", content=reply),
+                ]
+            )
+            await session.commit()
+    except Exception as e:
+        logging.error(f"Could not store chat history for session {session_id}: {e}")
+
+
+async def history_page(
+    session_id: str, user_id: Optional[str], before: Optional[int] = None, limit: int = 20
+) -> Dict[str, Any]:
+    """
+    The `limit` messages before id `before` (default: the latest), oldest first,
+    and `next_before`, the cursor for the page before this one (None at the start).
+    Only the caller's own messages are visible.
+    """
+    query = select(ChatMessageTable).where(ChatMessageTable.session_id == session_id)
+    query = query.where(
+        ChatMessageTable.user_id == user_id if user_id is not None else ChatMessageTable.user_id.is_(None)
+    )
+    if before is not None:
+        query = query.where(ChatMessageTable.id < before)
+    # One extra row tells whether an older page exists
+    query = query.order_by(ChatMessageTable.id.desc()).limit(limit + 1)
+    async with AsyncSessionMaker() as session:
+        rows = list((await session.execute(query)).scalars())
+    page = rows[:limit]
+    messages: List[Dict[str, Any]] = [
+        {"id": row.id, "role": row.role, "content": row.content, "created_at": row.created_at} for row in reversed(page)
+    ]
+    return {"session_id": session_id, "messages": messages, "next_before": page[-1].id if len(rows) > limit else None}
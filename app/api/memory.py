@@ -0,0 +1,198 @@
+# app/api/memory.py
+"""
+Bounded per-session conversation memory for Orchestrator.answer.
+
+Each session keeps a ring buffer of its last N turns plus a rolling summary
+of everything older. Turns that fall out of the buffer are folded into the
+summary asynchronously, so the prompt (and memory per session) stays the same
+size however long a therapy session runs. Idle sessions are evicted LRU, and
+can optionally be persisted to the DB and reloaded on the next turn.
+
+Session ids come from the client, so every session belongs to the user who
+started it: memory is keyed by (user_id, session_id), and another user
+asking for the same session id gets SessionOwnershipError.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core.metrics import counter
+from app.db.models import ChatSessionMemoryTable
+from app.db.session import AsyncSessionMaker
+
+Turn = Tuple[str, str]  # (role, content)
+MemoryKey = Tuple[Optional[str], str]  # (user_id, session_id)
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+memory_events = counter(
+    "dfm_session_memory_events_total",
+    "Session memory cache hits/misses, evictions and summary folds.",
+    ("event",),
+)
+
+
+class SessionOwnershipError(PermissionError):
+    """The session id belongs to another user."""
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Session {session_id} belongs to another user")
+        self.session_id = session_id
+
+
+def format_turns(turns: List[Turn]) -> str:
+    return "\n".join(f"{role}: {content}" for role, content in turns)
+
+
+@dataclass
+class SessionMemory:
+    max_turns: int
+    summary: str = ""
+    turns: Deque[Turn] = field(default_factory=deque)
+    # Turns pushed out of the buffer, waiting to be folded into the summary
+    pending: List[Turn] = field(default_factory=list)
+    summarizing: bool = False
+
+    def __post_init__(self) -> None:
+        self.turns = deque(self.turns, maxlen=self.max_turns)
+
+    def add(self, role: str, content: str) -> None:
+        if len(self.turns) == self.max_turns:
+            self.pending.append(self.turns[0])
+            # Never let the backlog grow unbounded if summarizing is slow or failing
+            del self.pending[: -self.max_turns]
+        self.turns.append((role, content))
+
+    def render(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        if self.turns:
+            parts.append(f"Recent conversation:\n{format_turns(list(self.turns))}")
+        return "\n\n".join(parts)
+
+
+class SessionMemoryStore:
+    def __init__(
+        self,
+        max_turns: int = 12,
+        max_sessions: int = 1000,
+        summary_max_chars: int = 1500,
+        summarizer: Optional[Summarizer] = None,
+        persist: bool = False,
+    ):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.summary_max_chars = summary_max_chars
+        self.summarizer = summarizer
+        self.persist = persist
+        self._sessions: "OrderedDict[MemoryKey, SessionMemory]" = OrderedDict()
+        self._owners: Dict[str, Optional[str]] = {}  # session_id -> user_id, for the sessions in _sessions
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def get(self, session_id: str, user_id: Optional[str] = None) -> SessionMemory:
+        """The memory of `user_id`'s session; raises SessionOwnershipError if another user started it."""
+        key = (user_id, session_id)
+        memory = self._sessions.get(key)
+        if memory is not None:
+            self._sessions.move_to_end(key)
+            memory_events.inc(event="hit")
+            return memory
+        if self._owners.get(session_id, user_id) != user_id:
+            raise SessionOwnershipError(session_id)
+
+        memory_events.inc(event="miss")
+        memory = (await self._load(key) if self.persist else None) or SessionMemory(self.max_turns)
+        if self._owners.get(session_id, user_id) != user_id:  # claimed by another user while loading
+            raise SessionOwnershipError(session_id)
+        self._sessions[key] = memory
+        self._owners[session_id] = user_id
+        while len(self._sessions) > self.max_sessions:
+            evicted_key, evicted = self._sessions.popitem(last=False)
+            del self._owners[evicted_key[1]]
+            memory_events.inc(event="evict")
+            if self.persist:
+                self._spawn(self._save(evicted_key, evicted))
+        return memory
+
+    async def render(self, session_id: str, user_id: Optional[str] = None) -> str:
+        return (await self.get(session_id, user_id)).render()
+
+    async def add_turn(self, session_id: str, user_message: str, reply: str, user_id: Optional[str] = None) -> None:
+        key = (user_id, session_id)
+        memory = await self.get(session_id, user_id)
+        memory.add("user", user_message)
+        memory.add("assistant", reply)
+        if memory.pending and not memory.summarizing:
+            memory.summarizing = True
+            self._spawn(self._fold(key, memory))
+        elif self.persist:
+            self._spawn(self._save(key, memory))
+
+    async def _fold(self, key: MemoryKey, memory: SessionMemory) -> None:
+        """Folds overflowed turns into the rolling summary (runs in the background)."""
+        try:
+            while memory.pending:
+                batch, memory.pending = memory.pending, []
+                if self.summarizer is None:
+                    continue  # no summarizer: overflowed turns are simply dropped
+                summary = await self.summarizer(memory.summary, batch)
+                memory.summary = summary.strip()[: self.summary_max_chars]
+                memory_events.inc(event="fold")
+        except Exception as e:
+            logging.error(f"Rolling summary update failed for session {key[1]}: {e}")
+        finally:
+            memory.summarizing = False
+        if self.persist:
+            await self._save(key, memory)
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self) -> None:
+        """Waits for background summary/persist tasks (shutdown and tests)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def _load(self, key: MemoryKey) -> Optional[SessionMemory]:
+        user_id, session_id = key
+        try:
+            async with AsyncSessionMaker() as session:
+                row = await session.get(ChatSessionMemoryTable, session_id)
+        except Exception as e:
+            logging.error(f"Could not load session memory {session_id}: {e}")
+            return None
+        if row is None:
+            return None
+        if row.user_id != user_id:
+            raise SessionOwnershipError(session_id)
+        turns = [(t[0], t[1]) for t in row.turns or []]
+        return SessionMemory(self.max_turns, summary=row.summary or "", turns=deque(turns))
+
+    async def _save(self, key: MemoryKey, memory: SessionMemory) -> None:
+        user_id, session_id = key
+        try:
+            async with AsyncSessionMaker() as session:
+                row = await session.get(ChatSessionMemoryTable, session_id)
+                if row is not None and row.user_id != user_id:
+                    # Both users started the same new session id at once; the first one stored keeps it
+                    logging.warning(f"Not persisting session memory {session_id}: it belongs to another user")
+                    return
+                await session.merge(
+                    ChatSessionMemoryTable(
+                        session_id=session_id,
+                        user_id=user_id,
+                        summary=memory.summary,
+                        turns=[list(t) for t in memory.turns],
+                    )
+                )
+                await session.commit()
+        except Exception as e:
+            logging.error(f"Could not persist session memory {session_id}: {e}")
@@ -1,37 +1,133 @@
+import asyncio
 import logging
 import os
-from typing import Any, Dict, List, cast
+from typing import Any, AsyncIterator, Dict, List, Tuple, cast
 
 from fastapi import Request
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnablePassthrough
 from langchain_openai import ChatOpenAI
 
+from app.api.memory import SessionMemoryStore, SessionOwnershipError, Turn, format_turns
+from app.core.callbacks import LLMLatencyHandler
+from app.core.metrics import counter, histogram
 from app.core.settings import get_settings
+from app.core.tracing import Span, tracer
+from app.core.traffic import note_branch
+from app.core.usage import (
+    TokenUsageHandler,
+    estimate_tokens,
+    template_version,
+    usage,
+    usage_scope,
+)
+from app.rag.conversation import (
+    ConversationRetrievalCache,
+    ConversationRetrievalState,
+    drop_duplicates,
+)
+from app.rag.gate import RetrievalGate, load_classifier
+from app.rag.persona import PersonaDigestCache
 from app.rag.processor import DocumentProcessor
+from app.rag.retrievers import (
+    AdaptiveRetriever,
+    HierarchicalSessionRetriever,
+    and_filter,
+)
+from app.rag.summaries import (
+    SessionSummaryCache,
+    order_chunks,
+    pack_groups,
+    summary_requests,
+)
 
 # Initialize settings once
 cfg = get_settings()
 
+chat_stage_seconds = histogram(
+    "dfm_chat_stage_seconds",
+    "Chat turn latency per stage: risk_detection, retrieval, prompt_render and answer (whole turn).",
+    ("stage",),
+)
+chat_branches = counter("dfm_chat_branch_total", "Chat turns by branch taken (crisis, light or rag).", ("branch",))
+
 
 class BranchingChain:
-    def __init__(self, risk_detector, crisis_chain, rag_chain):
+    def __init__(
+        self, risk_detector, crisis_chain, rag_chain, retrieval_gate=None, light_chain=None, template_versions=None
+    ):
         self.risk_detector = risk_detector
         self.crisis_chain = crisis_chain
         self.rag_chain = rag_chain
+        # Optional: turns the gate rejects (small talk) skip retrieval and use light_chain instead
+        self.retrieval_gate = retrieval_gate
+        self.light_chain = light_chain
+        # branch -> prompt template version, used to label token usage
+        self.template_versions = template_versions or {}
 
     async def ainvoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        with tracer.span("BranchingChain.ainvoke") as span:
+            return await self._route(inputs, span)
+
+    def _take(self, branch: str, span: Span | None) -> RunnableConfig | None:
+        chat_branches.inc(branch=branch)
+        note_branch(branch)
+        if span is not None:
+            span.set_attribute("dfm.branch", branch)
+        return tracer.langchain_config()  # per-runnable child spans when this trace is sampled
+
+    def _plan(self, inputs: Dict[str, Any], span: Span | None) -> Tuple[str, Any, Dict[str, Any]]:
+        """Picks the branch for this turn: (branch, sub-chain, sub-chain inputs)."""
         query = inputs.get("query", "")  # Assuming 'query' is the key for user message
-        if self.risk_detector(query):
-            # Crisis chain might expect 'query'
-            return await self.crisis_chain.ainvoke({"query": query, "context": []})  # Provide empty context if needed
-        else:
-            # RAG chain might expect 'input' or 'query' and 'context'
-            # Ensure inputs are correctly mapped
-            return await self.rag_chain.ainvoke({"input": query, "context": []})  # Provide empty context if needed
+        # Every branch gets the session history: a short "yes" or "no" means nothing without the question before it
+        history = inputs.get("history", "")
+        with chat_stage_seconds.time(stage="risk_detection"):
+            at_risk = self.risk_detector(query)
+        if at_risk:
+            # Crisis chain might expect 'query'; provide empty context if needed
+            return "crisis", self.crisis_chain, {"query": query, "context": [], "history": history}
+        elif (
+            self.retrieval_gate is not None
+            and self.light_chain is not None
+            and not self.retrieval_gate.needs_retrieval(query)
+        ):
+            # Small talk: no embedding, no vector search, no context stuffing
+            return "light", self.light_chain, {"input": query, "history": history}
+        # RAG chain might expect 'input' or 'query' and 'context'
+        # Ensure inputs are correctly mapped
+        return (
+            "rag",
+            self.rag_chain,
+            {
+                "input": query,
+                "context": [],  # Provide empty context if needed
+                "user_id": inputs.get("user_id"),
+                "session_id": inputs.get("session_id"),
+                "history": history,
+            },
+        )
+
+    async def _route(self, inputs: Dict[str, Any], span: Span | None) -> Dict[str, Any]:
+        branch, chain, payload = self._plan(inputs, span)
+        config = self._take(branch, span)
+        with usage_scope(branch=branch, template=self.template_versions.get(branch)):
+            result = await chain.ainvoke(payload, config=config)
+        return {"answer": result} if branch == "light" else result
+
+    async def astream(self, inputs: Dict[str, Any]) -> AsyncIterator[str]:
+        """Like `ainvoke`, but yields the reply text chunk by chunk as the LLM produces it."""
+        with tracer.span("BranchingChain.astream") as span:
+            branch, chain, payload = self._plan(inputs, span)
+            config = self._take(branch, span)
+            with usage_scope(branch=branch, template=self.template_versions.get(branch)):
+                async for chunk in chain.astream(payload, config=config):
+                    # Crisis and light chains stream strings; the RAG chain streams {"answer": ...} deltas
+                    text = chunk if isinstance(chunk, str) else chunk.get("answer") or chunk.get("result")
+                    if isinstance(text, str) and text:
+                        yield text
 
 
 class Orchestrator:
@@ -44,20 +140,65 @@ class Orchestrator:
             model=self.settings.LLM_MODEL,
             temperature=self.settings.LLM_TEMPERATURE,
             api_key=self.settings.OPENAI_API_KEY,
+            base_url=self.settings.OPENAI_BASE_URL,
+            max_retries=self.settings.OPENAI_MAX_RETRIES,
+            # time-to-first-token / total per model, and token usage for cost accounting
+            callbacks=[LLMLatencyHandler(), TokenUsageHandler(usage)],
         )
         # Initialize chains (can be overridden by mocks in tests)
         self._crisis_chain = self._build_crisis_chain()
         self._rag_chain = self._build_rag_chain()  # Placeholder, RagOrchestrator will build the real one
-        self.chain = BranchingChain(self._detect_risk, self._crisis_chain, self._rag_chain)
+        self.chain = BranchingChain(
+            self._detect_risk, self._crisis_chain, self._rag_chain, template_versions=self.template_versions
+        )
 
-    async def answer(self, message: str) -> Dict[str, Any]:
+        # Per-session memory: last N turns verbatim + a rolling summary of older ones
+        self._memory_summary_chain = (
+            ChatPromptTemplate.from_template(
+                "Update the running summary of a supportive conversation between a user and their future self. "
+                "Keep what matters emotionally and any commitments made, in under 150 words.\n\n"
+                "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+            )
+            | self.llm
+            | StrOutputParser()
+        )
+        self.memory = SessionMemoryStore(
+            max_turns=self.settings.SESSION_MEMORY_TURNS,
+            max_sessions=self.settings.SESSION_MEMORY_MAX_SESSIONS,
+            summary_max_chars=self.settings.SESSION_MEMORY_SUMMARY_MAX_CHARS,
+            summarizer=self._summarize_memory,
+            persist=self.settings.SESSION_MEMORY_PERSIST,
+        )
+
+    async def _summarize_memory(self, summary: str, turns: List[Turn]) -> str:
+        with usage_scope(branch="memory"):
+            return cast(
+                str,
+                await self._memory_summary_chain.ainvoke(
+                    {"summary": summary or "(none)", "turns": format_turns(turns)}
+                ),
+            )
+
+    async def answer(self, message: str, user_id: str | None = None, session_id: str | None = None) -> Dict[str, Any]:
+        with chat_stage_seconds.time(stage="answer"), usage_scope(user_id=user_id):
+            return await self._answer(message, user_id, session_id)
+
+    async def _answer(self, message: str, user_id: str | None, session_id: str | None) -> Dict[str, Any]:
         try:
+            history = await self.memory.render(session_id, user_id) if session_id else ""
             # BranchingChain will route to the appropriate sub-chain
             # Ensure the input dictionary keys match what BranchingChain expects
-            result = await self.chain.ainvoke({"query": message, "input": message})
+            result = await self.chain.ainvoke(
+                {"query": message, "input": message, "user_id": user_id, "session_id": session_id, "history": history}
+            )
             # The output key might be 'answer' from RAG or 'result' from Crisis
             reply_content = result.get("answer") or result.get("result", "No specific reply found.")
+            if session_id:
+                # Older turns are folded into the rolling summary in the background
+                await self.memory.add_turn(session_id, message, cast(str, reply_content), user_id=user_id)
             return {"reply": cast(str, reply_content)}
+        except SessionOwnershipError:
+            raise  # the caller answers 403: not an error of the chain
         except RuntimeError as e:
             logging.error(f"Error during chain invocation: {e}")
             return {"reply": "I’m sorry, I’m unable to answer that right now. Please try again later."}
@@ -65,6 +206,38 @@ class Orchestrator:
             logging.exception(f"Unexpected error in Orchestrator.answer: {e}")
             return {"reply": "An unexpected error occurred. Please try again."}
 
+    async def answer_stream(
+        self, message: str, user_id: str | None = None, session_id: str | None = None
+    ) -> AsyncIterator[str]:
+        """
+        Yields the reply in chunks as they are generated. Errors before the first
+        chunk yield the same apology as `answer`; later ones are raised, since
+        part of the reply has already been sent, as is SessionOwnershipError.
+        """
+        with chat_stage_seconds.time(stage="answer"), usage_scope(user_id=user_id):
+            parts: List[str] = []
+            try:
+                history = await self.memory.render(session_id, user_id) if session_id else ""
+                async for chunk in self.chain.astream(
+                    {
+                        "query": message,
+                        "input": message,
+                        "user_id": user_id,
+                        "session_id": session_id,
+                        "history": history,
+                    }
+                ):
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                if parts or isinstance(e, SessionOwnershipError):
+                    raise
+                logging.exception(f"Unexpected error in Orchestrator.answer_stream: {e}")
+                yield "I’m sorry, I’m unable to answer that right now. Please try again later."
+                return
+            if session_id:
+                await self.memory.add_turn(session_id, message, "".join(parts), user_id=user_id)
+
     def _load_prompts(self) -> None:
         """Loads system and crisis prompts based on APP_DEFAULT_LANGUAGE."""
         lang = self.settings.APP_DEFAULT_LANGUAGE
@@ -84,13 +257,13 @@ class Orchestrator:
                     f"Crisis prompt for language '{lang}' not found. Falling back to generic 'crisis_prompt.md'."
                 )
             else:
-                self.crisis_prompt_template_str = "You are a crisis responder. Respond with empathy and provide resources. Context: {context} Query: {query}"
+                self.crisis_prompt_template_str = "You are a crisis responder. Respond with empathy and provide resources. Context: {context} Conversation so far: {history} Query: {query}"
                 logging.warning(
                     f"Neither '{crisis_prompt_path_lang}' nor '{crisis_prompt_path_generic}' found. Using hardcoded default crisis prompt."
                 )
         except Exception as e:
             logging.error(f"Error loading crisis prompt: {e}")
-            self.crisis_prompt_template_str = "You are a crisis responder. Respond with empathy and provide resources. Context: {context} Query: {query}"
+            self.crisis_prompt_template_str = "You are a crisis responder. Respond with empathy and provide resources. Context: {context} Conversation so far: {history} Query: {query}"
 
         try:
             system_prompt_path_lang = os.path.join(template_dir, f"system_prompt.{lang}.md")
@@ -118,6 +291,23 @@ class Orchestrator:
         # For type hinting and instantiation
         self.crisis_prompt_template = ChatPromptTemplate.from_template(self.crisis_prompt_template_str)
         self.system_prompt_template = ChatPromptTemplate.from_template(self.system_prompt_template_str)
+        self.template_versions = {
+            "crisis": template_version("crisis_prompt", self.crisis_prompt_template_str),
+            "rag": template_version("system_prompt", self.system_prompt_template_str),
+        }
+
+    def _load_template_str(self, name: str, default: str) -> str:
+        """Loads templates/{name}.{lang}.md, then templates/{name}.md, else returns `default`."""
+        lang = self.settings.APP_DEFAULT_LANGUAGE
+        for path in (os.path.join("templates", f"{name}.{lang}.md"), os.path.join("templates", f"{name}.md")):
+            try:
+                if os.path.exists(path):
+                    with open(path, "r", encoding="utf-8") as f:
+                        return f.read()
+            except Exception as e:
+                logging.error(f"Error loading prompt '{path}': {e}")
+        logging.warning(f"No template found for '{name}'. Using hardcoded default.")
+        return default
 
     def _load_risk_keywords(self) -> None:
         """Loads risk keywords based on language. For now, only English."""
@@ -142,9 +332,10 @@ class Orchestrator:
         # For now, it just uses the prompt and LLM.
         return (
             {
-                "query": RunnablePassthrough(),
+                "query": RunnableLambda(lambda x: x["query"]),
                 "context": RunnableLambda(lambda x: []),
-            }  # Pass query, provide empty context
+                "history": RunnableLambda(lambda x: x.get("history", "")),
+            }  # Pass query and session history, provide empty context
             | self.crisis_prompt_template
             | self.llm
             | StrOutputParser()
@@ -176,17 +367,73 @@ class RagOrchestrator(Orchestrator):
         self.plan_db = DocumentProcessor(namespace=self.settings.CHROMA_NAMESPACE_PLAN)
         self.session_db = DocumentProcessor(namespace=self.settings.CHROMA_NAMESPACE_SESSION)
         self.future_db = DocumentProcessor(namespace=self.settings.CHROMA_NAMESPACE_FUTURE)
+        self.session_summary_db = DocumentProcessor(namespace=self.settings.CHROMA_NAMESPACE_SESSION_SUMMARY)
+
+        # Stable per-user persona prefix, rebuilt when the user's future_me docs are re-ingested (or it expires)
+        self.persona_digests = PersonaDigestCache(
+            self.future_db,
+            max_users=self.settings.PERSONA_DIGEST_CACHE_SIZE,
+            max_chars=self.settings.PERSONA_DIGEST_MAX_CHARS,
+            ttl_seconds=self.settings.PERSONA_DIGEST_TTL_SECONDS,
+        )
+
+        self._processors = {
+            p.namespace: p
+            for p in (self.theory_db, self.plan_db, self.session_db, self.future_db, self.session_summary_db)
+        }
+        self._future_retriever = self._get_combined_retriever()
+        # Follow-up turns in one conversation re-rank the previous candidates instead of searching again
+        self.conversations = ConversationRetrievalCache(
+            max_conversations=self.settings.RAG_CONVERSATION_CACHE_SIZE,
+            similarity_threshold=self.settings.RAG_CONVERSATION_REUSE_THRESHOLD,
+        )
 
         # Override the _rag_chain from the parent Orchestrator
         self._rag_chain = self._build_actual_rag_chain()
+
+        # Retrieval gate: small talk is answered from a lightweight prompt without retrieval
+        self.retrieval_gate = None
+        if self.settings.RETRIEVAL_GATE_ENABLED:
+            self.retrieval_gate = RetrievalGate(
+                max_words=self.settings.RETRIEVAL_GATE_MAX_WORDS,
+                classifier=load_classifier(self.settings.RETRIEVAL_GATE_CLASSIFIER),
+            )
+        self._light_chain = self._build_light_chain()
+
         # Re-initialize the main chain with the new _rag_chain
-        self.chain = BranchingChain(self._detect_risk, self._crisis_chain, self._rag_chain)
+        self.chain = BranchingChain(
+            self._detect_risk,
+            self._crisis_chain,
+            self._rag_chain,
+            retrieval_gate=self.retrieval_gate,
+            light_chain=self._light_chain,
+            template_versions=self.template_versions,
+        )
 
         # Summarization chain
-        self.summarize_prompt_template = ChatPromptTemplate.from_template(
-            "Summarize the following session data concisely: {input}"  # Using 'input' for consistency
-        )
+        summarize_template_str = "Summarize the following session data concisely: {input}"  # 'input' for consistency
+        self.summarize_prompt_template = ChatPromptTemplate.from_template(summarize_template_str)
+        self.template_versions["summary"] = template_version("summarize_prompt", summarize_template_str)
         self.summarize_chain = self.summarize_prompt_template | self.llm | StrOutputParser()
+        # Folds turns appended since the last call into an existing summary
+        self.summarize_update_chain = (
+            ChatPromptTemplate.from_template(
+                "Here is the current summary of a session:\n{summary}\n\n"
+                "Update it concisely with the following new session data: {input}"
+            )
+            | self.llm
+            | StrOutputParser()
+        )
+        # Map-reduce: merges partial summaries of consecutive parts of one long input
+        self.summarize_reduce_chain = (
+            ChatPromptTemplate.from_template(
+                "The following are summaries of consecutive parts of the same session. "
+                "Combine them into one concise summary: {input}"
+            )
+            | self.llm
+            | StrOutputParser()
+        )
+        self.session_summaries = SessionSummaryCache(max_sessions=self.settings.SESSION_SUMMARY_CACHE_SIZE)
 
     def _get_combined_retriever(self) -> BaseRetriever:
         # This is a conceptual example. LangChain's `CombinedRetriever`
@@ -197,20 +444,114 @@ class RagOrchestrator(Orchestrator):
         # from langchain.retrievers import MergerRetriever # Example
         # lotr = MergerRetriever(retrievers=[self.theory_db.vectordb.as_retriever(), self.plan_db.vectordb.as_retriever()])
         # return lotr
-        return self.future_db.vectordb.as_retriever()  # Placeholder
+        # Score-aware: k is chosen per query, and an unrelated query yields no context at all.
+        return AdaptiveRetriever(processor=self.future_db)  # Placeholder
+
+    def _build_light_chain(self):
+        """Prompt-only chain for turns the retrieval gate lets skip the vector search."""
+        template_str = self._load_template_str(
+            "smalltalk_prompt",
+            "You are the user's warm, hopeful future self. Conversation so far: {history} Reply briefly and kindly to: {input}",
+        )
+        self.template_versions["light"] = template_version("smalltalk_prompt", template_str)
+        return ChatPromptTemplate.from_template(template_str) | self.llm | StrOutputParser()
+
+    def _get_session_retriever(self, user_id: str) -> BaseRetriever:
+        """Summary index first, raw session_data only for the selected sessions of this user."""
+        return HierarchicalSessionRetriever(
+            summary_processor=self.session_summary_db,
+            session_processor=self.session_db,
+            max_sessions=self.settings.RAG_MAX_SUMMARY_SESSIONS,
+            metadata_filter={"user_id": user_id},
+        )
 
-    def _build_actual_rag_chain(self):
-        retriever = self._get_combined_retriever()
+    async def _persona_digest(self, user_id: str) -> str:
+        digest = self.persona_digests.peek(user_id)
+        if digest is None:
+            # Cache miss: building reads Chroma synchronously, keep it off the event loop
+            digest = await asyncio.to_thread(self.persona_digests.get, user_id)
+        return digest
+
+    async def _search(self, query: str, user_id: str | None) -> List[Document]:
+        if not user_id:
+            # Anonymous turn (e.g. SKIP_AUTH): fall back to searching future_me
+            return cast(List[Document], await self._future_retriever.ainvoke(query))
+        return cast(List[Document], await self._get_session_retriever(user_id).ainvoke(query))
+
+    def _with_embeddings(self, docs: List[Document]) -> List[Tuple[Document, List[float]]]:
+        """Looks up the stored vectors of retrieved chunks (by id) so later turns can re-rank locally."""
+        ids_by_namespace: Dict[str, List[str]] = {}
+        for doc in docs:
+            if doc.id and doc.metadata.get("namespace") in self._processors:
+                ids_by_namespace.setdefault(doc.metadata["namespace"], []).append(doc.id)
+        vectors: Dict[str, List[float]] = {}
+        for namespace, ids in ids_by_namespace.items():
+            vectors.update(self._processors[namespace].get_embeddings(ids))
+        return [(doc, vectors[doc.id]) for doc in docs if doc.id in vectors]
+
+    async def _retrieve_docs(self, query: str, user_id: str | None, session_id: str | None) -> List[Document]:
+        if not session_id:
+            return await self._search(query, user_id)
+
+        # Keyed by owner too: session ids come from the client and must not reach another user's chunks
+        conversation = (user_id, session_id)
+        query_embedding = await self.future_db.embeddings.aembed_query(query)  # cached for the search below
+        state = self.conversations.get(conversation)
+        if self.conversations.can_reuse(state, query_embedding):
+            # Follow-up on the same topic: re-rank the previous candidates instead of searching again
+            docs = self.conversations.rerank(
+                cast(ConversationRetrievalState, state),
+                query_embedding,
+                self.settings.RAG_RELEVANCE_THRESHOLD,
+                self.settings.RAG_SCORE_GAP,
+                self.settings.RAG_MIN_K,
+                self.settings.RAG_MAX_K,
+            )
+        else:
+            docs = await self._search(query, user_id)
+            candidates = await asyncio.to_thread(self._with_embeddings, docs)
+            self.conversations.store(conversation, query_embedding, candidates)
+        return docs
+
+    async def _retrieve_context(self, x: Dict[str, Any]) -> List[Document]:
+        with chat_stage_seconds.time(stage="retrieval"):
+            return await self._gather_context(x)
+
+    async def _gather_context(self, x: Dict[str, Any]) -> List[Document]:
+        user_id = str(x["user_id"]) if x.get("user_id") else None
+        history = (
+            [Document(page_content=x["history"], metadata={"source": "session_memory"})] if x.get("history") else []
+        )
+        docs_task = self._retrieve_docs(x["input"], user_id, x.get("session_id"))
+        if user_id:
+            digest, docs = await asyncio.gather(self._persona_digest(user_id), docs_task)
+            persona = [Document(page_content=digest, metadata={"source": "future_me_digest"})] if digest else []
+        else:
+            persona, docs = [], await docs_task
+        if self.settings.RAG_DEDUP_CONVERSATION_CHUNKS:
+            # Only against this prompt: earlier turns' chunks are not in it (session memory keeps just the text)
+            docs = drop_duplicates(docs, [doc.page_content for doc in persona + history])
+        return persona + history + docs
 
+    def _build_actual_rag_chain(self):
         def format_docs(docs: list[Document]) -> str:
             return "\n\n".join(doc.page_content for doc in docs)
 
-        rag_chain_from_docs = (
-            RunnablePassthrough.assign(context=(lambda x: format_docs(x["context"])))
-            | self.system_prompt_template
-            | self.llm
-            | StrOutputParser()
-        )
+        def render_prompt(x: Dict[str, Any]) -> Any:
+            with chat_stage_seconds.time(stage="prompt_render"):
+                # Prompt tokens each source adds through context stuffing (already billed in the LLM call)
+                for doc in x["context"]:
+                    source = doc.metadata.get("namespace") or doc.metadata.get("source", "unknown")
+                    usage.record(
+                        self.settings.LLM_MODEL,
+                        "context",
+                        estimate_tokens(doc.page_content),
+                        namespace=source,
+                        charge=False,
+                    )
+                return self.system_prompt_template.invoke({**x, "context": format_docs(x["context"])})
+
+        rag_chain_from_docs = RunnableLambda(render_prompt) | self.llm | StrOutputParser()
 
         rag_chain_with_source = RunnablePassthrough.assign(
             answer=rag_chain_from_docs,
@@ -218,48 +559,133 @@ class RagOrchestrator(Orchestrator):
         )
         # The main RAG chain that takes 'input' and retrieves 'context'
         return {
-            # "context": retriever, "input": RunnablePassthrough()
-            # FIX: Extract the 'input' key from the incoming dictionary before passing to the retriever
-            # The incoming dictionary to this part of the chain is {"query": ..., "input": ...}
-            # We want to pass the value of "input" to the retriever.
-            "context": RunnableLambda(lambda x: x["input"])
-            | retriever,  # Pass only the 'input' string to the retriever
-            "input": RunnablePassthrough(),  # Pass the original 'input' string through
+            # The incoming dictionary to this part of the chain is {"input": ..., "user_id": ..., "session_id": ...}
+            # Known users get their cached persona digest instead of a future_me vector search.
+            "context": RunnableLambda(self._retrieve_context),
+            "input": RunnableLambda(lambda x: x["input"]),  # Pass only the 'input' string through
         } | rag_chain_with_source
 
     async def summarize_session(self, session_id: str) -> str:
         """
-        Summarizes a session. For now, it's a placeholder.
-        In a real app, this would fetch session data (e.g., from session_db or another source)
-        and pass it to the summarization chain.
+        Summarizes a session's `session_data` chunks. An unchanged session is served
+        from its checkpoint; turns appended since the last call are folded into the
+        previous summary, so the cost follows the new turns, not the whole transcript.
         """
-        # Placeholder: In a real app, retrieve actual session documents
-        # For example: docs = self.session_db.query(f"session_id:{session_id}", k=10)
-        # For now, just use the session_id as input to the summarize_chain
-        logging.info(f"Summarizing session (placeholder): {session_id}")
+        with usage_scope(branch="summary", template=self.template_versions["summary"]):
+            summary, _ = await self._summarize_session(session_id)
+        return summary
+
+    async def _summarize_session(self, session_id: str) -> Tuple[str, str]:
+        """Returns (summary, outcome); outcome is one of empty, cached, incremental, full or error."""
+        logging.info(f"Summarizing session: {session_id}")
         try:
-            # Assuming the chain returns a dict with "output_text" or similar
-            response = await self.summarize_chain.ainvoke(
-                {"input": f"Data for session {session_id}..."}
-            )  # Pass as "input"
-            summary = response  # summarize_chain now directly returns string due to StrOutputParser
-            return cast(str, summary)
+            docs = order_chunks(await asyncio.to_thread(self.session_db.get_documents, {"session_id": session_id}))
+            if not docs:
+                return f"No session data found for {session_id}.", "empty"
+
+            checkpoint = self.session_summaries.get(session_id)
+            new_docs = checkpoint.new_chunks(docs) if checkpoint is not None else None
+            if checkpoint is not None and new_docs == []:
+                summary_requests.inc(outcome="cached")
+                return checkpoint.summary, "cached"
+            if checkpoint is not None and new_docs:
+                new_text = "\n\n".join(doc.page_content for doc in new_docs)
+                if estimate_tokens(new_text) > self.settings.SUMMARY_GROUP_MAX_TOKENS:
+                    new_text = await self._map_reduce_summarize([doc.page_content for doc in new_docs])
+                summary = await self.summarize_update_chain.ainvoke({"summary": checkpoint.summary, "input": new_text})
+                outcome = "incremental"
+            else:
+                # First call, or already-summarized turns were edited: rebuild from the whole transcript
+                summary = await self._map_reduce_summarize([doc.page_content for doc in docs])
+                outcome = "full"
+            summary_requests.inc(outcome=outcome)
         except Exception as e:
             logging.error(f"Error summarizing session {session_id}: {e}")
-            return f"Summary for {session_id} (unavailable)"
+            return f"Summary for {session_id} (unavailable)", "error"
+
+        self.session_summaries.store(session_id, cast(str, summary), docs)
+        await asyncio.to_thread(self._index_session_summary, session_id, cast(str, summary), docs)
+        return cast(str, summary), outcome
+
+    async def summarize_sessions(self, session_ids: List[str], concurrency: int) -> AsyncIterator[Dict[str, str]]:
+        """
+        Summarizes many sessions with at most `concurrency` in flight, yielding
+        {"session_id", "summary", "outcome"} as each one finishes. Sessions whose
+        checkpoint is still valid come back immediately as "cached".
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(session_id: str) -> Dict[str, str]:
+            async with semaphore:
+                with usage_scope(branch="summary", template=self.template_versions["summary"]):
+                    summary, outcome = await self._summarize_session(session_id)
+            return {"session_id": session_id, "summary": summary, "outcome": outcome}
+
+        tasks = [asyncio.ensure_future(run(session_id)) for session_id in dict.fromkeys(session_ids)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away mid-stream: don't keep summarizing for nobody
+            for task in tasks:
+                task.cancel()
+
+    def session_ids_between(self, since: float | None = None, until: float | None = None) -> List[str]:
+        """Distinct ids of sessions with session_data ingested in [since, until] (epoch seconds)."""
+        where = and_filter(
+            {"ingested_at": {"$gte": since}} if since is not None else None,
+            {"ingested_at": {"$lte": until}} if until is not None else None,
+        )
+        if where is None:
+            return []
+        docs = self.session_db.get_documents(where)
+        return list(dict.fromkeys(doc.metadata["session_id"] for doc in docs if doc.metadata.get("session_id")))
+
+    def _index_session_summary(self, session_id: str, summary: str, docs: List[Document]) -> None:
+        """Replaces the session's entry in the summary namespace read by HierarchicalSessionRetriever."""
+        doc_id = f"{session_id}_summary"
+        metadata = {"session_id": session_id}
+        user_id = next((doc.metadata["user_id"] for doc in docs if doc.metadata.get("user_id")), None)
+        if user_id:
+            metadata["user_id"] = user_id
+        try:
+            self.session_summary_db.delete_documents(where={"doc_id": doc_id})
+            self.session_summary_db.ingest(doc_id, summary, metadata=metadata)
+        except Exception as e:
+            logging.error(f"Could not index summary of session {session_id}: {e}")
+
+    async def _map_reduce_summarize(self, texts: List[str]) -> str:
+        """
+        Summarizes `texts` of any length. Input that fits one call goes straight to
+        `summarize_chain`; longer input is packed into token-bounded groups that are
+        summarized concurrently (`abatch`, capped by SUMMARY_MAX_CONCURRENCY), and
+        the partial summaries are reduced level by level until one remains.
+        Chain errors propagate to the caller.
+        """
+        max_tokens = self.settings.SUMMARY_GROUP_MAX_TOKENS
+        config: RunnableConfig = {"max_concurrency": self.settings.SUMMARY_MAX_CONCURRENCY}
+        groups = pack_groups(texts, max_tokens)
+        if len(groups) == 1:
+            return cast(str, await self.summarize_chain.ainvoke({"input": groups[0]}))
+
+        partials = await self.summarize_chain.abatch([{"input": group} for group in groups], config=config)
+        while True:
+            groups = pack_groups(cast(List[str], partials), max_tokens)
+            if len(groups) >= len(partials):
+                # Partials too long to pack together: merge pairwise so each level still halves the count
+                groups = ["\n\n".join(partials[i : i + 2]) for i in range(0, len(partials), 2)]
+            if len(groups) == 1:
+                return cast(str, await self.summarize_reduce_chain.ainvoke({"input": groups[0]}))
+            logging.info(f"Reducing {len(partials)} partial summaries in {len(groups)} groups.")
+            partials = await self.summarize_reduce_chain.abatch([{"input": group} for group in groups], config=config)
 
     async def _summarize_docs_with_chain(self, docs: List[Document]) -> str:
-        """Helper to summarize a list of documents using the summarization chain."""
+        """Helper to summarize a list of documents using the summarization chain (map-reduce when long)."""
         if not docs:
             return "No documents provided for summarization."
-        # Concatenate document content or handle as appropriate for the chain
-        combined_text = "\n\n".join([doc.page_content for doc in docs])
-        logging.info(f"Summarizing combined text of {len(docs)} documents.")
+        logging.info(f"Summarizing {len(docs)} documents.")
         try:
-            # Assuming the chain returns a dict with "output_text" or similar
-            response = await self.summarize_chain.ainvoke({"input": combined_text})  # Pass as "input"
-            summary = response  # summarize_chain now directly returns string
-            return cast(str, summary)
+            return await self._map_reduce_summarize([doc.page_content for doc in docs])
         except Exception as e:
             logging.error(f"Error in _summarize_docs_with_chain: {e}")
             return "Could not generate summary due to an internal error."
@@ -267,6 +693,11 @@ class RagOrchestrator(Orchestrator):
 
 # --- Helper for API Endpoints ---
 async def get_orchestrator(request: Request) -> Orchestrator:
+    with tracer.span("get_orchestrator"):
+        return _resolve_orchestrator(request)
+
+
+def _resolve_orchestrator(request: Request) -> Orchestrator:
     # This ensures that for each request, we use the app.state.rag_orchestrator
     # which was initialized once at startup (lifespan event).
     # If RagOrchestrator is needed, it should be the one in app.state.
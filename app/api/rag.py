@@ -1,11 +1,27 @@
 # app/api/rag.py
+import asyncio
+import json
+from datetime import datetime
+from typing import List
 
 from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
 from app.api.orchestrator import RagOrchestrator, get_orchestrator
+from app.auth.router import fastapi_users
+from app.auth.schemas import UserRead
+from app.core.settings import get_settings
 from app.rag.processor import DocumentProcessor
+from app.rag.retrievers import and_filter
 
 router = APIRouter(prefix="/rag", tags=["rag"])
+# Batch jobs that start LLM spend for many sessions: mounted with the superuser dependency in app/main.py
+admin_router = APIRouter(prefix="/rag", tags=["rag"])
+
+# Shared documents can be ingested without a token, as before; per-user ones need one (see ingest_document)
+optional_user = fastapi_users.current_user(active=True, optional=True)
 
 
 @router.post(
@@ -16,12 +32,23 @@ router = APIRouter(prefix="/rag", tags=["rag"])
 async def ingest_document(
     namespace: str = Form(
         ...,
-        pattern="^(theory|personal_plan|session_data|future_me)$",  # ← UPDATED
+        pattern="^(theory|personal_plan|session_data|future_me|dfm_chat_history_summaries)$",
     ),
     doc_id: str = Form(...),
     text: str = Form(None),
     file: UploadFile | None = None,
+    user_id: str | None = Form(None),
+    session_id: str | None = Form(None),  # required to link session_data chunks to their summary
+    orchestrator: RagOrchestrator = Depends(get_orchestrator),
+    user: UserRead | None = Depends(optional_user),
 ):
+    if (user_id or session_id) and not get_settings().SKIP_AUTH:
+        # Per-user documents end up in that user's prompts: only the user themselves or a superuser may add them
+        if user is None or not (user.is_superuser or user_id == str(user.id)):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Documents with a user_id or session_id need that user's token or a superuser's",
+            )
     if file:
         raw = (await file.read()).decode("utf-8")
     elif text:
@@ -32,8 +59,34 @@ async def ingest_document(
             detail="Provide either `text` or `file`",
         )
 
+    metadata = {"namespace": namespace}
+    if user_id:
+        metadata["user_id"] = user_id
+    if session_id:
+        metadata["session_id"] = session_id
     proc = DocumentProcessor(namespace)
-    proc.ingest(doc_id, raw, metadata={"namespace": namespace})
+    existing = await run_in_threadpool(proc.get_documents, {"doc_id": doc_id})
+    if existing:
+        # Chunk ids are "<doc_id>_<n>" across the namespace: another owner's document would be overwritten
+        if {doc.metadata.get("user_id") for doc in existing} != {user_id or None}:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"doc_id {doc_id} is already used by another owner's document in {namespace}",
+            )
+        # Per-user documents were checked above; a shared one is replaced by superusers only
+        if not user_id and not get_settings().SKIP_AUTH and (user is None or not user.is_superuser):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Replacing an existing shared document needs a superuser's token",
+            )
+        # Re-ingesting a doc_id replaces it: a shorter new version would otherwise leave its old trailing chunks
+        await run_in_threadpool(
+            proc.delete_documents, and_filter({"doc_id": doc_id}, {"user_id": user_id} if user_id else None)
+        )
+    await run_in_threadpool(proc.ingest, doc_id, raw, metadata=metadata)
+    if namespace == orchestrator.settings.CHROMA_NAMESPACE_FUTURE:
+        # Persona changed: the digest is rebuilt lazily on the user's next turn
+        orchestrator.persona_digests.invalidate(user_id)
     return {"status": "ok", "namespace": namespace, "doc_id": doc_id}
 
 
@@ -48,3 +101,39 @@ async def finalize_session(
 ):
     summary = await orchestrator.summarize_session(session_id)
     return {"session_id": session_id, "summary": summary}
+
+
+class BatchSummaryRequest(BaseModel):
+    session_ids: List[str] | None = None
+    since: datetime | None = None  # date range over session_data ingestion time
+    until: datetime | None = None
+    concurrency: int | None = Field(None, ge=1, le=32)
+
+
+@admin_router.post("/sessions/summarize", status_code=status.HTTP_200_OK)
+async def summarize_sessions(
+    req: BatchSummaryRequest,
+    orchestrator: RagOrchestrator = Depends(get_orchestrator),
+) -> StreamingResponse:
+    """
+    Summarizes several sessions (an explicit list, or every session with data in a
+    date range) and streams one NDJSON line per session as soon as it is done.
+    """
+    has_range = req.since is not None or req.until is not None
+    if bool(req.session_ids) == has_range:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either `session_ids` or a `since`/`until` date range",
+        )
+    session_ids = req.session_ids or await asyncio.to_thread(
+        orchestrator.session_ids_between,
+        req.since.timestamp() if req.since else None,
+        req.until.timestamp() if req.until else None,
+    )
+    concurrency = req.concurrency or orchestrator.settings.SUMMARY_BATCH_CONCURRENCY
+
+    async def lines():
+        async for result in orchestrator.summarize_sessions(session_ids, concurrency):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,23 @@
+# app/api/usage.py
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, status
+
+from app.core.usage import usage
+
+router = APIRouter(prefix="/usage", tags=["usage"])
+
+
+@router.get("/summary", status_code=status.HTTP_200_OK, response_model=dict)
+async def usage_summary(
+    group_by: Literal["user_id", "branch", "namespace", "template", "model", "kind"] = "namespace",
+    since: datetime | None = None,
+):
+    """
+    Token usage and cost totals grouped by one label. Rows with kind "context"
+    break the RAG prompt down by the source of the stuffed chunks; they are
+    already included in the "llm" rows and carry no cost of their own.
+    """
+    rows = await usage.summary(group_by, since)
+    return {"group_by": group_by, "since": since, "rows": rows}
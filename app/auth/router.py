@@ -12,7 +12,7 @@ from fastapi_users.manager import BaseUserManager
 from app.auth.models import UserTable
 from app.auth.schemas import UserCreate, UserRead
 from app.core.settings import get_settings
-from app.db.session import get_async_session
+from app.db.session import AsyncSessionMaker, get_async_session
 
 
 # ────────────────────────────  DB adapter  ──────────────────────────────
@@ -58,3 +58,15 @@ fastapi_users = FastAPIUsers(get_user_manager, [auth_backend])
 auth_router = fastapi_users.get_auth_router(auth_backend)
 register_router = fastapi_users.get_register_router(UserRead, UserCreate)
 register_router.routes[0].status_code = 201  # type: ignore[attr-defined]
+
+
+async def user_from_token(token: str | None) -> UserTable | None:
+    """
+    The active user a bearer token belongs to, or None. For connections that
+    cannot use the HTTP dependencies (the chat WebSocket authenticates once, here).
+    """
+    if not token:
+        return None
+    async with AsyncSessionMaker() as session:
+        user = await get_jwt_strategy().read_token(token, UserManager(SQLAlchemyUserDatabase(session, UserTable)))
+    return user if user is not None and user.is_active else None
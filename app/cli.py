@@ -1,364 +1,621 @@
-# # app/cli.py
-# """
 # app/cli.py
-# ~~~~~~~~~~
-
-#  outdated, if needed, fix before uncommenting
-
-# Command-Line Interface for Dear-Future-Me application.
-# Provides interactive chat and RAG administration utilities.
-# """
-
-# from __future__ import annotations
-
-# import asyncio
-# import os
-# import sys  # Keep sys for stderr
-# import uuid
-# from typing import Optional
-
-# import click
-# import httpx  # AsyncAPI will use this
-# from dotenv import load_dotenv
-# from rich.console import Console
-# from rich.text import Text
-
-# # Assuming app.clients.api_client and app.core.settings are findable
-# # If running with `python -m app.cli`, Python handles the path.
-# from app.clients.api_client import AsyncAPI
-# from app.core.settings import Settings, get_settings
-# from app.rag.processor import DocumentProcessor  # For RAG admin commands
-
-# # --------------------------------------------------------------------------- #
-# # Environment & constants
-# # --------------------------------------------------------------------------- #
-
-# load_dotenv()
-# try:
-#     cfg: Settings = get_settings()
-# except Exception as e:
-#     print(f"FATAL: Could not load settings. Check .env file. Error: {e}", file=sys.stderr)
-#     sys.exit(1)
-
-
-# API_URL = os.getenv("DFM_API_URL", "http://localhost:8000")
-# # CLIENT_DEMO_MODE for CLI now primarily dictates if it tries to use the .env demo user
-# CLIENT_DEMO_MODE = cfg.DEMO_MODE
-# CURRENT_LANG = cfg.APP_DEFAULT_LANGUAGE
-
-# # --------------------------------------------------------------------------- #
-# # UI Strings for CLI (simple i18n)
-# # --------------------------------------------------------------------------- #
-# UI_STRINGS = {
-#     "en": {
-#         "greeting_banner": "[bold]Dear-Future-Me interactive chat (type 'exit' to quit)[/bold]",
-#         "type_exit_prompt": "Type 'exit' to quit.\n",
-#         "user_prompt": "[bold cyan]you:[/bold cyan] ",
-#         "ai_prompt": "[bold cyan]ai:[/bold cyan] ",
-#         "bye_message": "\n[bold]Bye![/bold]",
-#         "auth_failed_exit": "[bold red]Authentication failed. Cannot start chat session. Exiting.[/bold red]",
-#         "auth_failed_check_server": "[bold yellow]Please check server logs and ensure the server is running and accessible.[/bold yellow]",
-#         "auth_failed_check_env_demo": f"[bold yellow]Ensure DEMO_USER_EMAIL ({cfg.DEMO_USER_EMAIL}) and DEMO_USER_PASSWORD are correctly set in your .env file if using CLIENT_DEMO_MODE.[/bold yellow]",
-#         "auth_critical_error": "[bold red]Critical error during authentication setup: {error}[/bold red]",
-#         "auth_cannot_start": "[bold red]Could not authenticate. Chat session cannot start.[/bold red]\n",
-#         "http_error_from_server": "[bold red]Oops! HTTP error from server: {status_code} - {text}[/bold red]",
-#         "session_expired_error": "[bold yellow]Your session might have expired or token is invalid. Try restarting the CLI.[/bold yellow]",
-#         "generic_comms_error": "[bold red]Oops! Something went wrong on the server side or during communication.[/bold red]",
-#         "details_to_stderr": "(Details logged to stderr)",
-#         "attempting_demo_user_setup": "[dim]CLIENT_DEMO_MODE is True. Attempting to use predefined demo user: {email}...[/dim]",
-#         "attempting_temp_user_setup": "[dim]CLIENT_DEMO_MODE is False. Attempting to register/login temporary user: {email}...[/dim]",
-#         "login_success": "[green]Successfully logged in as {email}[/green]",
-#         "login_failed_attempt_register": "[yellow]Login failed for {email} (status {status_code}). Attempting to register...[/yellow]",
-#         "user_registered_logging_in": "[green]User {email} registered. Logging in...[/green]",
-#         "login_success_after_register": "[green]Successfully logged in as {email} after registration[/green]",
-#         "registration_failed": "[red]Registration for {email} failed (status {status_code}): {text}[/red]",
-#         "login_error_other": "[red]Login error for {email} (status {status_code}): {text}[/red]",
-#         "unexpected_auth_error": "[red]Unexpected error during auth setup for {email}: {error}[/red]",
-#         "authenticated_as_banner": "[bold green]Authenticated as {email}[/bold green]\n",
-#         "rag_ingest_start": "[bold blue]Starting RAG ingestion for namespace '{namespace}' from directory '{source_dir}'...[/bold blue]",
-#         "rag_ingest_success": "[bold green]Ingestion complete. Processed {count} documents for namespace '{namespace}'.[/bold green]",
-#         "rag_ingest_error_file": "[red]  Error ingesting {filename}: {error}[/red]",
-#         "rag_ingest_error_general": "[bold red]An error occurred during RAG ingestion: {error}[/bold red]",
-#         "rag_ingested_file": "  Ingested: {filename} as {doc_id}",
-#     },
-#     "he": {
-#         "greeting_banner": "[bold]צ'אט אינטראקטיבי עם 'אני מהעתיד' (הקלד 'צא' ליציאה)[/bold]",
-#         "type_exit_prompt": "הקלד 'צא' ליציאה.\n",
-#         "user_prompt": "[bold cyan]את/ה:[/bold cyan] ",
-#         "ai_prompt": "[bold cyan]אני מהעתיד:[/bold cyan] ",
-#         "bye_message": "\n[bold]להתראות![/bold]",
-#         "auth_failed_exit": "[bold red]האימות נכשל. לא ניתן להתחיל סשן צ'אט. יוצא.[/bold red]",
-#         "auth_failed_check_server": "[bold yellow]אנא בדוק/בדקי את יומני השרת וודא/י שהשרת פועל ונגיש.[/bold yellow]",
-#         "auth_failed_check_env_demo": f"[bold yellow]ודא/י ש-DEMO_USER_EMAIL ({cfg.DEMO_USER_EMAIL}) ו-DEMO_USER_PASSWORD מוגדרים כראוי בקובץ .env שלך אם משתמשים ב-CLIENT_DEMO_MODE.[/bold yellow]",
-#         "auth_critical_error": "[bold red]שגיאה קריטית במהלך הגדרת האימות: {error}[/bold red]",
-#         "auth_cannot_start": "[bold red]לא ניתן היה לאמת. סשן הצ'אט לא יכול להתחיל.[/bold red]\n",
-#         "http_error_from_server": "[bold red]אופס! שגיאת HTTP מהשרת: {status_code} - {text}[/bold red]",
-#         "session_expired_error": "[bold yellow]יתכן שהסשן שלך פג או שהטוקן אינו חוקי. נסה/י להפעיל מחדש את ה-CLI.[/bold yellow]",
-#         "generic_comms_error": "[bold red]אופס! משהו השתבש בצד השרת או במהלך התקשורת.[/bold red]",
-#         "details_to_stderr": "(פרטים נרשמו ל-stderr)",
-#         "attempting_demo_user_setup": "[dim]CLIENT_DEMO_MODE הוא True. מנסה להשתמש במשתמש הדגמה מוגדר מראש: {email}...[/dim]",
-#         "attempting_temp_user_setup": "[dim]CLIENT_DEMO_MODE הוא False. מנסה לרשום/להתחבר למשתמש זמני: {email}...[/dim]",
-#         "login_success": "[green]התחברת בהצלחה כ-{email}[/green]",
-#         "login_failed_attempt_register": "[yellow]ההתחברות עבור {email} נכשלה (סטטוס {status_code}). מנסה להירשם...[/yellow]",
-#         "user_registered_logging_in": "[green]משתמש {email} נרשם. מתחבר...[/green]",
-#         "login_success_after_register": "[green]התחברת בהצלחה כ-{email} לאחר ההרשמה[/green]",
-#         "registration_failed": "[red]ההרשמה עבור {email} נכשלה (סטטוס {status_code}): {text}[/red]",
-#         "login_error_other": "[red]שגיאת התחברות עבור {email} (סטטוס {status_code}): {text}[/red]",
-#         "unexpected_auth_error": "[red]שגיאה לא צפויה במהלך הגדרת האימות עבור {email}: {error}[/red]",
-#         "authenticated_as_banner": "[bold green]מאומת/ת כ-{email}[/bold green]\n",
-#         "rag_ingest_start": "[bold blue]מתחיל הטמעת RAG עבור מרחב השם '{namespace}' מהספרייה '{source_dir}'...[/bold blue]",
-#         "rag_ingest_success": "[bold green]ההטמעה הושלמה. עובדו {count} מסמכים עבור מרחב השם '{namespace}'.[/bold green]",
-#         "rag_ingest_error_file": "[red]  שגיאה בהטמעת {filename}: {error}[/red]",
-#         "rag_ingest_error_general": "[bold red]אירעה שגיאה במהלך הטמעת RAG: {error}[/bold red]",
-#         "rag_ingested_file": "  הוטמע: {filename} כ-{doc_id}",
-#     },
-# }
-# STR = UI_STRINGS.get(CURRENT_LANG, UI_STRINGS["en"])  # Fallback to English if lang not found
-# console = Console()  # Global console instance
-
-# # --------------------------------------------------------------------------- #
-# # Authentication Helper for CLI
-# # --------------------------------------------------------------------------- #
-
-
-# async def setup_cli_session_auth(api_client: AsyncAPI) -> Optional[str]:
-#     """
-#     Handles authentication for the CLI session using the provided AsyncAPI client.
-#     If CLIENT_DEMO_MODE is true, attempts to register/login the predefined demo user from settings.
-#     Otherwise, registers and logs in a new random temporary user.
-#     Returns the token or None if auth fails, and updates api_client._token.
-#     """
-#     if CLIENT_DEMO_MODE:
-#         email = cfg.DEMO_USER_EMAIL
-#         password = cfg.DEMO_USER_PASSWORD
-#         console.print(STR["attempting_demo_user_setup"].format(email=email))
-#     else:
-#         email = f"temp_cli_user_{uuid.uuid4().hex[:8]}@example.com"
-#         password = "cli_temppassword"
-#         console.print(STR["attempting_temp_user_setup"].format(email=email))
-
-#     try:
-#         # Try to login first
-#         token = await api_client.login(email, password)
-#         console.print(STR["login_success"].format(email=email))
-#         return token
-#     except httpx.HTTPStatusError as login_err:
-#         if login_err.response.status_code == 400:  # Bad credentials or user not found
-#             console.print(
-#                 STR["login_failed_attempt_register"].format(email=email, status_code=login_err.response.status_code)
-#             )
-#             try:
-#                 await api_client.register(
-#                     email,
-#                     password,
-#                     first_name="CLI",
-#                     last_name="User" if not CLIENT_DEMO_MODE else "Demo",
-#                 )
-#                 console.print(STR["user_registered_logging_in"].format(email=email))
-#                 token = await api_client.login(email, password)  # Try login again
-#                 console.print(STR["login_success_after_register"].format(email=email))
-#                 return token
-#             except httpx.HTTPStatusError as reg_err:
-#                 console.print(
-#                     STR["registration_failed"].format(
-#                         email=email, status_code=reg_err.response.status_code, text=reg_err.response.text
-#                     )
-#                 )
-#                 return None
-#         else:  # Other login errors
-#             console.print(
-#                 STR["login_error_other"].format(
-#                     email=email, status_code=login_err.response.status_code, text=login_err.response.text
-#                 )
-#             )
-#             return None
-#     except Exception as e:
-#         console.print(STR["unexpected_auth_error"].format(email=email, error=e))
-#         import traceback
-
-#         traceback.print_exc(file=sys.stderr)
-#         return None
-
-
-# # --------------------------------------------------------------------------- #
-# # CLI definition (click)
-# # --------------------------------------------------------------------------- #
-
-
-# @click.group()
-# def cli() -> None:
-#     """Dear-Future-Me utility CLI."""
-#     pass
-
-
-# # --- RAG Administration Command Group ---
-# @cli.group(help="Manage RAG knowledge base.")
-# def rag():
-#     """Commands for RAG administration."""
-#     pass
-
-
-# @rag.command(help="Ingest and index documents from a specified source into a RAG namespace.")
-# @click.option(
-#     "--namespace",
-#     required=True,
-#     type=click.Choice(
-#         [
-#             cfg.CHROMA_NAMESPACE_THEORY,
-#             cfg.CHROMA_NAMESPACE_PLAN,
-#             cfg.CHROMA_NAMESPACE_SESSION,
-#             cfg.CHROMA_NAMESPACE_FUTURE,
-#         ],
-#         case_sensitive=False,
-#     ),
-#     help="The RAG namespace to ingest into.",
-# )
-# @click.option(
-#     "--source-dir",
-#     required=True,
-#     type=click.Path(exists=True, file_okay=False, dir_okay=True, readable=True),
-#     help="Directory containing documents to ingest.",
-# )
-# @click.option("--doc-id-prefix", default="doc", show_default=True, help="Prefix for document IDs.")
-# @click.option(
-#     "--file-extensions",
-#     default=".txt,.md",
-#     show_default=True,
-#     help="Comma-separated list of file extensions to process (e.g., .txt,.md).",
-# )
-# def ingest(namespace: str, source_dir: str, doc_id_prefix: str, file_extensions: str):
-#     """
-#     Processes text files from source_dir and ingests them into the specified RAG namespace.
-#     This is a synchronous operation for simplicity in a CLI admin command.
-#     """
-#     console.print(STR["rag_ingest_start"].format(namespace=namespace, source_dir=source_dir))
-#     valid_extensions = [ext.strip() for ext in file_extensions.split(",")]
-#     try:
-#         # Note: DocumentProcessor uses OpenAIEmbeddings by default, which costs money.
-#         # Consider allowing configuration for local/free embedding models for admin tasks.
-#         processor = DocumentProcessor(namespace=namespace)  # Uses settings from cfg
-
-#         count = 0
-#         for filename in os.listdir(source_dir):
-#             if any(filename.endswith(ext) for ext in valid_extensions):
-#                 file_path = os.path.join(source_dir, filename)
-#                 try:
-#                     with open(file_path, "r", encoding="utf-8") as f:
-#                         text_content = f.read()
-#                     # Create a more unique doc_id, perhaps incorporating part of the filename
-#                     base_filename = os.path.splitext(filename)[0].replace(" ", "_").lower()
-#                     doc_id = f"{doc_id_prefix}_{base_filename}_{count + 1}"
-#                     processor.ingest(doc_id=doc_id, text=text_content, metadata={"source_file": filename})
-#                     console.print(STR["rag_ingested_file"].format(filename=filename, doc_id=doc_id))
-#                     count += 1
-#                 except Exception as e:
-#                     console.print(STR["rag_ingest_error_file"].format(filename=filename, error=e))
-#         console.print(STR["rag_ingest_success"].format(count=count, namespace=namespace))
-#     except Exception as e:
-#         console.print(STR["rag_ingest_error_general"].format(error=e))
-#         import traceback
-
-#         traceback.print_exc(file=sys.stderr)
-
-
-# @cli.command(help="Interactive chat with the running API server.")
-# @click.option(
-#     "--url",
-#     default=API_URL,
-#     show_default=True,
-#     help="Base URL of the FastAPI server.",
-# )
-# async def chat(url: str) -> None:  # Make the command itself async
-#     """Start an interactive chat session. The main logic is here."""
-#     api = AsyncAPI(url)  # Instantiate the new AsyncAPI client
-#     # ------------------------------------------------------------------ auth
-#     try:
-#         token = await setup_cli_session_auth(api)  # Pass the api instance
-#         if not token:
-#             console.print(STR["auth_failed_exit"])
-#             console.print(STR["auth_failed_check_server"])
-#             if CLIENT_DEMO_MODE:
-#                 console.print(STR["auth_failed_check_env_demo"])
-#             return
-
-#         user_email_for_banner = cfg.DEMO_USER_EMAIL if CLIENT_DEMO_MODE and api._token else "authenticated user"
-#         banner = STR["authenticated_as_banner"].format(email=user_email_for_banner)
-#     except Exception as e:
-#         console.print(STR["auth_critical_error"].format(error=e))
-#         banner = STR["auth_cannot_start"]
-#         console.print(banner)
-#         # It's important to close the API client if an error occurs before the main loop
-#         await api.close()  # Ensure client is closed on early exit
-#         return
-
-#     console.print(banner + STR["greeting_banner"])
-#     console.print(STR["type_exit_prompt"])
-
-#     # ------------------------------------------------------------------ loop
-#     try:
-#         while True:
-#             try:
-#                 query = await asyncio.to_thread(console.input, STR["user_prompt"])
-#                 query = query.strip()
-#             except (KeyboardInterrupt, EOFError):  # Handle Ctrl+C or EOF (Ctrl+D) during input
-#                 console.print(STR["bye_message"])
-#                 break
-
-#             if query.lower() in {"exit", "quit", "צא"}:  # Added Hebrew exit command
-#                 console.print(STR["bye_message"])
-#                 break
-
-#             if not query:  # Skip empty input
-#                 continue
-
-#             try:
-#                 answer = await api.chat(query)  # Use the AsyncAPI's chat method
-#             except httpx.HTTPStatusError as ex_http:
-#                 console.print(
-#                     STR["http_error_from_server"].format(
-#                         status_code=ex_http.response.status_code, text=ex_http.response.text
-#                     )
-#                 )
-#                 if ex_http.response.status_code == 401:  # Unauthorized
-#                     console.print(STR["session_expired_error"])
-#             except Exception as ex:  # Catch other exceptions during chat call
-#                 console.print(STR["generic_comms_error"])
-#                 console.print(STR["details_to_stderr"])
-#                 print("----- TRACEBACK -----", file=sys.stderr)
-#                 import traceback
-
-#                 traceback.print_exception(ex, file=sys.stderr)
-#                 break  # Break on unexpected errors
-
-#             console.print(Text(STR["ai_prompt"], style="bold cyan"), answer)
-#     finally:
-#         # This ensures the client is closed if the loop breaks for any reason,
-#         # or if an exception occurs within the loop that isn't caught internally.
-#         if hasattr(api, "_client") and api._client and not api._client.is_closed:
-#             await api.close()
-
-
-# # The @cli.result_callback() for process_result is removed as it's not essential
-# # for the chat command and might be involved in the warning.
-
-
-# # --------------------------------------------------------------------------- #
-# # Entry-point
-# # --------------------------------------------------------------------------- #
-
-
-# def main_entry_point():  # Renamed to avoid confusion with click's own main methods
-#     """
-#     Main entry point for the CLI.
-#     Handles Click's async command execution.
-#     """
-#     # For direct script execution, calling the group object is the standard way.
-#     # Click (v8+) should detect async commands and manage the event loop.
-#     cli(auto_envvar_prefix="DFM")
-
-
-# if __name__ == "__main__":
-#     # To run this CLI directly:
-#     # `python -m app.cli chat`
-#     # `python -m app.cli rag ingest --namespace theory --source-dir ./data/theory_docs`
-#     main_entry_point()
+"""
+Command-Line Interface for Dear-Future-Me application.
+Provides RAG administration utilities (session summaries, parallel resumable
+directory ingest), an interactive chat with a running API and replay of
+recorded chat traffic against it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import sys
+import traceback
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional
+
+import click
+import httpx
+from rich.console import Console
+from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+from rich.text import Text
+
+from app.clients.api_client import APIError, AsyncAPI, ChatSocket
+from app.clients.bulk_ingest import (
+    Manifest,
+    SourceFile,
+    batches,
+    discover,
+    http_worker,
+    pending_files,
+    processor_worker,
+    run_workers,
+)
+from app.clients.replay import load_turns, replay
+from app.core.profiling import sign_profile_token
+from app.core.settings import get_settings
+from app.rag.processor import DocumentProcessor
+
+cfg = get_settings()
+
+API_URL = os.getenv("DFM_API_URL", "http://localhost:8000")
+
+# CLIENT_DEMO_MODE for CLI now primarily dictates if it tries to use the .env demo user
+CLIENT_DEMO_MODE = cfg.DEMO_MODE
+CURRENT_LANG = cfg.APP_DEFAULT_LANGUAGE
+
+# --------------------------------------------------------------------------- #
+# UI Strings for CLI (simple i18n)
+# --------------------------------------------------------------------------- #
+UI_STRINGS = {
+    "en": {
+        "greeting_banner": "[bold]Dear-Future-Me interactive chat (type 'exit' to quit)[/bold]",
+        "type_exit_prompt": "Type 'exit' to quit; Ctrl+C stops an answer.\n",
+        "answer_cancelled": "[dim](answer stopped)[/dim]",
+        "user_prompt": "[bold cyan]you:[/bold cyan] ",
+        "ai_prompt": "[bold cyan]ai:[/bold cyan] ",
+        "bye_message": "\n[bold]Bye![/bold]",
+        "auth_failed_exit": "[bold red]Authentication failed. Cannot start chat session. Exiting.[/bold red]",
+        "auth_failed_check_server": "[bold yellow]Please check server logs and ensure the server is running and accessible.[/bold yellow]",
+        "auth_failed_check_env_demo": f"[bold yellow]Ensure DEMO_USER_EMAIL ({cfg.DEMO_USER_EMAIL}) and DEMO_USER_PASSWORD are correctly set in your .env file if using CLIENT_DEMO_MODE.[/bold yellow]",
+        "auth_critical_error": "[bold red]Critical error during authentication setup: {error}[/bold red]",
+        "auth_cannot_start": "[bold red]Could not authenticate. Chat session cannot start.[/bold red]\n",
+        "http_error_from_server": "[bold red]Oops! HTTP error from server: {status_code} - {text}[/bold red]",
+        "session_expired_error": "[bold yellow]Your session might have expired or token is invalid. Try restarting the CLI.[/bold yellow]",
+        "generic_comms_error": "[bold red]Oops! Something went wrong on the server side or during communication.[/bold red]",
+        "details_to_stderr": "(Details logged to stderr)",
+        "attempting_demo_user_setup": "[dim]CLIENT_DEMO_MODE is True. Attempting to use predefined demo user: {email}...[/dim]",
+        "attempting_temp_user_setup": "[dim]CLIENT_DEMO_MODE is False. Attempting to register/login temporary user: {email}...[/dim]",
+        "login_success": "[green]Successfully logged in as {email}[/green]",
+        "login_failed_attempt_register": "[yellow]Login failed for {email} (status {status_code}). Attempting to register...[/yellow]",
+        "user_registered_logging_in": "[green]User {email} registered. Logging in...[/green]",
+        "login_success_after_register": "[green]Successfully logged in as {email} after registration[/green]",
+        "registration_failed": "[red]Registration for {email} failed (status {status_code}): {text}[/red]",
+        "login_error_other": "[red]Login error for {email} (status {status_code}): {text}[/red]",
+        "unexpected_auth_error": "[red]Unexpected error during auth setup for {email}: {error}[/red]",
+        "authenticated_as_banner": "[bold green]Authenticated as {email}[/bold green]\n",
+        "rag_ingest_start": "[bold blue]Starting RAG ingestion for namespace '{namespace}' from directory '{source_dir}'...[/bold blue]",
+        "rag_ingest_success": "[bold green]Ingestion complete. Processed {count} documents for namespace '{namespace}'.[/bold green]",
+        "rag_ingest_error_file": "[red]  Error ingesting {filename}: {error}[/red]",
+        "rag_ingest_error_general": "[bold red]An error occurred during RAG ingestion: {error}[/bold red]",
+        "rag_ingested_file": "  Ingested: {filename} as {doc_id}",
+        "rag_ingest_skipped": "[dim]Skipped {count} documents already in the manifest {manifest}.[/dim]",
+        "rag_ingest_failed": "[bold yellow]{count} documents failed; rerun the same command to retry only those.[/bold yellow]",
+    },
+    "he": {
+        "greeting_banner": "[bold]צ'אט אינטראקטיבי עם 'אני מהעתיד' (הקלד 'צא' ליציאה)[/bold]",
+        "type_exit_prompt": "הקלד 'צא' ליציאה; Ctrl+C עוצר תשובה.\n",
+        "answer_cancelled": "[dim](התשובה נעצרה)[/dim]",
+        "user_prompt": "[bold cyan]את/ה:[/bold cyan] ",
+        "ai_prompt": "[bold cyan]אני מהעתיד:[/bold cyan] ",
+        "bye_message": "\n[bold]להתראות![/bold]",
+        "auth_failed_exit": "[bold red]האימות נכשל. לא ניתן להתחיל סשן צ'אט. יוצא.[/bold red]",
+        "auth_failed_check_server": "[bold yellow]אנא בדוק/בדקי את יומני השרת וודא/י שהשרת פועל ונגיש.[/bold yellow]",
+        "auth_failed_check_env_demo": f"[bold yellow]ודא/י ש-DEMO_USER_EMAIL ({cfg.DEMO_USER_EMAIL}) ו-DEMO_USER_PASSWORD מוגדרים כראוי בקובץ .env שלך אם משתמשים ב-CLIENT_DEMO_MODE.[/bold yellow]",
+        "auth_critical_error": "[bold red]שגיאה קריטית במהלך הגדרת האימות: {error}[/bold red]",
+        "auth_cannot_start": "[bold red]לא ניתן היה לאמת. סשן הצ'אט לא יכול להתחיל.[/bold red]\n",
+        "http_error_from_server": "[bold red]אופס! שגיאת HTTP מהשרת: {status_code} - {text}[/bold red]",
+        "session_expired_error": "[bold yellow]יתכן שהסשן שלך פג או שהטוקן אינו חוקי. נסה/י להפעיל מחדש את ה-CLI.[/bold yellow]",
+        "generic_comms_error": "[bold red]אופס! משהו השתבש בצד השרת או במהלך התקשורת.[/bold red]",
+        "details_to_stderr": "(פרטים נרשמו ל-stderr)",
+        "attempting_demo_user_setup": "[dim]CLIENT_DEMO_MODE הוא True. מנסה להשתמש במשתמש הדגמה מוגדר מראש: {email}...[/dim]",
+        "attempting_temp_user_setup": "[dim]CLIENT_DEMO_MODE הוא False. מנסה לרשום/להתחבר למשתמש זמני: {email}...[/dim]",
+        "login_success": "[green]התחברת בהצלחה כ-{email}[/green]",
+        "login_failed_attempt_register": "[yellow]ההתחברות עבור {email} נכשלה (סטטוס {status_code}). מנסה להירשם...[/yellow]",
+        "user_registered_logging_in": "[green]משתמש {email} נרשם. מתחבר...[/green]",
+        "login_success_after_register": "[green]התחברת בהצלחה כ-{email} לאחר ההרשמה[/green]",
+        "registration_failed": "[red]ההרשמה עבור {email} נכשלה (סטטוס {status_code}): {text}[/red]",
+        "login_error_other": "[red]שגיאת התחברות עבור {email} (סטטוס {status_code}): {text}[/red]",
+        "unexpected_auth_error": "[red]שגיאה לא צפויה במהלך הגדרת האימות עבור {email}: {error}[/red]",
+        "authenticated_as_banner": "[bold green]מאומת/ת כ-{email}[/bold green]\n",
+        "rag_ingest_start": "[bold blue]מתחיל הטמעת RAG עבור מרחב השם '{namespace}' מהספרייה '{source_dir}'...[/bold blue]",
+        "rag_ingest_success": "[bold green]ההטמעה הושלמה. עובדו {count} מסמכים עבור מרחב השם '{namespace}'.[/bold green]",
+        "rag_ingest_error_file": "[red]  שגיאה בהטמעת {filename}: {error}[/red]",
+        "rag_ingest_error_general": "[bold red]אירעה שגיאה במהלך הטמעת RAG: {error}[/bold red]",
+        "rag_ingested_file": "  הוטמע: {filename} כ-{doc_id}",
+        "rag_ingest_skipped": "[dim]דולגו {count} מסמכים שכבר מופיעים במניפסט {manifest}.[/dim]",
+        "rag_ingest_failed": "[bold yellow]{count} מסמכים נכשלו; הרצה חוזרת של אותה פקודה תנסה שוב רק אותם.[/bold yellow]",
+    },
+}
+STR = UI_STRINGS.get(CURRENT_LANG, UI_STRINGS["en"])  # Fallback to English if lang not found
+console = Console()  # Global console instance
+
+# --------------------------------------------------------------------------- #
+# Authentication Helper for CLI
+# --------------------------------------------------------------------------- #
+
+
+async def setup_cli_session_auth(api_client: AsyncAPI) -> Optional[str]:
+    """
+    Handles authentication for the CLI session using the provided AsyncAPI client.
+    If CLIENT_DEMO_MODE is true, attempts to register/login the predefined demo user from settings.
+    Otherwise, registers and logs in a new random temporary user.
+    Returns the token or None if auth fails; the client keeps the credentials to renew it.
+    """
+    if CLIENT_DEMO_MODE:
+        email = cfg.DEMO_USER_EMAIL
+        password = cfg.DEMO_USER_PASSWORD
+        console.print(STR["attempting_demo_user_setup"].format(email=email))
+    else:
+        email = f"temp_cli_user_{uuid.uuid4().hex[:8]}@example.com"
+        password = "cli_temppassword"
+        console.print(STR["attempting_temp_user_setup"].format(email=email))
+
+    try:
+        token = await api_client.login(email, password)
+        console.print(STR["login_success"].format(email=email))
+        return token
+    except APIError as login_err:
+        if login_err.status_code != 400:  # 400 = bad credentials or user not found
+            console.print(
+                STR["login_error_other"].format(email=email, status_code=login_err.status_code, text=login_err)
+            )
+            return None
+        console.print(STR["login_failed_attempt_register"].format(email=email, status_code=login_err.status_code))
+    except httpx.HTTPError as e:
+        console.print(STR["unexpected_auth_error"].format(email=email, error=e))
+        return None
+
+    try:
+        await api_client.register(email, password, first_name="CLI", last_name="Demo" if CLIENT_DEMO_MODE else "User")
+        console.print(STR["user_registered_logging_in"].format(email=email))
+        token = await api_client.login(email, password)
+        console.print(STR["login_success_after_register"].format(email=email))
+        return token
+    except APIError as reg_err:
+        console.print(STR["registration_failed"].format(email=email, status_code=reg_err.status_code, text=reg_err))
+        return None
+    except httpx.HTTPError as e:
+        console.print(STR["unexpected_auth_error"].format(email=email, error=e))
+        return None
+
+
+# --------------------------------------------------------------------------- #
+# CLI definition (click)
+# --------------------------------------------------------------------------- #
+
+
+@click.group()
+def cli() -> None:
+    """Dear-Future-Me utility CLI."""
+    pass
+
+
+# --- RAG Administration Command Group ---
+@cli.group(help="Manage RAG knowledge base.")
+def rag():
+    """Commands for RAG administration."""
+    pass
+
+
+@rag.command(help="Summarize many sessions on the API server, printing one NDJSON line per session as it finishes.")
+@click.option("--session-id", "session_ids", multiple=True, help="Session to summarize (repeatable).")
+@click.option("--since", type=click.DateTime(), help="Summarize every session with data ingested from this date.")
+@click.option("--until", type=click.DateTime(), help="End of the date range (inclusive).")
+@click.option(
+    "--concurrency",
+    type=click.IntRange(1, 32),
+    default=cfg.SUMMARY_BATCH_CONCURRENCY,
+    show_default=True,
+    help="Sessions summarized in parallel.",
+)
+@click.option("--url", default=API_URL, show_default=True, help="Base URL of the API server (DFM_API_URL).")
+@click.option("--token", envvar="DFM_API_TOKEN", default=None, help="A superuser's bearer token (DFM_API_TOKEN).")
+def summarize(
+    session_ids: tuple[str, ...],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    concurrency: int,
+    url: str,
+    token: Optional[str],
+) -> None:
+    """
+    The server keeps the summary cache and checkpoints, so sessions whose data
+    did not change since the last run are skipped or updated incrementally.
+    """
+    if bool(session_ids) == (since is not None or until is not None):
+        raise click.UsageError("Provide either --session-id or a --since/--until date range.")
+    try:
+        asyncio.run(_summarize_sessions(url, token, list(session_ids), since, until, concurrency))
+    except (APIError, httpx.HTTPError) as e:
+        raise click.ClickException(str(e))
+
+
+@rag.command(help="Ingest a directory of documents into a RAG namespace, in parallel and resumably.")
+@click.option(
+    "--namespace",
+    required=True,
+    type=click.Choice(
+        [
+            cfg.CHROMA_NAMESPACE_THEORY,
+            cfg.CHROMA_NAMESPACE_PLAN,
+            cfg.CHROMA_NAMESPACE_SESSION,
+            cfg.CHROMA_NAMESPACE_FUTURE,
+        ],
+        case_sensitive=False,
+    ),
+    help="The RAG namespace to ingest into.",
+)
+@click.option(
+    "--source-dir",
+    required=True,
+    type=click.Path(exists=True, file_okay=False, dir_okay=True, readable=True),
+    help="Directory containing documents to ingest (walked recursively).",
+)
+@click.option("--doc-id-prefix", default="doc", show_default=True, help="Prefix for document IDs.")
+@click.option(
+    "--file-extensions",
+    default=".txt,.md",
+    show_default=True,
+    help="Comma-separated list of file extensions to process (e.g., .txt,.md).",
+)
+@click.option("--recursive/--no-recursive", default=True, show_default=True, help="Include subdirectories.")
+@click.option(
+    "--concurrency", type=click.IntRange(1, 256), default=8, show_default=True, help="Uploads (or batches) in flight."
+)
+@click.option("--url", default=API_URL, show_default=True, help="Base URL of the API to upload to (DFM_API_URL).")
+@click.option("--token", envvar="DFM_API_TOKEN", default=None, help="Bearer token (DFM_API_TOKEN).")
+@click.option(
+    "--in-process",
+    is_flag=True,
+    help="Embed and write to CHROMA_DB_PATH directly through DocumentProcessor instead of uploading.",
+)
+@click.option("--batch-size", type=click.IntRange(1), default=32, show_default=True, help="Files per in-process batch.")
+@click.option(
+    "--batch-mb", type=click.FloatRange(0.01), default=4.0, show_default=True, help="Max MB per in-process batch."
+)
+@click.option(
+    "--manifest",
+    "manifest_path",
+    default=None,
+    help="Checkpoint file of ingested doc IDs [default: data/ingest_manifests/<namespace>.jsonl].",
+)
+@click.option("--user-id", default=None, help="user_id metadata for every document (session_data / future_me).")
+@click.option("--session-id", default=None, help="session_id metadata for every document (session_data).")
+def ingest(
+    namespace: str,
+    source_dir: str,
+    doc_id_prefix: str,
+    file_extensions: str,
+    recursive: bool,
+    concurrency: int,
+    url: str,
+    token: Optional[str],
+    in_process: bool,
+    batch_size: int,
+    batch_mb: float,
+    manifest_path: Optional[str],
+    user_id: Optional[str],
+    session_id: Optional[str],
+) -> None:
+    """
+    Files are picked up as the directory is walked, and each finished document is
+    checkpointed to the manifest, so an interrupted run resumes where it stopped.
+    In-process runs do not reach a running server's persona digest cache.
+    """
+    console.print(STR["rag_ingest_start"].format(namespace=namespace, source_dir=source_dir))
+    manifest = Manifest(manifest_path or os.path.join("data", "ingest_manifests", f"{namespace}.jsonl"))
+    fields = {key: value for key, value in (("user_id", user_id), ("session_id", session_id)) if value}
+    extensions = [ext.strip() for ext in file_extensions.split(",") if ext.strip()]
+    try:
+        done, skipped, failed = asyncio.run(
+            _ingest_directory(
+                namespace,
+                source_dir,
+                doc_id_prefix,
+                extensions,
+                recursive,
+                concurrency,
+                url,
+                token,
+                in_process,
+                batch_size,
+                int(batch_mb * 1024 * 1024),
+                manifest,
+                fields,
+            )
+        )
+    except Exception as e:
+        console.print(STR["rag_ingest_error_general"].format(error=e))
+        raise SystemExit(1)
+    finally:
+        manifest.close()
+    console.print(STR["rag_ingest_success"].format(count=done, namespace=namespace))
+    if skipped:
+        console.print(STR["rag_ingest_skipped"].format(count=skipped, manifest=manifest.path))
+    if failed:
+        console.print(STR["rag_ingest_failed"].format(count=failed))
+        raise SystemExit(1)
+
+
+async def _ingest_directory(
+    namespace: str,
+    source_dir: str,
+    prefix: str,
+    extensions: List[str],
+    recursive: bool,
+    concurrency: int,
+    url: str,
+    token: Optional[str],
+    in_process: bool,
+    batch_size: int,
+    batch_bytes: int,
+    manifest: Manifest,
+    fields: dict,
+) -> tuple[int, int, int]:
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    columns = (
+        SpinnerColumn(),
+        TextColumn("{task.description}"),
+        TextColumn("{task.completed} done, {task.fields[skipped]} skipped, {task.fields[failed]} failed"),
+        TimeElapsedColumn(),
+    )
+    with Progress(*columns, console=console, transient=False) as progress:
+        task = progress.add_task(f"{namespace} <- {source_dir}", total=None, skipped=0, failed=0)
+
+        def skip(_: SourceFile) -> None:
+            counts["skipped"] += 1
+            progress.update(task, skipped=counts["skipped"])
+
+        files = pending_files(discover(source_dir, extensions, recursive), source_dir, prefix, manifest, skip)
+        api: Optional[AsyncAPI] = None
+        if in_process:
+            worker = processor_worker(DocumentProcessor(namespace), namespace, fields)
+            jobs: Any = batches(files, batch_size, batch_bytes)
+        else:
+            api = AsyncAPI(
+                url, max_connections=concurrency, max_keepalive_connections=concurrency, timeout=120.0, token=token
+            )
+            worker, jobs = http_worker(api, namespace, fields), files
+        try:
+            async for result in run_workers(jobs, worker, concurrency):
+                if result.error is None:
+                    manifest.mark_done(result.file)
+                    counts["done"] += 1
+                    progress.advance(task)
+                else:
+                    counts["failed"] += 1
+                    progress.update(task, failed=counts["failed"])
+                    progress.console.print(
+                        STR["rag_ingest_error_file"].format(filename=result.file.path, error=result.error)
+                    )
+        finally:
+            if api is not None:
+                await api.close()
+    return counts["done"], counts["skipped"], counts["failed"]
+
+
+async def _summarize_sessions(
+    url: str,
+    token: Optional[str],
+    session_ids: List[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    concurrency: int,
+) -> None:
+    # A long batch streams for minutes: no overall read timeout
+    async with AsyncAPI(url, timeout=None, token=token) as api:
+        async for result in api.summarize_sessions(session_ids, since, until, concurrency):
+            click.echo(json.dumps(result, ensure_ascii=False))
+
+
+@cli.command(name="profile-token", help="Print an X-DFM-Profile header value that profiles matching requests.")
+@click.option("--ttl", type=click.IntRange(1), default=600, show_default=True, help="Validity in seconds.")
+def profile_token(ttl: int) -> None:
+    """Signed with SECRET_KEY; the server needs PROFILING_ENABLED=true."""
+    click.echo(sign_profile_token(cfg.SECRET_KEY, ttl))
+
+
+# --- Chat Command Group ---
+@cli.group(
+    help="Chat with the running API server (interactive session without a subcommand).", invoke_without_command=True
+)
+@click.option("--url", default=API_URL, show_default=True, help="Base URL of the FastAPI server.")
+@click.pass_context
+def chat(ctx: click.Context, url: str) -> None:
+    """Commands that talk to the API over HTTP."""
+    if ctx.invoked_subcommand is None:
+        asyncio.run(_interactive_chat(url))
+
+
+async def _socket_turn(conversation: ChatSocket, query: str) -> None:
+    """Streams one reply over the chat WebSocket; Ctrl+C stops it, and with it the server's LLM call."""
+
+    async def show() -> None:
+        async for chunk in conversation.ask(query):
+            console.out(chunk, end="", highlight=False)
+
+    loop = asyncio.get_running_loop()
+    answer = asyncio.create_task(show())
+    previous = signal.getsignal(signal.SIGINT)
+    signal.signal(signal.SIGINT, lambda *_: loop.call_soon_threadsafe(answer.cancel))
+    try:
+        await asyncio.wait([answer])
+    finally:
+        signal.signal(signal.SIGINT, previous)
+        answer.cancel()  # no-op unless we are being cancelled ourselves
+    console.print()
+    if answer.cancelled():
+        await conversation.cancel()
+        console.print(STR["answer_cancelled"])
+    else:
+        answer.result()
+
+
+async def _interactive_chat(url: str) -> None:
+    """
+    Start an interactive chat session, streaming each reply as it is generated:
+    over one WebSocket for the whole session, or per-turn HTTP streaming when
+    the server has no `/chat/ws`.
+    """
+    async with AsyncAPI(url) as api, contextlib.AsyncExitStack() as stack:
+        try:
+            token = await setup_cli_session_auth(api)
+        except Exception as e:
+            console.print(STR["auth_critical_error"].format(error=e))
+            console.print(STR["auth_cannot_start"])
+            return
+        if not token:
+            console.print(STR["auth_failed_exit"])
+            console.print(STR["auth_failed_check_server"])
+            if CLIENT_DEMO_MODE:
+                console.print(STR["auth_failed_check_env_demo"])
+            return
+
+        user_email_for_banner = cfg.DEMO_USER_EMAIL if CLIENT_DEMO_MODE else "authenticated user"
+        console.print(STR["authenticated_as_banner"].format(email=user_email_for_banner) + STR["greeting_banner"])
+        console.print(STR["type_exit_prompt"])
+
+        session_id = uuid.uuid4().hex
+        conversation: ChatSocket | None = None
+        try:
+            conversation = await stack.enter_async_context(api.chat_socket(session_id))
+        except APIError:
+            pass  # older server (or no websockets package): stream each turn over HTTP
+        while True:
+            try:
+                query = (await asyncio.to_thread(console.input, STR["user_prompt"])).strip()
+            except (KeyboardInterrupt, EOFError):  # Handle Ctrl+C or EOF (Ctrl+D) during input
+                console.print(STR["bye_message"])
+                break
+
+            if query.lower() in {"exit", "quit", "צא"}:
+                console.print(STR["bye_message"])
+                break
+            if not query:
+                continue
+
+            console.print(Text(STR["ai_prompt"], style="bold cyan"), end="")
+            try:
+                if conversation is not None:
+                    await _socket_turn(conversation, query)
+                    continue
+                async for chunk in api.chat_stream(query, session_id=session_id):
+                    console.out(chunk, end="", highlight=False)
+                console.print()
+            except APIError as ex_api:
+                console.print()
+                if conversation is not None and conversation.broken:
+                    conversation = None  # the socket broke: carry on over HTTP with the same session
+                if ex_api.status_code == 404:  # Server without /chat/stream: fall back to a blocking reply
+                    console.print(await api.chat(query, session_id=session_id))
+                    continue
+                console.print(STR["http_error_from_server"].format(status_code=ex_api.status_code, text=ex_api))
+                if ex_api.status_code == 401:
+                    console.print(STR["session_expired_error"])
+            except httpx.HTTPError as ex:
+                console.print()
+                console.print(STR["generic_comms_error"])
+                console.print(STR["details_to_stderr"])
+                traceback.print_exception(ex, file=sys.stderr)
+                break
+
+
+@chat.command(
+    name="replay", help="Replay recorded chat traffic (TRAFFIC_RECORDING_PATH) and report latency and error rates."
+)
+@click.argument("log_path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--url", default=API_URL, show_default=True, help="Base URL of the API (DFM_API_URL).")
+@click.option(
+    "--speed",
+    default="1",
+    show_default=True,
+    help="Time scale: 1 = original pacing, 10 = ten times faster, 'max' = no waiting between turns.",
+)
+@click.option("--users", type=click.IntRange(1), default=100, show_default=True, help="Sessions replayed at once.")
+@click.option("--repeat", type=click.IntRange(1), default=1, show_default=True, help="Copies of each session.")
+@click.option("--token", envvar="DFM_API_TOKEN", default=None, help="Bearer token (DFM_API_TOKEN).")
+@click.option("--email", default=None, help="Log in as this user instead of passing --token.")
+@click.option("--password", default=None, help="Password for --email.")
+@click.option("--timeout", default=60.0, show_default=True, help="Per-request timeout in seconds.")
+@click.option("--out", "out_path", default=None, help="Also write the JSON report to this file.")
+def replay_traffic(
+    log_path: str,
+    url: str,
+    speed: str,
+    users: int,
+    repeat: int,
+    token: Optional[str],
+    email: Optional[str],
+    password: Optional[str],
+    timeout: float,
+    out_path: Optional[str],
+) -> None:
+    try:
+        scale = 0.0 if speed.lower() == "max" else float(speed)
+    except ValueError:
+        raise click.BadParameter("Expected a number or 'max'.", param_hint="--speed")
+    if scale < 0:
+        raise click.BadParameter("Must not be negative.", param_hint="--speed")
+    turns, skipped = load_turns(log_path)
+    sessions = len({turn.session for turn in turns})
+    click.echo(
+        f"Replaying {len(turns)} turns from {sessions} sessions x{repeat} against {url} "
+        f"(speed {speed}, {users} users, {skipped} unreadable lines skipped)",
+        err=True,
+    )
+    report = asyncio.run(_replay_traffic(turns, url, scale, users, repeat, token, email, password, timeout))
+    _echo_replay_report(report)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+async def _replay_traffic(
+    turns: list,
+    url: str,
+    speed: float,
+    users: int,
+    repeat: int,
+    token: Optional[str],
+    email: Optional[str],
+    password: Optional[str],
+    timeout: float,
+) -> dict:
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        if email:
+            response = await client.post("/auth/login", data={"username": email, "password": password or ""})
+            if response.status_code != 200:
+                raise click.ClickException(f"Login failed: HTTP {response.status_code} {response.text[:200]}")
+            token = response.json()["access_token"]
+        if token:
+            client.headers["Authorization"] = f"Bearer {token}"
+        return await replay(client, turns, speed=speed, users=users, repeat=repeat)
+
+
+def _echo_replay_report(report: dict) -> None:
+    click.echo(
+        f"{report['overall']['requests']} requests in {report['elapsed_s']}s "
+        f"({report['throughput_rps']} req/s), schedule lag p95 {report['lag_p95_ms']} ms"
+    )
+    click.echo(f"{'branch':<10} {'requests':>8} {'err_rate':>8} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for name, row in [("all", report["overall"]), *report["branches"].items()]:
+        click.echo(
+            f"{name:<10} {row['requests']:>8} {row['error_rate']:>8.2%} "
+            f"{row['p50_ms'] or '-':>9} {row['p95_ms'] or '-':>9} {row['p99_ms'] or '-':>9}"
+        )
+    click.echo(f"statuses: {report['statuses']}")
+    for error in report["first_errors"]:
+        click.echo(f"error: {error}", err=True)
+
+
+# --------------------------------------------------------------------------- #
+# Entry-point
+# --------------------------------------------------------------------------- #
+
+
+def main_entry_point():  # Renamed to avoid confusion with click's own main methods
+    """Main entry point for the CLI."""
+    cli(auto_envvar_prefix="DFM")
+
+
+if __name__ == "__main__":
+    # To run this CLI directly:
+    # `python -m app.cli rag summarize --since 2025-06-01`
+    main_entry_point()
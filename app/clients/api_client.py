@@ -1,5 +1,12 @@
+import asyncio
+import base64
+import contextlib
 import json
-from typing import Any, Iterator, cast
+import random
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Iterator, cast
 
 import httpx
 from pydantic import BaseModel
@@ -29,14 +36,45 @@ class ChatResponse(BaseModel):
     session_id: str | None = None  # Assuming session_id might be part of the response
 
 
+def stream_delta(line: str) -> str | None:
+    """
+    The reply text in one line of a `/chat/stream` NDJSON response: `{"delta": "..."}`
+    lines carry text, the closing `{"reply": ...}` line none; an `{"error": ...}` line
+    raises APIError. Bare JSON strings and non-JSON lines are taken as text.
+    """
+    if not line.strip():
+        return None
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError:
+        return line
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict) and item.get("error"):
+        raise APIError(f"Stream failed: {item['error']}")
+    if isinstance(item, dict) and isinstance(item.get("delta"), str):
+        return cast(str, item["delta"])
+    return None
+
+
 class SyncAPI:
-    """Synchronous client for interacting with the DFM API."""
+    """
+    Synchronous client for interacting with the DFM API.
+
+    Pass `client` to share one pooled `httpx.Client` between many SyncAPI
+    instances (e.g. one per Streamlit session): the token stays on the
+    instance and is sent per request, never set on the shared client.
+    """
 
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", client: httpx.Client | None = None):
         self.base_url = base_url
-        self.client = httpx.Client(base_url=base_url, timeout=30.0)
+        self._owns_client = client is None
+        self.client = client if client is not None else httpx.Client(base_url=base_url, timeout=30.0)
         self.token: str | None = None
 
+    def _auth_headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
     def _handle_response(self, response: httpx.Response) -> Any:
         if not response.is_success:
             try:
@@ -79,30 +117,46 @@ class SyncAPI:
 
     def login(self, email: str, password: str) -> None:
         self.token = self._get_access_token(email, password)
-        self.client.headers["Authorization"] = f"Bearer {self.token}"
 
-    def register(self, email: str, password: str) -> UserRead:
-        payload = {"email": email, "password": password, "is_active": True, "is_superuser": False, "is_verified": False}
+    def register(self, email: str, password: str, **fields: Any) -> UserRead:
+        payload = {
+            "email": email,
+            "password": password,
+            "is_active": True,
+            "is_superuser": False,
+            "is_verified": False,
+            **fields,
+        }
         response = self.client.post("/auth/register", json=payload)
         data = self._handle_response(response)
         return UserRead(**data)  # Assuming UserRead can be created from the response dict
 
-    def chat(self, message: str) -> ChatResponse:
+    def chat(self, message: str, session_id: str | None = None) -> ChatResponse:
         if not self.token:
             raise APIError("Not authenticated. Please login first.")
-        response = self.client.post("/chat/text", json={"message": message})
+        response = self.client.post(
+            "/chat/text", json={"message": message, "session_id": session_id}, headers=self._auth_headers()
+        )
         data = self._handle_response(response)
         return ChatResponse(**data)  # Assuming ChatResponse can be created from the response dict
 
-    def chat_stream(self, message: str) -> Iterator[str]:
+    def history(self, session_id: str, before: int | None = None, limit: int = 20) -> dict[str, Any]:
+        """One page of the conversation, oldest first; pass the returned `next_before` to get the page before it."""
+        params: dict[str, Any] = {"session_id": session_id, "limit": limit}
+        if before is not None:
+            params["before"] = before
+        response = self.client.get("/chat/history", params=params, headers=self._auth_headers())
+        return cast(dict[str, Any], self._handle_response(response))
+
+    def chat_stream(self, message: str, session_id: str | None = None) -> Iterator[str]:
         """
-        Sends a message to the /chat/stream endpoint and yields response chunks.
-        Assumes the stream returns newline-separated JSON objects, each being a string chunk.
+        Sends a message to the /chat/stream endpoint and yields reply text chunks as they arrive
+        (see `stream_delta` for the line format).
         """
         if not self.token:
             raise APIError("Not authenticated. Please login first.")
-        headers = {"Authorization": f"Bearer {self.token}", "Accept": "application/x-ndjson"}
-        payload = {"message": message}
+        headers = {**self._auth_headers(), "Accept": "application/x-ndjson"}
+        payload = {"message": message, "session_id": session_id}
 
         with self.client.stream("POST", "/chat/stream", json=payload, headers=headers) as response:
             if not response.is_success:
@@ -110,23 +164,16 @@ class SyncAPI:
                 error_content = "".join([chunk.decode() for chunk in response.iter_bytes()])
                 try:
                     detail = json.loads(error_content).get("detail", error_content)
-                except json.JSONDecodeError:
+                except (json.JSONDecodeError, AttributeError):
                     detail = error_content
                 raise APIError(
                     f"API stream request failed: {response.status_code} - {detail}",
                     status_code=response.status_code,
                 )
-            for line_bytes in response.iter_lines():
-                line = line_bytes  # httpx iter_lines already decodes by default
-                if line:
-                    # Assuming each line is a string chunk directly, not JSON for this example
-                    # If each line IS a JSON object like {"chunk": "text"}, adjust parsing:
-                    # try:
-                    #   data = json.loads(line)
-                    #   yield cast(str, data.get("chunk", ""))
-                    # except json.JSONDecodeError:
-                    #   print(f"Warning: Could not decode JSON line from stream: {line}")
-                    yield cast(str, line)
+            for line in response.iter_lines():  # httpx iter_lines already decodes by default
+                delta = stream_delta(line)
+                if delta:
+                    yield delta
 
     def logout(self) -> None:
         if not self.token:
@@ -134,11 +181,344 @@ class SyncAPI:
             # print("Not logged in, so no logout action taken.")
             return
         try:
-            self.client.post("/auth/logout")
+            self.client.post("/auth/logout", headers=self._auth_headers())
         except httpx.RequestError as e:
             # Handle network errors during logout if necessary
             print(f"Network error during logout: {e}")
         finally:
             self.token = None
-            if "Authorization" in self.client.headers:
-                del self.client.headers["Authorization"]
+
+    def close(self) -> None:
+        """Closes the connection pool, unless it was passed in (shared)."""
+        if self._owns_client:
+            self.client.close()
+
+
+RETRY_STATUSES = (429, 503, 504)
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None if absent/invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _token_expiry(token: str) -> float | None:
+    """The `exp` claim of a JWT (read without verification: only used to refresh early), or None."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return None
+
+
+class ChatSocket:
+    """One conversation over `/chat/ws` (see `AsyncAPI.chat_socket`): one answer at a time."""
+
+    def __init__(self, connection: Any, session_id: str):
+        self._ws = connection
+        self.session_id = session_id
+        self.broken = False  # the connection failed; open a new one (or fall back to HTTP)
+
+    async def _send(self, frame: dict[str, Any]) -> None:
+        try:
+            await self._ws.send(json.dumps(frame))
+        except Exception as e:  # ConnectionClosed or OSError: the conversation cannot go on
+            self.broken = True
+            raise APIError(f"Chat WebSocket failed: {e}") from e
+
+    async def _frame(self) -> dict[str, Any]:
+        try:
+            return cast(dict[str, Any], json.loads(await self._ws.recv()))
+        except Exception as e:  # as in _send, or a frame that is not JSON
+            self.broken = True
+            raise APIError(f"Chat WebSocket failed: {e}") from e
+
+    async def ask(self, message: str) -> AsyncIterator[str]:
+        """Sends one turn and yields the reply text chunks until the reply is complete."""
+        await self._send({"type": "message", "message": message})
+        while True:
+            frame = await self._frame()
+            if frame.get("type") == "delta":
+                yield frame["delta"]
+            elif frame.get("type") == "error":
+                raise APIError(f"Chat failed: {frame.get('error')}")
+            elif frame.get("type") in ("reply", "cancelled"):
+                return
+
+    async def cancel(self) -> None:
+        """
+        Abandons an answer whose `ask` was interrupted; the server cancels its LLM
+        call. Returns once the server has acknowledged (or the reply had already finished).
+        """
+        await self._send({"type": "cancel"})
+        while (await self._frame()).get("type") not in ("cancelled", "reply", "error"):
+            pass
+
+
+class AsyncAPI:
+    """
+    Asynchronous client for the DFM API, for running many concurrent conversations from one process.
+
+    All calls share one `httpx.AsyncClient` connection pool (`max_connections`
+    in flight, optionally over HTTP/2, which needs `pip install httpx[http2]`).
+    Requests answered with 429/503/504, or that could not connect, are retried
+    up to `max_retries` times with full-jitter exponential backoff, waiting at
+    least as long as the server's Retry-After. After `login`, the token is
+    renewed by logging in again shortly before it expires, or once after a 401.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        *,
+        http2: bool = False,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        refresh_margin: float = 60.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+        token: str | None = None,
+    ):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.refresh_margin = refresh_margin
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        try:
+            self._client = httpx.AsyncClient(
+                base_url=base_url, timeout=timeout, limits=limits, http2=http2, transport=transport
+            )
+        except ImportError as e:
+            raise APIError(f"HTTP/2 needs the h2 package (pip install 'httpx[http2]'): {e}") from e
+        self._token: str | None = None
+        self._token_expires_at: float | None = None
+        self._credentials: tuple[str, str] | None = None
+        self._set_token(token)  # a ready-made token (e.g. DFM_API_TOKEN) cannot be renewed
+        self._login_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncAPI":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    # ------------------------------------------------------------------ auth
+
+    def _set_token(self, token: str | None) -> None:
+        self._token = token
+        self._token_expires_at = _token_expiry(token) if token else None
+
+    async def login(self, email: str, password: str) -> str:
+        """Logs in and keeps the credentials, so the token can be renewed when it expires."""
+        response = await self._send("POST", "/auth/login", data={"username": email, "password": password}, auth=False)
+        data = self._handle_response(response, "Login failed")
+        if not isinstance(data, dict) or not isinstance(data.get("access_token"), str):
+            raise APIError(f"Access token not found in login response: {data}")
+        self._credentials = (email, password)
+        self._set_token(data["access_token"])
+        return data["access_token"]
+
+    async def _refresh(self, stale_token: str | None) -> None:
+        async with self._login_lock:
+            # Many concurrent calls may see the same stale token: only the first one logs in again
+            if self._token == stale_token and self._credentials is not None:
+                await self.login(*self._credentials)
+
+    async def register(self, email: str, password: str, **fields: Any) -> UserRead:
+        payload = {"email": email, "password": password, **fields}
+        response = await self._send("POST", "/auth/register", json=payload, auth=False)
+        return UserRead(**self._handle_response(response, "Registration failed"))
+
+    async def logout(self) -> None:
+        if self._token is None:
+            return
+        try:
+            await self._send("POST", "/auth/logout")
+        except httpx.RequestError:
+            pass
+        finally:
+            self._set_token(None)
+            self._credentials = None
+
+    # ------------------------------------------------------------------ transport
+
+    def _auth_headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self._token}"} if self._token else {}
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    async def _before_request(self, auth: bool) -> None:
+        expires_at = self._token_expires_at
+        if auth and expires_at is not None and expires_at - time.time() < self.refresh_margin:
+            await self._refresh(self._token)
+
+    async def _send(self, method: str, url: str, *, auth: bool = True, **kwargs: Any) -> httpx.Response:
+        """One request with retries on 429/503/504 and connection failures, and one re-login after a 401."""
+        await self._before_request(auth)
+        extra_headers = kwargs.pop("headers", {})
+        refreshed = False
+        attempt = 0
+        while True:
+            token = self._token
+            headers = {**extra_headers, **(self._auth_headers() if auth else {})}
+            try:
+                response = await self._client.request(method, url, headers=headers, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # The request never reached the server, so even a POST is safe to repeat
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, None))
+                attempt += 1
+                continue
+            if response.status_code == 401 and auth and not refreshed and self._credentials is not None:
+                refreshed = True
+                await self._refresh(token)
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after_seconds(response.headers.get("Retry-After"))))
+                attempt += 1
+                continue
+            return response
+
+    def _handle_response(self, response: httpx.Response, what: str = "API request failed") -> Any:
+        if not response.is_success:
+            try:
+                detail = response.json().get("detail", response.text)
+            except (json.JSONDecodeError, AttributeError):
+                detail = response.text
+            raise APIError(f"{what}: {response.status_code} - {detail}", status_code=response.status_code)
+        try:
+            return response.json()
+        except json.JSONDecodeError:
+            return response.text
+
+    # ------------------------------------------------------------------ chat
+
+    async def chat(self, message: str, session_id: str | None = None) -> str:
+        response = await self._send("POST", "/chat/text", json={"message": message, "session_id": session_id})
+        return ChatResponse(**self._handle_response(response)).reply
+
+    async def ingest_document(
+        self, namespace: str, doc_id: str, content: bytes, filename: str = "document.txt", **fields: str
+    ) -> dict[str, Any]:
+        """Uploads one document to `/rag/ingest/` (extra form fields: user_id, session_id)."""
+        data = {"namespace": namespace, "doc_id": doc_id, **fields}
+        files = {"file": (filename, content, "text/plain")}
+        response = await self._send("POST", "/rag/ingest/", data=data, files=files)
+        return cast(dict[str, Any], self._handle_response(response, "Ingest failed"))
+
+    async def history(self, session_id: str, before: int | None = None, limit: int = 20) -> dict[str, Any]:
+        params: dict[str, Any] = {"session_id": session_id, "limit": limit}
+        if before is not None:
+            params["before"] = before
+        return cast(dict[str, Any], self._handle_response(await self._send("GET", "/chat/history", params=params)))
+
+    @contextlib.asynccontextmanager
+    async def chat_socket(self, session_id: str | None = None) -> AsyncIterator[ChatSocket]:
+        """
+        Opens a `/chat/ws` conversation, authenticated once with the current
+        token, for many turns without per-request overhead. Needs the websockets
+        package (installed with uvicorn[standard]); raises APIError if the
+        socket cannot be opened, e.g. against a server without `/chat/ws`.
+        """
+        try:
+            import websockets
+        except ImportError as e:
+            raise APIError(f"The chat WebSocket needs the websockets package (pip install websockets): {e}") from e
+        await self._before_request(True)
+        url = self.base_url.replace("http", "ws", 1).rstrip("/") + "/chat/ws"
+        if session_id:
+            url += "?" + str(httpx.QueryParams({"session_id": session_id}))
+        try:
+            connection = await websockets.connect(url)
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            raise APIError(f"Could not open the chat WebSocket: {e}", status_code=status) from e
+        async with connection:
+            conversation = ChatSocket(connection, session_id or "")
+            if self._token:
+                await conversation._send({"type": "auth", "token": self._token})
+            ready = await conversation._frame()
+            if ready.get("type") != "ready":
+                raise APIError(f"Chat WebSocket refused: {ready.get('error')}", status_code=401)
+            conversation.session_id = ready["session_id"]
+            yield conversation
+
+    async def _stream_lines(self, path: str, payload: dict[str, Any], what: str) -> AsyncIterator[str]:
+        """POSTs `payload` and yields the response lines as they arrive; retries happen only before the first."""
+        await self._before_request(True)
+        attempt = 0
+        refreshed = False
+        while True:
+            token = self._token
+            headers = {**self._auth_headers(), "Accept": "application/x-ndjson"}
+            async with self._client.stream("POST", path, json=payload, headers=headers) as response:
+                if response.status_code == 401 and self._credentials is not None and not refreshed:
+                    refreshed = True
+                    await self._refresh(token)
+                    continue
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    delay = self._backoff(attempt, retry_after_seconds(response.headers.get("Retry-After")))
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                if not response.is_success:
+                    await response.aread()
+                    self._handle_response(response, what)
+                async for line in response.aiter_lines():
+                    yield line
+                return
+
+    async def chat_stream(self, message: str, session_id: str | None = None) -> AsyncIterator[str]:
+        """
+        Yields reply text chunks from `/chat/stream` as they arrive (see
+        `stream_delta`). Retries happen only before the first chunk.
+        """
+        payload = {"message": message, "session_id": session_id}
+        async for line in self._stream_lines("/chat/stream", payload, "API stream request failed"):
+            delta = stream_delta(line)
+            if delta:
+                yield delta
+
+    # ------------------------------------------------------------------ rag
+
+    async def summarize_sessions(
+        self,
+        session_ids: list[str] | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        concurrency: int | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yields one result per session from `/rag/sessions/summarize` (superusers
+        only) as the server finishes it: an explicit list, or a date range.
+        """
+        payload: dict[str, Any] = {"session_ids": session_ids or None, "concurrency": concurrency}
+        payload.update({key: value.isoformat() for key, value in (("since", since), ("until", until)) if value})
+        async for line in self._stream_lines("/rag/sessions/summarize", payload, "Summarizing sessions failed"):
+            if line.strip():
+                yield cast(dict[str, Any], json.loads(line))
@@ -0,0 +1,224 @@
+# app/clients/bulk_ingest.py
+"""
+Parallel, resumable ingestion of a directory of documents into one RAG namespace.
+
+Files are discovered lazily (a directory walk, never a full listing up front)
+and handed to `concurrency` workers, which either upload them to a running
+API (`/rag/ingest/`, through AsyncAPI with its retries) or ingest them
+in-process through `DocumentProcessor.ingest_many`, several files per
+embedding call. Each finished document is appended to a JSON-lines manifest
+together with its size and mtime; a rerun skips documents whose manifest
+entry still matches the file, so an interrupted run resumes without
+re-embedding what is already stored. A file that changed since its entry is
+re-ingested in place of its old chunks (a shorter version would otherwise
+leave its old trailing chunks behind).
+"""
+
+import asyncio
+import json
+import os
+import re
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+)
+
+
+class SourceFile(NamedTuple):
+    path: str
+    doc_id: str
+    fingerprint: str  # "<size>:<mtime_ns>": changes when the file is edited
+    size: int
+    replaces: bool = False  # in the manifest with another fingerprint: its old chunks are deleted first
+
+
+class IngestResult(NamedTuple):
+    file: SourceFile
+    error: Optional[str] = None
+
+
+def discover(root: str, extensions: Iterable[str], recursive: bool = True) -> Iterator[str]:
+    """Paths of the files under `root` with one of `extensions`, in a stable order, one directory at a time."""
+    suffixes = tuple(ext.lower() for ext in extensions)
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as entries:
+            children = sorted(entries, key=lambda entry: entry.name)
+        subdirectories = []
+        for entry in children:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+            elif entry.is_file() and entry.name.lower().endswith(suffixes):
+                yield entry.path
+        if recursive:
+            pending.extend(reversed(subdirectories))
+
+
+def doc_id_for(path: str, root: str, prefix: str) -> str:
+    """A doc id that stays the same across runs: the prefix plus the file's path relative to `root`."""
+    relative = os.path.splitext(os.path.relpath(path, root))[0]
+    slug = re.sub(r"[^0-9a-z]+", "_", relative.lower()).strip("_")
+    return f"{prefix}_{slug}" if prefix else slug
+
+
+class Manifest:
+    """Append-only JSON lines of ingested documents: {"doc_id", "fingerprint", "path"}."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._done: Dict[str, str] = {}  # doc_id -> fingerprint
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._done[entry["doc_id"]] = entry["fingerprint"]
+                    except (ValueError, KeyError, TypeError):
+                        continue  # a line cut short by an interrupted run
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._done
+
+    def is_done(self, source: SourceFile) -> bool:
+        return self._done.get(source.doc_id) == source.fingerprint
+
+    def mark_done(self, source: SourceFile) -> None:
+        self._done[source.doc_id] = source.fingerprint
+        entry = {"doc_id": source.doc_id, "fingerprint": source.fingerprint, "path": source.path}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()  # a crash loses at most the documents still in flight
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def pending_files(
+    paths: Iterable[str], root: str, prefix: str, manifest: Manifest, on_skip: Callable[[SourceFile], None]
+) -> Iterator[SourceFile]:
+    """The discovered files that are not in the manifest with their current fingerprint."""
+    seen: Set[str] = set()
+    for path in paths:
+        stat = os.stat(path)
+        source = SourceFile(path, doc_id_for(path, root, prefix), f"{stat.st_size}:{stat.st_mtime_ns}", stat.st_size)
+        if source.doc_id in seen:
+            raise ValueError(f"{path} maps to the doc id {source.doc_id} of another file; rename one of them")
+        seen.add(source.doc_id)
+        if manifest.is_done(source):
+            on_skip(source)
+        else:
+            yield source._replace(replaces=source.doc_id in manifest)
+
+
+def batches(files: Iterable[SourceFile], max_files: int, max_bytes: int) -> Iterator[List[SourceFile]]:
+    """Groups files for one in-process `ingest_many` call, up to `max_files` files or `max_bytes` bytes."""
+    batch: List[SourceFile] = []
+    size = 0
+    for source in files:
+        if batch and (len(batch) >= max_files or size + source.size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(source)
+        size += source.size
+    if batch:
+        yield batch
+
+
+async def run_workers(
+    jobs: Iterable[Any], worker: Callable[[Any], Awaitable[List[IngestResult]]], concurrency: int
+) -> AsyncIterator[IngestResult]:
+    """
+    Runs `worker` on the jobs with at most `concurrency` in flight and yields
+    results as they finish. Jobs are pulled from the iterable only when a
+    worker is free, so discovery stays lazy however large the corpus is.
+    """
+    iterator = iter(jobs)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def work() -> None:
+        for job in iterator:  # shared iterator: each job is taken by exactly one worker
+            for result in await worker(job):
+                await results.put(result)
+
+    def closed(future: asyncio.Future) -> None:
+        if not future.cancelled():
+            future.exception()  # marks it retrieved; re-raised by `await finished` below
+        results.put_nowait(None)
+
+    tasks = [asyncio.create_task(work()) for _ in range(max(1, concurrency))]
+    finished = asyncio.gather(*tasks)
+    finished.add_done_callback(closed)
+    try:
+        while (result := await results.get()) is not None:
+            yield result
+        await finished  # re-raises a failed discovery (e.g. a doc id collision)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def read_text(source: SourceFile) -> str:
+    with open(source.path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def http_worker(
+    api: Any, namespace: str, fields: Dict[str, str]
+) -> Callable[[SourceFile], Awaitable[List[IngestResult]]]:
+    """Uploads one file per job through AsyncAPI.ingest_document."""
+
+    async def upload(source: SourceFile) -> List[IngestResult]:
+        try:
+            content = await asyncio.to_thread(read_text, source)
+            await api.ingest_document(
+                namespace, source.doc_id, content.encode("utf-8"), os.path.basename(source.path), **fields
+            )
+        except Exception as e:
+            return [IngestResult(source, f"{type(e).__name__}: {e}")]
+        return [IngestResult(source)]
+
+    return upload
+
+
+def processor_worker(
+    processor: Any, namespace: str, fields: Dict[str, str]
+) -> Callable[[List[SourceFile]], Awaitable[List[IngestResult]]]:
+    """Ingests one batch of files per job with DocumentProcessor.ingest_many, off the event loop."""
+
+    def ingest(batch: List[SourceFile]) -> None:
+        changed = [source.doc_id for source in batch if source.replaces]
+        if changed:
+            processor.delete_documents(where={"doc_id": {"$in": changed}})
+        documents = [
+            (source.doc_id, read_text(source), {"namespace": namespace, "source_file": source.path, **fields})
+            for source in batch
+        ]
+        processor.ingest_many(documents)
+
+    async def run(batch: List[SourceFile]) -> List[IngestResult]:
+        try:
+            await asyncio.to_thread(ingest, batch)
+        except Exception as e:
+            return [IngestResult(source, f"{type(e).__name__}: {e}") for source in batch]
+        return [IngestResult(source) for source in batch]
+
+    return run
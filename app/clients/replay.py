@@ -0,0 +1,165 @@
+# app/clients/replay.py
+"""
+Re-drives recorded chat traffic (see app/core/traffic.py) against a running API.
+
+Each recorded session becomes a virtual user that sends its turns in order,
+each turn only after the previous reply, like a real client. Turn start
+times follow the recording divided by `speed` (speed 0 = as fast as
+possible); `users` caps how many sessions run at once, and `repeat` replays
+every session that many times under distinct session ids to multiply load.
+When the client cannot keep up, turns go out late; the report shows that as
+schedule lag, so a saturated load generator is not mistaken for a slow API.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+
+class RecordedTurn(NamedTuple):
+    ts: float
+    session: str
+    message: str
+    path: str = "/chat/text"
+    branch: Optional[str] = None
+
+
+class TurnResult(NamedTuple):
+    branch: str
+    status: Optional[int]  # None: no response (connection error or timeout)
+    seconds: float
+    lag_seconds: float  # how late the turn was sent compared to its schedule
+    error: Optional[str]
+
+
+def load_turns(path: str) -> Tuple[List[RecordedTurn], int]:
+    """The recorded turns sorted by time, and the number of unreadable lines skipped."""
+    turns: List[RecordedTurn] = []
+    skipped = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                turns.append(
+                    RecordedTurn(
+                        float(entry["ts"]),
+                        str(entry["session"]),
+                        str(entry["message"]),
+                        entry.get("path") or "/chat/text",
+                        entry.get("branch"),
+                    )
+                )
+            except (ValueError, KeyError, TypeError):
+                skipped += 1
+    turns.sort(key=lambda turn: turn.ts)
+    return turns, skipped
+
+
+def sessions(turns: Iterable[RecordedTurn], repeat: int = 1) -> Dict[str, List[RecordedTurn]]:
+    """Turns grouped per (copy of each) session, in time order."""
+    grouped: Dict[str, List[RecordedTurn]] = defaultdict(list)
+    for turn in turns:
+        for copy in range(repeat):
+            grouped[turn.session if repeat == 1 else f"{turn.session}-r{copy}"].append(turn)
+    return grouped
+
+
+def _percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _summary(results: List[TurnResult]) -> Dict[str, Any]:
+    latencies = [r.seconds for r in results if r.error is None]
+    errors = sum(1 for r in results if r.error is not None)
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "p50_ms": ms(_percentile(latencies, 50)),
+        "p95_ms": ms(_percentile(latencies, 95)),
+        "p99_ms": ms(_percentile(latencies, 99)),
+        "max_ms": ms(max(latencies) if latencies else None),
+    }
+
+
+def build_report(results: List[TurnResult], elapsed: float) -> Dict[str, Any]:
+    """Overall and per-branch latency percentiles and error rates, status counts and schedule lag."""
+    by_branch: Dict[str, List[TurnResult]] = defaultdict(list)
+    for result in results:
+        by_branch[result.branch].append(result)
+    lags = [r.lag_seconds for r in results]
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 3) if elapsed > 0 else 0.0,
+        "overall": _summary(results),
+        "branches": {branch: _summary(rows) for branch, rows in sorted(by_branch.items())},
+        "statuses": {str(k): v for k, v in sorted(Counter(r.status for r in results).items(), key=str)},
+        "lag_p95_ms": round((_percentile(lags, 95) or 0.0) * 1000, 1),
+        "first_errors": sorted({r.error for r in results if r.error})[:5],
+    }
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    turns: List[RecordedTurn],
+    speed: float = 1.0,
+    users: int = 100,
+    repeat: int = 1,
+) -> Dict[str, Any]:
+    """Replays `turns` through `client` (base URL and auth already set) and returns the report."""
+    if not turns:
+        return build_report([], 0.0)
+    origin = turns[0].ts
+    limit = asyncio.Semaphore(max(1, users))
+    results: List[TurnResult] = []
+    start = time.perf_counter()
+
+    def until_due(turn: RecordedTurn) -> float:
+        due = (turn.ts - origin) / speed if speed > 0 else 0.0
+        return due - (time.perf_counter() - start)
+
+    async def virtual_user(session_id: str, session_turns: List[RecordedTurn]) -> None:
+        first_delay = until_due(session_turns[0])
+        if first_delay > 0:
+            await asyncio.sleep(first_delay)  # not holding a user slot while the session has not started
+        async with limit:
+            for turn in session_turns:
+                delay = until_due(turn)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lag = max(0.0, -delay)
+                sent = time.perf_counter()
+                status: Optional[int] = None
+                error: Optional[str] = None
+                try:
+                    response = await client.post(turn.path, json={"message": turn.message, "session_id": session_id})
+                    status = response.status_code
+                    if response.status_code >= 400:
+                        error = f"HTTP {response.status_code}"
+                except httpx.HTTPError as e:
+                    error = f"{type(e).__name__}: {e}"
+                results.append(TurnResult(turn.branch or "unknown", status, time.perf_counter() - sent, lag, error))
+
+    await asyncio.gather(
+        *(
+            virtual_user(f"replay-{session}", session_turns)
+            for session, session_turns in sessions(turns, repeat).items()
+        )
+    )
+    return build_report(results, time.perf_counter() - start)
@@ -0,0 +1,57 @@
+# app/core/callbacks.py
+"""LangChain callback handlers that feed the in-process metrics registry."""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.core.metrics import counter, histogram
+
+llm_latency = histogram(
+    "dfm_llm_latency_seconds",
+    "LLM call latency by model; phase is time-to-first-token (streaming calls only) or total.",
+    ("model", "phase"),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0),
+)
+llm_errors = counter("dfm_llm_errors_total", "LLM calls that raised, by model.", ("model",))
+
+
+class LLMLatencyHandler(BaseCallbackHandler):
+    """Times every chat/LLM run it is attached to (keyed by run_id, so one instance serves concurrent calls)."""
+
+    run_inline = True  # bookkeeping only; don't hop to an executor for it
+
+    def __init__(self) -> None:
+        # run_id -> (start, model, first token seen)
+        self._runs: Dict[UUID, Tuple[float, str, bool]] = {}
+
+    def _start(self, run_id: UUID, metadata: Optional[Dict[str, Any]]) -> None:
+        model = str((metadata or {}).get("ls_model_name", "unknown"))
+        self._runs[run_id] = (time.perf_counter(), model, False)
+
+    def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._start(run_id, kwargs.get("metadata"))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs.get("metadata"))
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is not None and not run[2]:
+            start, model, _ = run
+            self._runs[run_id] = (start, model, True)
+            llm_latency.observe(time.perf_counter() - start, model=model, phase="ttft")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            llm_latency.observe(time.perf_counter() - run[0], model=run[1], phase="total")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            llm_errors.inc(model=run[1])
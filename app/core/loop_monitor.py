@@ -0,0 +1,93 @@
+# app/core/loop_monitor.py
+"""
+Event-loop lag watchdog.
+
+A task on the loop sleeps for a fixed interval and records how late it woke
+up (`dfm_event_loop_lag_seconds`): any sync call inside a handler (Chroma
+queries, password hashing, file IO) delays every concurrent request by that
+much. A late tick can only be measured after the blocking call has returned,
+so a separate watchdog thread checks the tick's heartbeat and, while the loop
+is stuck past the threshold, logs the loop thread's current Python stack
+once per stall. That stack is the blocking call.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.core.metrics import counter, histogram
+
+loop_lag_seconds = histogram(
+    "dfm_event_loop_lag_seconds",
+    "How late the event-loop watchdog tick woke up.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+loop_stalls = counter("dfm_event_loop_stalls_total", "Event-loop stalls past the threshold (stack logged).")
+
+
+class LoopLagMonitor:
+    def __init__(self, interval_seconds: float = 0.1, threshold_seconds: float = 0.25, stack_limit: int = 40):
+        self.interval_seconds = interval_seconds
+        self.threshold_seconds = threshold_seconds
+        self.stack_limit = stack_limit
+        self.max_lag_seconds = 0.0
+        self.last_stall_stack: Optional[str] = None
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Starts the tick task on the running loop and the watchdog thread."""
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="dfm-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join()
+
+    async def _tick(self) -> None:
+        while True:
+            due = time.monotonic() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            now = time.monotonic()
+            lag = max(0.0, now - due)
+            loop_lag_seconds.observe(lag)
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+            self._heartbeat = now
+
+    def _watch(self) -> None:
+        logged_for: Optional[float] = None  # heartbeat of the stall already logged
+        check_every = max(0.005, self.threshold_seconds / 4)
+        while not self._stop.wait(check_every):
+            heartbeat = self._heartbeat
+            late = time.monotonic() - heartbeat - self.interval_seconds
+            if late < self.threshold_seconds or heartbeat == logged_for:
+                continue
+            logged_for = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)  # type: ignore[arg-type]
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=self.stack_limit))
+            self.last_stall_stack = stack
+            loop_stalls.inc()
+            logging.warning(
+                f"Event loop blocked for {late * 1000:.0f} ms and counting "
+                f"(threshold {self.threshold_seconds * 1000:.0f} ms). Loop thread stack:\n{stack}"
+            )
@@ -0,0 +1,170 @@
+# app/core/memory_diagnostics.py
+"""
+Memory diagnostics for the admin endpoints (app/api/admin.py): tracemalloc and process stats.
+
+`tracemalloc` is process-wide and slows allocations while tracing, so it is
+only started on demand (`TracemallocSession.start`). Statistics are grouped
+by the allocating module ("app.rag.processor"), by top-level package
+("chromadb", "langchain_core") or by source line. Snapshots are numbered and
+the oldest are dropped beyond `max_snapshots`, so they can be diffed later
+without keeping every one in memory.
+"""
+
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+_IGNORED = (
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+)
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux /proc; elsewhere the peak so far)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def _search_roots() -> List[str]:
+    roots = {os.path.abspath(p or os.getcwd()) for p in sys.path if p is not None}
+    return sorted(roots, key=len, reverse=True)  # most specific first (site-packages before the stdlib dir)
+
+
+def module_of(filename: str, roots: Optional[List[str]] = None) -> str:
+    """Dotted module name for a source file, from the sys.path entry it lives under."""
+    path = os.path.abspath(filename)
+    for root in roots if roots is not None else _search_roots():
+        if path.startswith(root + os.sep):
+            relative = os.path.splitext(path[len(root) + 1 :])[0]
+            parts = relative.split(os.sep)
+            if parts[-1] == "__init__":
+                parts.pop()
+            return ".".join(parts) or filename
+    return filename
+
+
+def _group(statistics: List[Any], group_by: str) -> Dict[str, List[float]]:
+    """key -> [size bytes, count, size diff bytes, count diff] summed over `statistics`."""
+    roots = _search_roots()
+    grouped: Dict[str, List[float]] = {}
+    for stat in statistics:
+        frame = stat.traceback[0]
+        if group_by == "line":
+            key = f"{frame.filename}:{frame.lineno}"
+        else:
+            key = module_of(frame.filename, roots)
+            if group_by == "package":
+                key = key.split(".", 1)[0]
+        totals = grouped.setdefault(key, [0, 0, 0, 0])
+        totals[0] += stat.size
+        totals[1] += stat.count
+        totals[2] += getattr(stat, "size_diff", 0)
+        totals[3] += getattr(stat, "count_diff", 0)
+    return grouped
+
+
+def _rows(grouped: Dict[str, List[float]], limit: int, by_diff: bool) -> List[Dict[str, Any]]:
+    order = sorted(grouped.items(), key=lambda item: abs(item[1][2]) if by_diff else item[1][0], reverse=True)
+    rows = []
+    for key, (size, count, size_diff, count_diff) in order[:limit]:
+        row: Dict[str, Any] = {"site": key, "size_kb": round(size / 1024, 1), "count": int(count)}
+        if by_diff:
+            row.update(size_diff_kb=round(size_diff / 1024, 1), count_diff=int(count_diff))
+        rows.append(row)
+    return rows
+
+
+class TracemallocSession:
+    def __init__(self, max_snapshots: int = 4):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, Tuple[float, tracemalloc.Snapshot]]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        """Starts tracing (restarts with `frames` if already tracing with a different depth)."""
+        if tracemalloc.is_tracing() and tracemalloc.get_traceback_limit() != frames:
+            tracemalloc.stop()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        """Stops tracing and drops the snapshots (their traces are no longer comparable)."""
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing; start it first")
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, pattern) for pattern in _IGNORED])
+
+    def take_snapshot(self) -> int:
+        snapshot = self._snapshot()
+        with self._lock:
+            snapshot_id, self._next_id = self._next_id, self._next_id + 1
+            self._snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"id": i, "taken_at": round(taken, 3)} for i, (taken, _) in self._snapshots.items()]
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        with self._lock:
+            if snapshot_id not in self._snapshots:
+                raise KeyError(f"No snapshot {snapshot_id} (kept: {list(self._snapshots)})")
+            return self._snapshots[snapshot_id][1]
+
+    def top(self, limit: int = 20, group_by: str = "module") -> List[Dict[str, Any]]:
+        """Largest live allocation sites right now."""
+        statistics = self._snapshot().statistics("lineno")
+        return _rows(_group(statistics, group_by), limit, by_diff=False)
+
+    def diff(
+        self, base_id: int, other_id: Optional[int] = None, limit: int = 20, group_by: str = "module"
+    ) -> List[Dict[str, Any]]:
+        """Sites whose allocations changed most from snapshot `base_id` to `other_id` (default: now)."""
+        base = self._get(base_id)
+        other = self._get(other_id) if other_id is not None else self._snapshot()
+        statistics = other.compare_to(base, "lineno")
+        return _rows(_group(statistics, group_by), limit, by_diff=True)
+
+    def status(self) -> Dict[str, Any]:
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "traceback_frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+            "traced_mb": round(traced / 1024**2, 3),
+            "traced_peak_mb": round(peak / 1024**2, 3),
+            "tracemalloc_overhead_mb": round(tracemalloc.get_tracemalloc_memory() / 1024**2, 3),
+            "snapshots": self.snapshots(),
+        }
+
+
+def process_stats() -> Dict[str, Any]:
+    return {
+        "rss_mb": round(rss_mb(), 1),
+        "gc_counts": list(gc.get_count()),
+        "gc_objects_tracked": len(gc.get_objects()),
+        "threads": threading.active_count(),
+    }
@@ -0,0 +1,216 @@
+# app/core/metrics.py
+"""
+Tiny in-process metrics registry.
+
+Counters and histograms are kept in memory and are cheap enough to update
+on every chat turn. Use the module-level `counter()` / `histogram()` helpers
+instead of instantiating the classes directly, so the same metric name
+always maps to one object. `render_prometheus()` serves the registry in the
+Prometheus text exposition format (see the /metrics endpoint in create_app).
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple, Union
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(name: str, labelnames: Tuple[str, ...], labels: Dict[str, str]) -> Tuple[str, ...]:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Metric '{name}' expects labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[label]) for label in labelnames)
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return _label_key(self.name, self.labelnames, labels)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics), optionally split by labels."""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # per label key: [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return _label_key(self.name, self.labelnames, labels)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[idx] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes the wall-clock seconds spent in the `with` block (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), []))
+
+    def sum(self, **labels: str) -> float:
+        return self._sums.get(self._key(labels), 0.0)
+
+    def samples(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        with self._lock:
+            return {key: (list(counts), self._sums[key]) for key, counts in self._counts.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._sums.clear()
+
+
+Metric = Union[Counter, Histogram]
+
+
+class MetricsRegistry:
+    """Holds every metric created through the helpers below."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Counter(name, description, labelnames)
+                self._metrics[name] = metric
+            if not isinstance(metric, Counter):
+                raise ValueError(f"Metric '{name}' is already registered as {type(metric).__name__}")
+            return metric
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Histogram(name, description, labelnames, buckets)
+                self._metrics[name] = metric
+            if not isinstance(metric, Histogram):
+                raise ValueError(f"Metric '{name}' is already registered as {type(metric).__name__}")
+            return metric
+
+    def all(self) -> Dict[str, Metric]:
+        with self._lock:
+            return dict(self._metrics)
+
+    def reset(self) -> None:
+        """Zero all metrics (used by tests)."""
+        for metric in self.all().values():
+            metric.reset()
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.counter(name, description, labelnames)
+
+
+def histogram(
+    name: str,
+    description: str,
+    labelnames: Tuple[str, ...] = (),
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return REGISTRY.histogram(name, description, labelnames, buckets)
+
+
+# ── Prometheus text exposition ─────────────────────────────
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def render_prometheus(registry: MetricsRegistry = REGISTRY) -> str:
+    """Serializes every metric in `registry` in the Prometheus text format (version 0.0.4)."""
+    lines: List[str] = []
+    for name, metric in sorted(registry.all().items()):
+        help_text = metric.description.replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {name} {help_text}")
+        if isinstance(metric, Counter):
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(metric.samples().items()):
+                lines.append(f"{name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+        else:
+            lines.append(f"# TYPE {name} histogram")
+            for key, (counts, total) in sorted(metric.samples().items()):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), counts):
+                    cumulative += count
+                    labels = _format_labels(metric.labelnames, key, (("le", _format_value(bound)),))
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f"{name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{name}_count{labels} {cumulative}")
+    return "\n".join(lines) + "\n"
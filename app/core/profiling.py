@@ -0,0 +1,236 @@
+# app/core/profiling.py
+"""
+Opt-in statistical profiling of single requests, written as speedscope or flamegraph files.
+
+`StackSampler` is a dependency-free sampling profiler: a background thread
+reads every thread's Python stack (`sys._current_frames()`) at a fixed
+interval, so LangChain runnables, Chroma and our own code all show up without
+instrumenting them. `RequestProfiler` (ASGI middleware) profiles a request
+when it carries a valid admin token in the `X-DFM-Profile` header (an HMAC of
+its expiry time with SECRET_KEY, from `python -m app.cli profile-token`) or
+when it falls in PROFILING_SAMPLE_RATE. One request is profiled at a time;
+the samples cover the whole process while it runs, so concurrent requests
+sharing the event loop appear too.
+
+Output: `.speedscope.json` (open at https://www.speedscope.app, one profile
+per thread) or `.collapsed` stacks for flamegraph.pl / inferno. The oldest
+files beyond PROFILING_MAX_FILES are deleted.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.metrics import counter
+
+PROFILE_HEADER = "x-dfm-profile"
+FILE_HEADER = "x-dfm-profile-file"
+
+profiled_requests = counter(
+    "dfm_profiled_requests_total", "Requests profiled, by trigger (token or sample).", ("trigger",)
+)
+
+Frame = Tuple[str, str, int]  # (qualified function name, file, first line)
+
+
+def sign_profile_token(secret: str, ttl_seconds: float = 600, now: Optional[float] = None) -> str:
+    """`<expiry>.<hmac>`, valid for `ttl_seconds`: whoever holds SECRET_KEY can profile requests."""
+    expiry = str(int((now if now is not None else time.time()) + ttl_seconds))
+    return f"{expiry}.{_signature(secret, expiry)}"
+
+
+def verify_profile_token(secret: str, token: Optional[str], now: Optional[float] = None) -> bool:
+    expiry, _, signature = (token or "").strip().partition(".")
+    if not expiry.isdigit() or not hmac.compare_digest(signature, _signature(secret, expiry)):
+        return False
+    return int(expiry) >= (now if now is not None else time.time())
+
+
+def _signature(secret: str, expiry: str) -> str:
+    return hmac.new(secret.encode("utf-8"), f"profile:{expiry}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class StackSampler:
+    """Samples the stacks of all other threads every `interval_seconds` while running."""
+
+    def __init__(self, interval_seconds: float = 0.002):
+        self.interval_seconds = interval_seconds
+        # thread name -> [(root-first stack, seconds since the previous sample)]
+        self.samples: Dict[str, List[Tuple[Tuple[Frame, ...], float]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="dfm-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        previous = time.perf_counter()
+        while not self._stop.wait(self.interval_seconds):
+            now = time.perf_counter()
+            elapsed, previous = now - previous, now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.setdefault(names.get(ident, str(ident)), []).append((tuple(stack), elapsed))
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """The samples as a speedscope file (https://github.com/jlfwong/speedscope/wiki/Importing-from-custom-sources)."""
+        index: Dict[Frame, int] = {}
+        frames: List[Dict[str, Any]] = []
+        profiles = []
+        for thread, samples in sorted(self.samples.items()):
+            stacks = []
+            for stack, _ in samples:
+                ids = []
+                for frame in stack:
+                    if frame not in index:
+                        index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    ids.append(index[frame])
+                stacks.append(ids)
+            weights = [round(weight, 6) for _, weight in samples]
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": round(sum(weights), 6),
+                    "samples": stacks,
+                    "weights": weights,
+                }
+            )
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "dear-future-me",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def collapsed(self) -> str:
+        """Folded stacks (`thread;outer;...;inner <microseconds>`) for flamegraph.pl or inferno."""
+        totals: Dict[str, float] = {}
+        for thread, samples in self.samples.items():
+            for stack, weight in samples:
+                frames = ";".join(f"{name} ({os.path.basename(file)}:{line})" for name, file, line in stack)
+                key = f"{thread};{frames}" if frames else thread
+                totals[key] = totals.get(key, 0.0) + weight
+        return "".join(f"{key} {max(1, round(seconds * 1e6))}\n" for key, seconds in sorted(totals.items()))
+
+
+def profile_filename(name: str, fmt: str) -> str:
+    """A unique, sortable file name for a profile of `name` (e.g. "POST /chat/text")."""
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    slug = "".join(ch if ch.isalnum() else "-" for ch in name).strip("-")
+    extension = ".collapsed" if fmt == "collapsed" else ".speedscope.json"
+    return f"{stamp}-{slug}-{os.urandom(3).hex()}{extension}"
+
+
+def write_profile(sampler: StackSampler, directory: str, filename: str, max_files: int) -> None:
+    """Writes the profile (format from the file name) and prunes the oldest files beyond `max_files`."""
+    os.makedirs(directory, exist_ok=True)
+    if filename.endswith(".collapsed"):
+        content = sampler.collapsed()
+    else:
+        content = json.dumps(sampler.speedscope(filename.rsplit(".speedscope.json", 1)[0]))
+    with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+        f.write(content)
+    _prune(directory, max_files)
+
+
+def _prune(directory: str, max_files: int) -> None:
+    profiles = [
+        entry
+        for entry in os.scandir(directory)
+        if entry.is_file() and entry.name.endswith((".speedscope.json", ".collapsed"))
+    ]
+    profiles.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in profiles[max(0, max_files) :]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        app: Callable,
+        secret: str,
+        directory: str,
+        sample_rate: float = 0.0,
+        interval_seconds: float = 0.002,
+        fmt: str = "speedscope",
+        max_files: int = 50,
+        paths: Iterable[str] = ("/chat/text", "/rag/ingest/"),
+    ):
+        self.app = app
+        self.secret = secret
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval_seconds = interval_seconds
+        self.fmt = fmt
+        self.max_files = max_files
+        self.paths = set(paths)
+        self._busy = threading.Lock()  # one profile at a time: samples cover the whole process
+
+    def _trigger(self, scope: Dict[str, Any]) -> Optional[str]:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return None
+        token = dict(scope.get("headers") or []).get(PROFILE_HEADER.encode("latin-1"))
+        if token is not None and verify_profile_token(self.secret, token.decode("latin-1")):
+            return "token"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        trigger = self._trigger(scope)
+        if trigger is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        filename = profile_filename(f"{scope['method']} {scope['path']}", self.fmt)
+        sampler = StackSampler(self.interval_seconds).start()
+
+        async def send_with_filename(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start" and trigger == "token":
+                headers = [*message.get("headers", []), (FILE_HEADER.encode("latin-1"), filename.encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_filename)
+        finally:
+            sampler.stop()
+            try:
+                await asyncio.to_thread(write_profile, sampler, self.directory, filename, self.max_files)
+            finally:
+                self._busy.release()
+            profiled_requests.inc(trigger=trigger)
@@ -10,11 +10,20 @@ Key changes
 """
 
 from functools import lru_cache
-from typing import Literal
+from typing import Dict, Literal, Tuple
 
-from pydantic import Field
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+# (floor, ceiling) for k per namespace setting, applied to whatever name that setting holds
+_DEFAULT_K_LIMITS: Dict[str, Tuple[int, int]] = {
+    "CHROMA_NAMESPACE_THEORY": (1, 4),
+    "CHROMA_NAMESPACE_PLAN": (1, 3),
+    "CHROMA_NAMESPACE_SESSION": (1, 5),
+    "CHROMA_NAMESPACE_FUTURE": (2, 5),
+    "CHROMA_NAMESPACE_SESSION_SUMMARY": (1, 3),
+}
+
 
 class Settings(BaseSettings):
     # Pydantic-settings native config
@@ -40,6 +49,36 @@ class Settings(BaseSettings):
     DEBUG_SQL: bool = Field(False, validation_alias="DEBUG_SQL")
     SKIP_AUTH: bool = Field(False, validation_alias="SKIP_AUTH")
     STREAMLIT_DEBUG: bool = Field(False, validation_alias="STREAMLIT_DEBUG")
+    METRICS_ENABLED: bool = True  # serve Prometheus metrics at /metrics
+    LOOP_LAG_MONITOR_ENABLED: bool = True  # dfm_event_loop_lag_seconds + stack of blocking calls in the log
+    LOOP_LAG_INTERVAL_MS: float = 100.0  # watchdog tick interval
+    LOOP_LAG_STALL_MS: float = 250.0  # log the loop thread's stack when a tick is this late
+    TRACING_ENABLED: bool = False  # write request trace spans to TRACING_EXPORT_PATH
+    TRACING_SAMPLE_RATE: float = 0.1  # head sampling: fraction of new traces recorded
+    TRACING_EXPORT_PATH: str = "data/traces.jsonl"  # JSON lines, one OTel-style span per line
+    TRAFFIC_RECORDING_ENABLED: bool = False  # append PII-scrubbed chat turns to TRAFFIC_RECORDING_PATH
+    TRAFFIC_RECORDING_PATH: str = "data/traffic.ndjson"  # replay with `python -m app.cli chat replay`
+    TRAFFIC_RECORDING_SAMPLE_RATE: float = 1.0  # fraction of sessions recorded (whole sessions)
+    # Per-request profiles of /chat/text and /rag/ingest/ (see app/core/profiling.py)
+    PROFILING_ENABLED: bool = False  # honour X-DFM-Profile tokens (`python -m app.cli profile-token`)
+    PROFILING_SAMPLE_RATE: float = 0.0  # fraction of those requests profiled without a token
+    PROFILING_INTERVAL_MS: float = 2.0  # stack sampling interval
+    PROFILING_OUTPUT_DIR: str = "data/profiles"
+    PROFILING_FORMAT: Literal["speedscope", "collapsed"] = "speedscope"  # collapsed: flamegraph.pl / inferno
+    PROFILING_MAX_FILES: int = 50  # oldest profiles beyond this are deleted
+    MEMORY_SNAPSHOTS_KEPT: int = 4  # tracemalloc snapshots kept for diffing (/admin/memory, superusers only)
+
+    # ── Token usage & cost accounting ─────────────────────────
+    USAGE_TRACKING_ENABLED: bool = True
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 60.0  # in-memory totals are written to token_usage this often
+    # model (prefix) -> (USD per 1K prompt tokens, USD per 1K completion tokens)
+    TOKEN_PRICES_USD_PER_1K: Dict[str, Tuple[float, float]] = {
+        "gpt-4o-mini": (0.00015, 0.0006),
+        "gpt-4o": (0.0025, 0.01),
+        "text-embedding-ada-002": (0.0001, 0.0),
+        "text-embedding-3-small": (0.00002, 0.0),
+        "text-embedding-3-large": (0.00013, 0.0),
+    }
 
     # ── Chat settings ─────────────────────────────────────────
     MAX_MESSAGE_LENGTH: int = Field(1000)
@@ -51,11 +90,57 @@ class Settings(BaseSettings):
     CHROMA_NAMESPACE_PLAN: str = "personal_plan"
     CHROMA_NAMESPACE_SESSION: str = "session_data"
     CHROMA_NAMESPACE_FUTURE: str = "future_me"
+    CHROMA_NAMESPACE_SESSION_SUMMARY: str = "dfm_chat_history_summaries"  # one compact summary per session
+
+    # ── Adaptive retrieval depth ──────────────────────────────
+    RAG_RELEVANCE_THRESHOLD: float = 0.3  # drop chunks whose relevance score (0..1) is below this
+    RAG_SCORE_GAP: float = 0.15  # cut the result list at the first score drop larger than this
+    RAG_MIN_K: int = 1
+    RAG_MAX_K: int = 5
+    # Per-namespace (floor, ceiling) for k, keyed by the configured namespace names; JSON in env, e.g.
+    # {"theory": [1, 3]}. Namespaces left out use RAG_MIN_K/RAG_MAX_K. Defaults: _DEFAULT_K_LIMITS
+    RAG_K_LIMITS: Dict[str, Tuple[int, int]] = {}
+    RAG_MAX_SUMMARY_SESSIONS: int = 3  # sessions whose raw session_data chunks are searched per turn
+    QUERY_EMBEDDING_CACHE_SIZE: int = 512  # recent query embeddings shared by all namespaces
+    INGEST_UPSERT_BATCH_SIZE: int = 1000  # chunks embedded and written per Chroma upsert (Chroma caps a batch)
+
+    # ── Conversation-aware retrieval reuse ────────────────────
+    RAG_CONVERSATION_REUSE_THRESHOLD: float = 0.9  # cosine(query, previous query) above which candidates are reused
+    RAG_CONVERSATION_CACHE_SIZE: int = 1024  # conversations whose retrieval state is kept in memory
+    RAG_DEDUP_CONVERSATION_CHUNKS: bool = True  # drop retrieved chunks the prompt already holds (persona, history)
+
+    # ── Persona digest (replaces per-turn future_me retrieval) ─
+    PERSONA_DIGEST_CACHE_SIZE: int = 256  # users kept in the in-memory LRU
+    PERSONA_DIGEST_MAX_CHARS: int = 1200
+    PERSONA_DIGEST_TTL_SECONDS: float = 600  # CLI/in-process ingests don't reach the server's cache; 0 = no expiry
+
+    # ── Session memory (multi-turn context) ───────────────────
+    SESSION_MEMORY_TURNS: int = 12  # messages (user + assistant) kept verbatim per session
+    SESSION_MEMORY_MAX_SESSIONS: int = 1000  # idle sessions beyond this are evicted (LRU)
+    SESSION_MEMORY_SUMMARY_MAX_CHARS: int = 1500  # cap on the rolling summary of older turns
+    SESSION_MEMORY_PERSIST: bool = False  # also store memory in the chat_session_memory table
+    CHAT_HISTORY_ENABLED: bool = True  # store every message in chat_messages for GET /chat/history
+    STREAMLIT_HISTORY_WINDOW: int = 20  # messages the GUI renders (and fetches) per "load earlier" step
+
+    # ── Session summaries (therapist review) ──────────────────
+    SESSION_SUMMARY_CACHE_SIZE: int = 1000  # per-session summary checkpoints kept in memory
+    SUMMARY_GROUP_MAX_TOKENS: int = 3000  # map-reduce: estimated tokens per summarization call
+    SUMMARY_MAX_CONCURRENCY: int = 4  # map-reduce: parallel summarization calls per level
+    SUMMARY_BATCH_CONCURRENCY: int = 4  # sessions summarized in parallel by the batch endpoint/CLI
+
+    # ── Retrieval gate (skip vector search for small talk) ────
+    RETRIEVAL_GATE_ENABLED: bool = True
+    RETRIEVAL_GATE_MAX_WORDS: int = 6
+    RETRIEVAL_GATE_CLASSIFIER: str | None = None  # optional "module:function", returns True if retrieval is needed
 
     # ── LLM settings ──────────────────────────────────────────
     OPENAI_API_KEY: str = Field(validation_alias="OPENAI_API_KEY")
     LLM_MODEL: str = "gpt-4o"
     LLM_TEMPERATURE: float = 0.7
+    # OpenAI-compatible endpoint (e.g. the local mock in benchmarks/openai_mock.py); None = api.openai.com
+    OPENAI_BASE_URL: str | None = None
+    OPENAI_EMBEDDINGS_BASE_URL: str | None = None  # embeddings only; falls back to OPENAI_BASE_URL
+    OPENAI_MAX_RETRIES: int = 2  # client-side retries on 429/5xx/timeouts (exponential backoff)
 
     # Demo user credentials (primarily for client tools like cli.py)
     DEMO_USER_EMAIL: str = Field(validation_alias="DEMO_USER_EMAIL")
@@ -64,6 +149,17 @@ class Settings(BaseSettings):
     # ── Language Settings ─────────────────────────────────────
     APP_DEFAULT_LANGUAGE: Literal["en", "he"] = Field("he", validation_alias="APP_DEFAULT_LANGUAGE")
 
+    @model_validator(mode="after")
+    def _k_limits_follow_namespaces(self) -> "Settings":
+        """Keys the default k limits by the configured namespaces; a key naming no namespace is an error."""
+        if "RAG_K_LIMITS" not in self.model_fields_set:
+            self.RAG_K_LIMITS = {getattr(self, setting): limits for setting, limits in _DEFAULT_K_LIMITS.items()}
+        namespaces = {getattr(self, setting) for setting in _DEFAULT_K_LIMITS}
+        unknown = sorted(set(self.RAG_K_LIMITS) - namespaces)
+        if unknown:
+            raise ValueError(f"RAG_K_LIMITS keys {unknown} are not configured namespaces {sorted(namespaces)}")
+        return self
+
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
@@ -0,0 +1,230 @@
+# app/core/tracing.py
+"""
+Minimal request tracing with OpenTelemetry-compatible span records.
+
+Spans carry W3C trace/span ids and OTel field names, so the JSON-lines file
+written by `JsonLinesExporter` can be loaded by any OTLP/JSON tooling, and an
+incoming `traceparent` header continues the caller's trace. Sampling is
+decided once per trace at the root span (head sampling); unsampled traces
+still propagate ids but are never written.
+
+Use `tracer.span(...)` for code that starts and ends in one task. Code whose
+start and end happen in different callbacks (LangChain runs, FastAPI generator
+dependencies) uses `start_span()` / `end_span()`, which do not touch the
+current-span context.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableConfig
+
+SERVICE_NAME = "dear-future-me"
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    sampled: bool
+    start_time_unix_nano: int = field(default_factory=time.time_ns)
+    end_time_unix_nano: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "UNSET"  # OTel status code: UNSET, OK or ERROR
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(error).__name__
+        self.attributes["exception.message"] = str(error)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "resource": {"service.name": SERVICE_NAME},
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "attributes": self.attributes,
+            "status": {"code": self.status},
+        }
+
+
+class JsonLinesExporter:
+    """Appends one JSON object per finished span to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class InMemoryExporter:
+    """Keeps finished spans in a list (tests and ad-hoc debugging)."""
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("dfm_current_span", default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Span]:
+    """A remote parent from a W3C `traceparent` header, or None if absent/invalid."""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return Span("remote", trace_id, span_id, None, sampled=bool(int(flags, 16) & 1))
+
+
+class Tracer:
+    def __init__(self, exporter: Any = None, sample_rate: float = 1.0, enabled: bool = False):
+        self.configure(enabled=enabled, sample_rate=sample_rate, exporter=exporter)
+
+    def configure(self, enabled: bool, sample_rate: float = 1.0, exporter: Any = None) -> None:
+        """Reconfigures in place, so modules holding a reference to `tracer` see the change."""
+        self.enabled = enabled and exporter is not None
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Optional[Span]:
+        """Starts a span under `parent` (default: the current span). Returns None when tracing is off."""
+        if not self.enabled:
+            return None
+        parent = parent if parent is not None else _current_span.get()
+        if parent is None:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = random.random() < self.sample_rate
+        else:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        return Span(name, trace_id, os.urandom(8).hex(), parent_id, sampled, attributes=dict(attributes))
+
+    def end_span(self, span: Optional[Span], error: Optional[BaseException] = None) -> None:
+        if span is None:
+            return
+        if error is not None:
+            span.record_error(error)
+        elif span.status == "UNSET":
+            span.status = "OK"
+        span.end_time_unix_nano = time.time_ns()
+        if span.sampled:
+            try:
+                self.exporter.export(span)
+            except Exception:
+                pass  # tracing must never break a request
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Runs the block inside a new span, which is the current span for nested calls."""
+        span = self.start_span(name, parent, **attributes)
+        if span is None:
+            yield None
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            _current_span.reset(token)
+
+    def langchain_config(self) -> Optional[RunnableConfig]:
+        """Runnable config that records every LangChain run under the current span, if it is sampled."""
+        parent = _current_span.get()
+        if not self.enabled or parent is None or not parent.sampled:
+            return None
+        return {"callbacks": [TracingCallbackHandler(self, parent)]}
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain chain/LLM/retriever runs into child spans of `root`."""
+
+    run_inline = True
+
+    def __init__(self, tracer: "Tracer", root: Span):
+        self.tracer = tracer
+        self.root = root
+        self._spans: Dict[UUID, Optional[Span]] = {}
+
+    def _start(self, kind: str, serialized: Optional[Dict[str, Any]], run_id: UUID, kwargs: Dict[str, Any]) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or ((serialized or {}).get("id") or [kind])[-1]
+        parent = self._spans.get(kwargs.get("parent_run_id")) or self.root  # type: ignore[arg-type]
+        self._spans[run_id] = self.tracer.start_span(str(name), parent, **{"langchain.run_type": kind})
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        self.tracer.end_span(self._spans.pop(run_id, None), error)
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start("chain", serialized, run_id, kwargs)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start("llm", serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start("llm", serialized, run_id, kwargs)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start("retriever", serialized, run_id, kwargs)
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+
+tracer = Tracer()
+
+
+def configure_tracing(enabled: bool, sample_rate: float, export_path: str) -> None:
+    tracer.configure(enabled, sample_rate, JsonLinesExporter(export_path) if enabled else None)
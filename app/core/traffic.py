@@ -0,0 +1,137 @@
+# app/core/traffic.py
+"""
+Opt-in recorder of real chat traffic, for replay with `python -m app.cli chat replay`.
+
+`TrafficRecorder` is a plain ASGI middleware: for each recorded request it
+appends one NDJSON line with the arrival time, a pseudonymous session id
+(HMAC of the client's session_id with SECRET_KEY), the message after PII
+scrubbing, the chat branch taken (crisis, light or rag), status and latency.
+Replies are never stored. Scrubbing removes emails, URLs, IP addresses and
+long digit runs (phone, ID, card numbers); free text can still contain names,
+so recording is off by default and sampled per session.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_PII_PATTERNS = (
+    ("[EMAIL]", re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")),
+    ("[URL]", re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)),
+    ("[IP]", re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b")),
+)
+_DIGIT_RUN = re.compile(r"\+?\d[\d\s().-]*\d")
+_MIN_SCRUBBED_DIGITS = 7  # shorter runs are times, dates, counts and ages
+_MAX_BODY_BYTES = 1024 * 1024
+
+_current_turn: ContextVar[Optional[Dict[str, Any]]] = ContextVar("dfm_recorded_turn", default=None)
+
+
+def scrub_pii(text: str) -> str:
+    """Replaces emails, URLs, IP addresses and runs of 7+ digits with placeholders."""
+    for placeholder, pattern in _PII_PATTERNS:
+        text = pattern.sub(placeholder, text)
+
+    def number(match: re.Match) -> str:
+        digits = sum(ch.isdigit() for ch in match.group(0))
+        return "[NUMBER]" if digits >= _MIN_SCRUBBED_DIGITS else match.group(0)
+
+    return _DIGIT_RUN.sub(number, text)
+
+
+def note_branch(branch: str) -> None:
+    """Called by the chat chain: labels the turn being recorded (no-op when not recording)."""
+    record = _current_turn.get()
+    if record is not None:
+        record["branch"] = branch
+
+
+class TrafficRecorder:
+    def __init__(
+        self,
+        app: Callable,
+        path: str,
+        secret: str,
+        sample_rate: float = 1.0,
+        paths: Iterable[str] = ("/chat/text",),
+    ):
+        self.app = app
+        self.path = path
+        self.secret = secret.encode("utf-8")
+        self.sample_rate = sample_rate
+        self.paths = set(paths)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def pseudonym(self, value: str) -> str:
+        return hmac.new(self.secret, value.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+    def _sampled(self, session: Optional[str]) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        if session is None:
+            return random.random() < self.sample_rate
+        # Decided per session (from its pseudonym), so recorded conversations are complete
+        return int(self.pseudonym(session)[:8], 16) / 16**8 < self.sample_rate
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        started, start = time.time(), time.perf_counter()
+        body: List[bytes] = []
+        record: Dict[str, Any] = {"branch": None, "status": None, "response_bytes": 0}
+
+        async def receive_and_keep() -> Dict[str, Any]:
+            message = await receive()
+            if message["type"] == "http.request" and sum(map(len, body)) < _MAX_BODY_BYTES:
+                body.append(message.get("body", b""))
+            return message
+
+        async def send_and_observe(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                record["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                record["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        token = _current_turn.set(record)
+        try:
+            await self.app(scope, receive_and_keep, send_and_observe)
+        finally:
+            _current_turn.reset(token)
+            self._write(scope["path"], b"".join(body), started, time.perf_counter() - start, record)
+
+    def _write(self, path: str, body: bytes, started: float, seconds: float, record: Dict[str, Any]) -> None:
+        try:
+            payload = json.loads(body)
+            message = str(payload["message"])
+        except (ValueError, KeyError, TypeError):
+            return  # not a chat turn (the endpoint rejected it as well)
+        session_id = payload.get("session_id")
+        if not self._sampled(session_id):
+            return
+        line = {
+            "ts": round(started, 3),
+            # Turns without a session_id become one-turn sessions
+            "session": self.pseudonym(session_id) if session_id else os.urandom(8).hex(),
+            "path": path,
+            "message": scrub_pii(message),
+            "message_chars": len(message),
+            "branch": record["branch"],
+            "status": record["status"],
+            "latency_ms": round(seconds * 1000, 1),
+            "response_bytes": record["response_bytes"],
+        }
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
@@ -0,0 +1,241 @@
+# app/core/usage.py
+"""
+Token usage and cost accounting.
+
+Every LLM and embedding call records its token counts under a set of labels
+(user, branch, namespace, template version, model, kind). Counts are summed
+in memory and flushed periodically to the `token_usage` table, one row per
+label combination and flush window, so the hot path never waits on the DB.
+
+Labels that are not known at the call site (user, branch, template) come
+from `usage_scope()`, which the orchestrator opens around each turn.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import func, select
+
+from app.core.settings import get_settings
+from app.db.models import TokenUsageTable
+from app.db.session import AsyncSessionMaker
+
+CHARS_PER_TOKEN = 4  # rough estimate for English/Hebrew prose; avoids a tokenizer round-trip
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def template_version(name: str, text: str) -> str:
+    """Label for a prompt template: its name plus a short hash of its content (changes on every edit)."""
+    return f"{name}@{hashlib.sha1(text.encode('utf-8')).hexdigest()[:8]}"
+
+
+class UsageKey(NamedTuple):
+    user_id: str
+    branch: str
+    namespace: str
+    template: str
+    model: str
+    kind: str  # llm | embedding | context (prompt tokens spent on retrieved chunks, already part of llm)
+
+
+@dataclass
+class UsageTotals:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+
+
+_usage_labels: ContextVar[Dict[str, str]] = ContextVar("dfm_usage_labels", default={})
+
+
+@contextmanager
+def usage_scope(**labels: Optional[str]) -> Iterator[None]:
+    """Adds labels (e.g. user_id, branch, template) to every usage record made inside the block."""
+    token = _usage_labels.set({**_usage_labels.get(), **{k: v for k, v in labels.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _usage_labels.reset(token)
+
+
+class UsageTracker:
+    def __init__(self, prices: Optional[Mapping[str, Tuple[float, float]]] = None, enabled: bool = True):
+        self.prices = dict(prices or {})  # model -> (USD per 1K prompt tokens, USD per 1K completion tokens)
+        self.enabled = enabled
+        self._totals: Dict[UsageKey, UsageTotals] = {}
+        self._window_start = datetime.now(timezone.utc)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        # Longest matching prefix, so dated snapshots ("gpt-4o-2024-08-06") use their family's price
+        matches = [name for name in self.prices if model.startswith(name)]
+        prompt_price, completion_price = self.prices[max(matches, key=len)] if matches else (0.0, 0.0)
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    def record(
+        self,
+        model: str,
+        kind: str,
+        prompt_tokens: int,
+        completion_tokens: int = 0,
+        namespace: Optional[str] = None,
+        charge: bool = True,
+    ) -> None:
+        """Adds one call's tokens; `charge=False` counts tokens without cost (breakdowns of a charged call)."""
+        if not self.enabled:
+            return
+        labels = _usage_labels.get()
+        key = UsageKey(
+            user_id=labels.get("user_id", "-"),
+            branch=labels.get("branch", "-"),
+            namespace=namespace or labels.get("namespace", "-"),
+            template=labels.get("template", "-"),
+            model=model,
+            kind=kind,
+        )
+        cost = self.cost(model, prompt_tokens, completion_tokens) if charge else 0.0
+        with self._lock:
+            totals = self._totals.setdefault(key, UsageTotals())
+            totals.calls += 1
+            totals.prompt_tokens += prompt_tokens
+            totals.completion_tokens += completion_tokens
+            totals.cost_usd += cost
+
+    def pending(self) -> Dict[UsageKey, UsageTotals]:
+        with self._lock:
+            return dict(self._totals)
+
+    async def flush(self) -> int:
+        """Writes the current window to the DB and starts a new one. Returns the number of rows written."""
+        with self._lock:
+            totals, self._totals = self._totals, {}
+            window_start, self._window_start = self._window_start, datetime.now(timezone.utc)
+        if not totals:
+            return 0
+        rows = [
+            TokenUsageTable(
+                period_start=window_start,
+                period_end=self._window_start,
+                **key._asdict(),
+                calls=t.calls,
+                prompt_tokens=t.prompt_tokens,
+                completion_tokens=t.completion_tokens,
+                cost_usd=t.cost_usd,
+            )
+            for key, t in totals.items()
+        ]
+        try:
+            async with AsyncSessionMaker() as session:
+                session.add_all(rows)
+                await session.commit()
+        except Exception as e:
+            logging.error(f"Could not flush token usage ({len(rows)} rows): {e}")
+            with self._lock:  # keep the counts for the next attempt
+                for key, t in totals.items():
+                    merged = self._totals.setdefault(key, UsageTotals())
+                    merged.calls += t.calls
+                    merged.prompt_tokens += t.prompt_tokens
+                    merged.completion_tokens += t.completion_tokens
+                    merged.cost_usd += t.cost_usd
+            return 0
+        return len(rows)
+
+    def start(self, interval_seconds: float) -> None:
+        """Starts the periodic background flush (call from the running event loop)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_periodically(interval_seconds))
+
+    async def _flush_periodically(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await self.flush()
+
+    async def stop(self) -> None:
+        """Stops the background flush and writes what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def summary(self, group_by: str, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Totals from the DB grouped by one label (user_id, branch, namespace, template, model or kind)."""
+        if group_by not in UsageKey._fields:
+            raise ValueError(f"Cannot group token usage by '{group_by}'")
+        await self.flush()
+        column = getattr(TokenUsageTable, group_by)
+        query = select(
+            column,
+            func.sum(TokenUsageTable.calls),
+            func.sum(TokenUsageTable.prompt_tokens),
+            func.sum(TokenUsageTable.completion_tokens),
+            func.sum(TokenUsageTable.cost_usd),
+        ).group_by(column)
+        if since is not None:
+            query = query.where(TokenUsageTable.period_end >= since)
+        async with AsyncSessionMaker() as session:
+            result = await session.execute(query.order_by(func.sum(TokenUsageTable.prompt_tokens).desc()))
+        return [
+            {
+                group_by: value,
+                "calls": int(calls or 0),
+                "prompt_tokens": int(prompt or 0),
+                "completion_tokens": int(completion or 0),
+                "cost_usd": round(float(cost or 0.0), 6),
+            }
+            for value, calls, prompt, completion, cost in result.all()
+        ]
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Records the token usage OpenAI reports at the end of each LLM call."""
+
+    run_inline = True
+
+    def __init__(self, tracker: UsageTracker):
+        self.tracker = tracker
+        self._models: Dict[UUID, str] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._models[run_id] = str((kwargs.get("metadata") or {}).get("ls_model_name", "unknown"))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._models[run_id] = str((kwargs.get("metadata") or {}).get("ls_model_name", "unknown"))
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        model = self._models.pop(run_id, "unknown")
+        llm_output = getattr(response, "llm_output", None) or {}
+        usage = llm_output.get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            # Streaming runs report usage on the message instead of llm_output
+            for generations in getattr(response, "generations", None) or []:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens = (prompt_tokens or 0) + metadata.get("input_tokens", 0)
+                    completion_tokens = (completion_tokens or 0) + metadata.get("output_tokens", 0)
+        if prompt_tokens is None:
+            return
+        self.tracker.record(llm_output.get("model_name", model), "llm", int(prompt_tokens), int(completion_tokens or 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._models.pop(run_id, None)
+
+
+_cfg = get_settings()
+usage = UsageTracker(prices=_cfg.TOKEN_PRICES_USD_PER_1K, enabled=_cfg.USAGE_TRACKING_ENABLED)
@@ -3,6 +3,7 @@ import asyncio
 
 from sqlalchemy.ext.asyncio import create_async_engine
 
+import app.db.models  # noqa: F401  (registers application tables on Base.metadata)
 from app.auth.models import Base
 from app.core.settings import Settings
 
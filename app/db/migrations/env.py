@@ -28,6 +28,7 @@ from sqlalchemy.future.engine import Engine
 PROJECT_ROOT = Path(__file__).resolve().parents[3]  # ../../..
 sys.path.append(str(PROJECT_ROOT))
 
+import app.db.models  # noqa: E402, F401  (registers application tables on Base.metadata)
 from app.auth.models import Base  # noqa: E402
 from app.core.settings import get_settings  # noqa: E402
 
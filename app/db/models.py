@@ -0,0 +1,52 @@
+# app/db/models.py
+"""Application tables (other than the FastAPI-Users tables in app.auth.models)."""
+
+from sqlalchemy import JSON, Column, DateTime, Float, Index, Integer, String, Text, func
+
+from app.auth.models import Base
+
+
+class ChatSessionMemoryTable(Base):
+    """Persisted conversation memory: rolling summary + last turns of one chat session."""
+
+    __tablename__ = "chat_session_memory"
+
+    session_id = Column(String, primary_key=True)
+    user_id = Column(String, nullable=True, index=True)  # owner; NULL when SKIP_AUTH is on
+    summary = Column(Text, nullable=False, default="")
+    turns = Column(JSON, nullable=False, default=list)  # [[role, content], ...]
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ChatMessageTable(Base):
+    """Full chat transcript, one row per message, read back page by page by GET /chat/history."""
+
+    __tablename__ = "chat_messages"
+    __table_args__ = (Index("ix_chat_messages_session_id_id", "session_id", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    user_id = Column(String, nullable=True, index=True)  # NULL when SKIP_AUTH is on
+    role = Column(String, nullable=False)  # user | assistant
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class TokenUsageTable(Base):
+    """Token usage and cost, summed per label combination over one flush window (see app.core.usage)."""
+
+    __tablename__ = "token_usage"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    period_start = Column(DateTime(timezone=True), nullable=False)
+    period_end = Column(DateTime(timezone=True), nullable=False, index=True)
+    user_id = Column(String, nullable=False, index=True)
+    branch = Column(String, nullable=False)  # crisis | light | rag | summary
+    namespace = Column(String, nullable=False)
+    template = Column(String, nullable=False)  # prompt name@content hash
+    model = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # llm | embedding | context
+    calls = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
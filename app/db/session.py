@@ -4,6 +4,7 @@ from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.core.settings import get_settings
+from app.core.tracing import tracer
 
 # ────────────────────────────────────────────────────────────────
 #  Build ONE engine & sessionmaker when this module is imported
@@ -28,5 +29,14 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     FastAPI dependency – hands out a short-lived AsyncSession
     from the global connection-pool.
     """
-    async with AsyncSessionMaker() as session:
-        yield session
+    # Set up and torn down in different FastAPI callbacks, so no current-span context here
+    span = tracer.start_span("db.session")
+    error: BaseException | None = None
+    try:
+        async with AsyncSessionMaker() as session:
+            yield session
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        tracer.end_span(span, error)
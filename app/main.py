@@ -2,12 +2,16 @@
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator  # Add this import
 
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Request, Response
 from fastapi_users.exceptions import UserNotExists
 
+from app.api.admin import router as admin_router
 from app.api.chat import router as chat_router
+from app.api.chat import ws_router as chat_ws_router
 from app.api.rag import RagOrchestrator
+from app.api.rag import admin_router as rag_admin_router
 from app.api.rag import router as rag_router
+from app.api.usage import router as usage_router
 from app.auth.router import (
     UserManager,
     auth_router,
@@ -16,7 +20,13 @@ from app.auth.router import (
     register_router,
 )
 from app.auth.schemas import UserCreate, UserRead, UserUpdate
+from app.core.loop_monitor import LoopLagMonitor
+from app.core.metrics import render_prometheus
+from app.core.profiling import RequestProfiler
 from app.core.settings import Settings, get_settings  # Import Settings as well
+from app.core.tracing import configure_tracing, parse_traceparent, tracer
+from app.core.traffic import TrafficRecorder
+from app.core.usage import usage
 from app.db.init_db import init_db
 from app.db.migrate import upgrade_head
 from app.db.session import engine, get_async_session
@@ -25,6 +35,13 @@ from app.db.session import engine, get_async_session
 # Lifespan function now takes settings as an argument
 @asynccontextmanager
 async def lifespan(app: FastAPI, app_settings: Settings) -> AsyncGenerator[None, None]:  # Add app_settings parameter
+    # Started first, so blocking work during startup (migrations, Chroma clients) is caught too
+    loop_monitor = None
+    if app_settings.LOOP_LAG_MONITOR_ENABLED:
+        loop_monitor = LoopLagMonitor(app_settings.LOOP_LAG_INTERVAL_MS / 1000, app_settings.LOOP_LAG_STALL_MS / 1000)
+        loop_monitor.start()
+        app.state.loop_monitor = loop_monitor
+
     if app_settings.DEMO_MODE:  # Use app_settings
         print("INFO: DEMO_MODE is active. Initializing database (dropping and recreating tables)...")
         # await init_db()
@@ -91,12 +108,20 @@ async def lifespan(app: FastAPI, app_settings: Settings) -> AsyncGenerator[None,
     # or have them passed during instantiation if they can vary per app instance.
     app.state.rag_orchestrator = RagOrchestrator()
     print("INFO: RagOrchestrator initialized.")
+    if app_settings.USAGE_TRACKING_ENABLED:
+        usage.start(app_settings.USAGE_FLUSH_INTERVAL_SECONDS)
 
     yield
 
+    print("INFO: Application shutting down. Flushing token usage...")
+    await usage.stop()
+    print("INFO: Application shutting down. Flushing session memory...")
+    await app.state.rag_orchestrator.memory.drain()
     print("INFO: Application shutting down. Disposing database engine...")
     await engine.dispose()
     print("INFO: Database engine disposed.")
+    if loop_monitor is not None:
+        await loop_monitor.stop()
 
 
 def create_app() -> FastAPI:
@@ -114,6 +139,45 @@ def create_app() -> FastAPI:
 
     instance = FastAPI(title="Dear Future Me API", lifespan=lifespan_wrapper)
 
+    # Request tracing (local JSON-lines exporter, head-sampled; continues an incoming W3C traceparent)
+    configure_tracing(app_settings.TRACING_ENABLED, app_settings.TRACING_SAMPLE_RATE, app_settings.TRACING_EXPORT_PATH)
+    if app_settings.TRACING_ENABLED:
+
+        @instance.middleware("http")
+        async def trace_requests(request: Request, call_next):
+            remote_parent = parse_traceparent(request.headers.get("traceparent"))
+            attributes = {"http.method": request.method, "http.target": request.url.path}
+            with tracer.span(f"{request.method} {request.url.path}", parent=remote_parent, **attributes) as span:
+                response = await call_next(request)
+                if span is not None:
+                    route = request.scope.get("route")
+                    if route is not None:
+                        span.set_attribute("http.route", getattr(route, "path", ""))
+                    span.set_attribute("http.status_code", response.status_code)
+                    response.headers["traceparent"] = span.traceparent
+            return response
+
+    # Opt-in capture of scrubbed chat turns for load replay (see app/core/traffic.py)
+    if app_settings.TRAFFIC_RECORDING_ENABLED:
+        instance.add_middleware(
+            TrafficRecorder,
+            path=app_settings.TRAFFIC_RECORDING_PATH,
+            secret=app_settings.SECRET_KEY,
+            sample_rate=app_settings.TRAFFIC_RECORDING_SAMPLE_RATE,
+        )
+
+    # Admin-triggered or sampled per-request CPU profiles (see app/core/profiling.py)
+    if app_settings.PROFILING_ENABLED:
+        instance.add_middleware(
+            RequestProfiler,
+            secret=app_settings.SECRET_KEY,
+            directory=app_settings.PROFILING_OUTPUT_DIR,
+            sample_rate=app_settings.PROFILING_SAMPLE_RATE,
+            interval_seconds=app_settings.PROFILING_INTERVAL_MS / 1000,
+            fmt=app_settings.PROFILING_FORMAT,
+            max_files=app_settings.PROFILING_MAX_FILES,
+        )
+
     # It's generally safer if fastapi_users and current_active_user are also
     # initialized within create_app if their behavior depends on settings
     # that might change per app instance (e.g., for testing).
@@ -123,6 +187,10 @@ def create_app() -> FastAPI:
     # to be created here, using the app_settings.
     current_active_user = fastapi_users.current_user(active=True)
 
+    async def authenticated_user(request: Request, user: UserRead = Depends(current_active_user)) -> None:
+        # Keep the user on the request so endpoints can read it without a second JWT/DB lookup
+        request.state.user = user
+
     # Auth endpoints - Conditionally include registration router
     if not app_settings.DEMO_MODE:  # Use app_settings
         instance.include_router(register_router, prefix="/auth", tags=["auth"])
@@ -143,22 +211,43 @@ def create_app() -> FastAPI:
     # Chat endpoints - Conditionally protected
     chat_dependencies = []
     if not app_settings.SKIP_AUTH:
-        chat_dependencies.append(Depends(current_active_user))
+        chat_dependencies.append(Depends(authenticated_user))
         # instance.include_router(chat_router, dependencies=chat_dependencies)  # TO DO
 
         print("INFO: SKIP_AUTH is false. Chat endpoints are protected.")
     else:
         print("INFO: SKIP_AUTH is true. Chat endpoints are NOT protected (authentication bypassed).")
     instance.include_router(chat_router, dependencies=chat_dependencies)
+    # The chat WebSocket checks its token once per connection instead (HTTP auth dependencies don't apply)
+    instance.include_router(chat_ws_router)
 
     # RAG endpoints
     instance.include_router(rag_router)
 
+    # Memory diagnostics (tracemalloc, cache sizes): superusers only, unless auth is skipped altogether
+    admin_dependencies = []
+    if not app_settings.SKIP_AUTH:
+        admin_dependencies.append(Depends(fastapi_users.current_user(active=True, superuser=True)))
+    instance.include_router(admin_router, dependencies=admin_dependencies)
+
+    # Token usage / cost summary: it covers every user, so superusers only as well
+    instance.include_router(usage_router, dependencies=admin_dependencies)
+
+    # Batch session summaries start LLM calls for any number of sessions: superusers only too
+    instance.include_router(rag_admin_router, dependencies=admin_dependencies)
+
     # Health check
     @instance.get("/ping", tags=["health"])
     async def ping() -> dict[str, str]:
         return {"ping": "pong"}
 
+    # Prometheus scrape target (in-process registry, see app/core/metrics.py)
+    if app_settings.METRICS_ENABLED:
+
+        @instance.get("/metrics", tags=["health"], include_in_schema=False)
+        async def metrics() -> Response:
+            return Response(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
     return instance
 
 
@@ -0,0 +1,134 @@
+# app/rag/conversation.py
+"""
+Per-conversation retrieval state.
+
+Follow-up turns usually stay on topic. When a new query embedding is close
+enough to the previous turn's, the previous candidate chunks are re-ranked
+locally instead of searching Chroma again. Retrieved chunks whose text the
+prompt already carries (persona digest, session history, another chunk) are
+dropped (`drop_duplicates`). Chunks sent in earlier turns are kept: each turn
+builds a fresh prompt, and session memory holds no chunks.
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.metrics import counter
+from app.rag.processor import select_k
+
+conversation_retrievals = counter(
+    "dfm_conversation_retrieval_total",
+    "Retrievals per conversation turn, by whether the previous candidate set was reused.",
+    ("outcome",),
+)
+
+
+def drop_duplicates(docs: List[Document], prompt_texts: Sequence[str]) -> List[Document]:
+    """Drops chunks repeated in `docs` or whose text is already part of `prompt_texts`."""
+    seen_ids: Set[str] = set()
+    seen_texts: Set[str] = set()
+    fresh = []
+    for doc in docs:
+        text = doc.page_content.strip()
+        if (doc.id is not None and doc.id in seen_ids) or text in seen_texts or any(text in t for t in prompt_texts):
+            continue
+        if doc.id is not None:
+            seen_ids.add(doc.id)
+        seen_texts.add(text)
+        fresh.append(doc)
+    return fresh
+
+
+def cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def cosine_to_relevance(cos: float) -> float:
+    """
+    Maps cosine similarity onto Chroma's L2 relevance scale, 1 - d/√2, where d is
+    the squared L2 distance (2 - 2·cos for unit vectors), so re-ranked candidates
+    are cut by the same RAG_RELEVANCE_THRESHOLD/RAG_SCORE_GAP as fresh searches.
+    """
+    return 1.0 - (2.0 - 2.0 * cos) / math.sqrt(2)
+
+
+@dataclass
+class ConversationRetrievalState:
+    query_embedding: List[float]
+    candidates: List[Tuple[Document, List[float]]] = field(default_factory=list)
+
+
+class ConversationRetrievalCache:
+    """
+    Retrieval state per conversation, LRU-bounded. Conversation keys must
+    include the owner (the orchestrator uses `(user_id, session_id)`): session
+    ids come from the client, and a bare one would let a caller reuse another
+    user's retrieved chunks.
+    """
+
+    def __init__(self, max_conversations: int = 1024, similarity_threshold: float = 0.9):
+        self.max_conversations = max_conversations
+        self.similarity_threshold = similarity_threshold
+        self._states: "OrderedDict[Hashable, ConversationRetrievalState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, conversation_id: Hashable) -> Optional[ConversationRetrievalState]:
+        with self._lock:
+            state = self._states.get(conversation_id)
+            if state is not None:
+                self._states.move_to_end(conversation_id)
+            return state
+
+    def can_reuse(self, state: Optional[ConversationRetrievalState], query_embedding: Sequence[float]) -> bool:
+        reuse = (
+            state is not None
+            and bool(state.candidates)
+            and cosine(query_embedding, state.query_embedding) >= self.similarity_threshold
+        )
+        conversation_retrievals.inc(outcome="reuse" if reuse else "search")
+        return reuse
+
+    def store(
+        self,
+        conversation_id: Hashable,
+        query_embedding: List[float],
+        candidates: List[Tuple[Document, List[float]]],
+    ) -> None:
+        """Records a fresh search as the candidates for the conversation's next turns."""
+        with self._lock:
+            self._states[conversation_id] = ConversationRetrievalState(query_embedding, candidates)
+            self._states.move_to_end(conversation_id)
+            while len(self._states) > self.max_conversations:
+                self._states.popitem(last=False)
+
+    def rerank(
+        self,
+        state: ConversationRetrievalState,
+        query_embedding: Sequence[float],
+        threshold: float,
+        gap: float,
+        min_k: int,
+        max_k: int,
+    ) -> List[Document]:
+        """Orders the previous candidates by similarity to the new query and applies the adaptive-k cut."""
+        scored = sorted(
+            ((doc, cosine_to_relevance(cosine(query_embedding, emb))) for doc, emb in state.candidates),
+            key=lambda pair: pair[1],
+            reverse=True,
+        )
+        k = select_k([score for _, score in scored], threshold, gap, min_k, max_k)
+        return [doc for doc, _ in scored[:k]]
+
+    def forget(self, conversation_id: Hashable) -> None:
+        with self._lock:
+            self._states.pop(conversation_id, None)
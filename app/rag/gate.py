@@ -0,0 +1,178 @@
+# app/rag/gate.py
+"""
+Retrieval gate – decides whether a chat turn needs a vector search at all.
+
+Greetings and acknowledgements ("hi", "thanks", "ok") are answered from a
+lightweight prompt; everything else goes through the full RAG chain.
+"""
+
+import importlib
+import logging
+import re
+from typing import Callable, Optional
+
+from app.core.metrics import counter
+
+gate_decisions = counter(
+    "dfm_retrieval_gate_decisions_total",
+    "Retrieval gate decisions per chat turn.",
+    ("decision",),
+)
+
+# Whole messages that are small talk on their own (compared after normalisation).
+SMALL_TALK_PHRASES = {
+    "hi",
+    "hello",
+    "hey",
+    "hey there",
+    "hi there",
+    "good morning",
+    "good evening",
+    "good night",
+    "how are you",
+    "whats up",
+    "thanks",
+    "thank you",
+    "thank you so much",
+    "thanks a lot",
+    "ok",
+    "okay",
+    "ok thanks",
+    "bye",
+    "goodbye",
+    "see you",
+    "see you later",
+    # Hebrew
+    "שלום",
+    "היי",
+    "תודה",
+    "תודה רבה",
+    "בוקר טוב",
+    "ערב טוב",
+    "לילה טוב",
+    "מה נשמע",
+    "מה שלומך",
+    "אוקיי",
+    "בסדר",
+    "ביי",
+    "להתראות",
+}
+
+# Tokens that carry no retrievable meaning on their own.
+SMALL_TALK_TOKENS = {
+    "hi",
+    "hello",
+    "hey",
+    "there",
+    "good",
+    "morning",
+    "evening",
+    "night",
+    "thanks",
+    "thank",
+    "you",
+    "thx",
+    "ty",
+    "so",
+    "much",
+    "a",
+    "lot",
+    "ok",
+    "okay",
+    "k",
+    "yes",
+    "yeah",
+    "yep",
+    "no",
+    "nope",
+    "sure",
+    "cool",
+    "great",
+    "nice",
+    "alright",
+    "bye",
+    "goodbye",
+    "see",
+    "later",
+    "lol",
+    "haha",
+    "cheers",
+    # Hebrew
+    "שלום",
+    "היי",
+    "תודה",
+    "רבה",
+    "אוקיי",
+    "בסדר",
+    "כן",
+    "לא",
+    "סבבה",
+    "אחלה",
+    "ביי",
+    "להתראות",
+    "בוקר",
+    "ערב",
+    "לילה",
+    "טוב",
+}
+
+_PUNCT_RE = re.compile(r"[^\w\s]", flags=re.UNICODE)
+
+
+def _normalize(message: str) -> str:
+    return " ".join(_PUNCT_RE.sub(" ", message.lower()).split())
+
+
+def load_classifier(path: Optional[str]) -> Optional[Callable[[str], bool]]:
+    """
+    Resolves a "module:function" path to a callable returning True when a
+    message needs retrieval. Returns None (and logs) if it cannot be loaded.
+    """
+    if not path:
+        return None
+    module_name, _, attr = path.partition(":")
+    try:
+        classifier = getattr(importlib.import_module(module_name), attr)
+    except (ImportError, AttributeError, ValueError) as e:
+        logging.error(f"Could not load retrieval gate classifier '{path}': {e}")
+        return None
+    if not callable(classifier):
+        logging.error(f"Retrieval gate classifier '{path}' is not callable. Ignoring it.")
+        return None
+    return classifier
+
+
+class RetrievalGate:
+    """
+    Cheap length + lexical check, optionally backed by a small local classifier
+    for short messages the word lists cannot decide.
+    """
+
+    def __init__(self, max_words: int = 6, classifier: Optional[Callable[[str], bool]] = None):
+        self.max_words = max_words
+        self.classifier = classifier
+
+    def _decide(self, message: str) -> bool:
+        text = _normalize(message)
+        if not text:
+            return False
+        if text in SMALL_TALK_PHRASES:
+            return False
+
+        tokens = text.split()
+        if len(tokens) > self.max_words or "?" in message:
+            return True
+        if all(token in SMALL_TALK_TOKENS for token in tokens):
+            return False
+
+        if self.classifier is not None:
+            try:
+                return bool(self.classifier(message))
+            except Exception as e:
+                logging.error(f"Retrieval gate classifier failed, defaulting to retrieval: {e}")
+        return True
+
+    def needs_retrieval(self, message: str) -> bool:
+        decision = self._decide(message)
+        gate_decisions.inc(decision="retrieve" if decision else "skip")
+        return decision
@@ -0,0 +1,138 @@
+# app/rag/persona.py
+"""
+Per-user "future me" persona digest.
+
+The digest is a compact, stable text built once from the user's `future_me`
+chunks, then the shared ones ingested without a user_id, and kept in an
+in-memory LRU. It replaces the per-turn `future_me` vector search and is
+rebuilt after that user's (or the shared) `future_me` documents are
+re-ingested through the API, or once it is `ttl_seconds` old: CLI and
+in-process ingests write to Chroma without reaching this cache.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.metrics import counter
+from app.rag.processor import DocumentProcessor
+
+persona_cache_events = counter(
+    "dfm_persona_digest_cache_total",
+    "Persona digest cache lookups and rebuilds.",
+    ("event",),
+)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _in_order(docs: List[Document]) -> List[Document]:
+    return sorted(docs, key=lambda d: (d.metadata.get("doc_id", ""), d.metadata.get("chunk", 0)))
+
+
+class PersonaDigestCache:
+    def __init__(
+        self,
+        processor: DocumentProcessor,
+        max_users: int = 256,
+        max_chars: int = 1200,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.processor = processor
+        self.max_users = max_users
+        self.max_chars = max_chars
+        self.ttl_seconds = ttl_seconds  # None or 0: kept until invalidated or evicted
+        self._digests: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # user_id -> (built at, digest)
+        # Chunks without a user_id, part of every digest, with the time they were read
+        self._shared: Optional[Tuple[float, List[Document]]] = None
+        # Bumped by every invalidate: a build that overlapped one may have read the old documents
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def _expired(self, built_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.monotonic() - built_at >= self.ttl_seconds
+
+    def peek(self, user_id: str) -> Optional[str]:
+        """Cached digest or None (also once expired); never touches the vector store."""
+        with self._lock:
+            entry = self._digests.get(user_id)
+            if entry is None:
+                return None
+            if self._expired(entry[0]):
+                del self._digests[user_id]
+                persona_cache_events.inc(event="expired")
+                return None
+            self._digests.move_to_end(user_id)
+            persona_cache_events.inc(event="hit")
+            return entry[1]
+
+    def get(self, user_id: str) -> str:
+        """Cached digest, building (blocking) on a miss."""
+        digest = self.peek(user_id)
+        if digest is not None:
+            return digest
+        persona_cache_events.inc(event="rebuild")
+        generation, built_at = self._generation, time.monotonic()
+        digest = self.build(user_id)
+        with self._lock:
+            if generation != self._generation:
+                return digest  # invalidated while building: serve it this once, don't cache it
+            self._digests[user_id] = (built_at, digest)
+            self._digests.move_to_end(user_id)
+            while len(self._digests) > self.max_users:
+                self._digests.popitem(last=False)
+        return digest
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """
+        Drops one user's digest, or, when `user_id` is None (shared documents
+        changed), every digest and the cached shared chunks they were built from.
+        """
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._digests.clear()
+                self._shared = None
+            else:
+                self._digests.pop(user_id, None)
+
+    def shared_documents(self) -> List[Document]:
+        """`future_me` chunks ingested without a user_id (e.g. the demo profile), reread once invalidated or expired."""
+        cached = self._shared
+        if cached is not None and not self._expired(cached[0]):
+            return cached[1]
+        generation, read_at = self._generation, time.monotonic()
+        # Chroma cannot filter on a missing metadata key, so this is one full scan
+        shared = _in_order([d for d in self.processor.get_documents(where=None) if not d.metadata.get("user_id")])
+        with self._lock:
+            if generation == self._generation:
+                self._shared = (read_at, shared)
+        return shared
+
+    def build(self, user_id: str) -> str:
+        """Extractive digest: the lead sentences of each chunk, the user's own first, up to max_chars."""
+        parts: List[str] = []
+        docs = _in_order(self.processor.get_documents(where={"user_id": user_id})) + self.shared_documents()
+        seen = set()
+        for doc in docs:
+            for sentence in _SENTENCE_RE.split(doc.page_content.strip())[:2]:
+                sentence = sentence.strip()
+                if sentence and sentence not in seen:
+                    seen.add(sentence)
+                    parts.append(sentence)
+
+        digest = ""
+        for part in parts:
+            candidate = f"{digest} {part}".strip()
+            if len(candidate) > self.max_chars:
+                digest = digest or part[: self.max_chars]
+                break
+            digest = candidate
+        return digest
@@ -1,39 +1,276 @@
 # app/rag/processor.py
-from typing import List, cast
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Sequence, Tuple, TypeVar, cast
 
 from langchain.docstore.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 
+from app.core.metrics import counter, histogram
 from app.core.settings import get_settings
+from app.core.tracing import tracer
+from app.core.usage import estimate_tokens, usage
 
 cfg = get_settings()
 
+retrieval_k = histogram(
+    "dfm_retrieval_k",
+    "Number of chunks kept per query by adaptive retrieval.",
+    ("namespace",),
+    buckets=(0, 1, 2, 3, 4, 5, 8, 10),
+)
+vector_search_seconds = histogram(
+    "dfm_vector_search_seconds",
+    "Vector store search latency per namespace (includes query embedding on a cache miss).",
+    ("namespace",),
+)
+embedding_seconds = histogram(
+    "dfm_embedding_seconds",
+    "Embedding API latency; kind is query (cache misses only) or documents (ingest).",
+    ("kind",),
+)
+query_embedding_cache = counter(
+    "dfm_query_embedding_cache_total",
+    "Query embedding LRU lookups by outcome (hit/miss).",
+    ("outcome",),
+)
+ingest_stage_seconds = histogram(
+    "dfm_ingest_stage_seconds",
+    "Ingest latency per stage: split, upsert (embeds the chunks and writes them) and persist.",
+    ("namespace", "stage"),
+)
+retrieval_scores = histogram(
+    "dfm_retrieval_relevance_score",
+    "Relevance scores (0..1) of the candidate chunks returned by the vector store.",
+    ("namespace",),
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+
+
+class QueryCachingEmbeddings(Embeddings):
+    """
+    Wraps an embeddings client and memoises `embed_query` in a small LRU shared by
+    all processors, so one chat turn embeds its query once even when it searches
+    several namespaces. Document embedding is passed through untouched.
+    """
+
+    _cache: "OrderedDict[str, List[float]]" = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, inner: Embeddings, max_size: int = 512, namespace: str | None = None):
+        self.inner = inner
+        self.max_size = max_size
+        self.namespace = namespace  # labels token usage
+        self.model = str(getattr(inner, "model", "unknown"))
+
+    def _record_usage(self, texts: List[str]) -> None:
+        # The embeddings API does not return usage through LangChain, so tokens are estimated
+        usage.record(self.model, "embedding", sum(estimate_tokens(t) for t in texts), namespace=self.namespace)
+
+    def _lookup(self, text: str) -> List[float] | None:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+        query_embedding_cache.inc(outcome="miss" if vector is None else "hit")
+        return vector
+
+    def _remember(self, text: str, vector: List[float]) -> List[float]:
+        with self._lock:
+            self._cache[text] = vector
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._record_usage(texts)
+        with embedding_seconds.time(kind="documents"):
+            return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._record_usage(texts)
+        with embedding_seconds.time(kind="documents"):
+            return await self.inner.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._lookup(text)
+        if vector is not None:
+            return vector
+        self._record_usage([text])
+        with embedding_seconds.time(kind="query"):
+            vector = self.inner.embed_query(text)
+        return self._remember(text, vector)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._lookup(text)
+        if vector is not None:
+            return vector
+        self._record_usage([text])
+        with embedding_seconds.time(kind="query"):
+            vector = await self.inner.aembed_query(text)
+        return self._remember(text, vector)
+
+
+def select_k(scores: Sequence[float], threshold: float, gap: float, min_k: int, max_k: int) -> int:
+    """
+    Chooses how many of the (descending) `scores` to keep: only those above
+    `threshold`, cut at the first drop larger than `gap` (but never below
+    `min_k`), and at most `max_k`. Returns 0 when nothing is relevant.
+    """
+    relevant = [s for s in scores[:max_k] if s >= threshold]
+    k = len(relevant)
+    for i in range(max(min_k, 1), len(relevant)):
+        if relevant[i - 1] - relevant[i] > gap:
+            k = i
+            break
+    return k
+
+
+def _openai_embeddings() -> OpenAIEmbeddings:
+    base_url = cfg.OPENAI_EMBEDDINGS_BASE_URL or cfg.OPENAI_BASE_URL
+    if base_url is None:
+        return OpenAIEmbeddings(api_key=cfg.OPENAI_API_KEY, max_retries=cfg.OPENAI_MAX_RETRIES)
+    # Compatible servers take plain strings; the token-array path also needs tiktoken's online encoding files
+    return OpenAIEmbeddings(
+        api_key=cfg.OPENAI_API_KEY,
+        base_url=base_url,
+        max_retries=cfg.OPENAI_MAX_RETRIES,
+        check_embedding_ctx_length=False,
+    )
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _traced(method: F) -> F:
+    """Records each call as a `DocumentProcessor.<method>` span tagged with the namespace."""
+
+    @functools.wraps(method)
+    def wrapper(self: "DocumentProcessor", *args: Any, **kwargs: Any) -> Any:
+        with tracer.span(f"DocumentProcessor.{method.__name__}", namespace=self.namespace):
+            return method(self, *args, **kwargs)
+
+    return cast(F, wrapper)
+
 
 class DocumentProcessor:
     def __init__(self, namespace: str):
         self.namespace = namespace
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        self.embeddings = OpenAIEmbeddings(api_key=cfg.OPENAI_API_KEY)
+        self.embeddings = QueryCachingEmbeddings(
+            _openai_embeddings(),
+            max_size=cfg.QUERY_EMBEDDING_CACHE_SIZE,
+            namespace=self.namespace,
+        )
         self.vectordb = Chroma(
             collection_name=self.namespace,
             embedding_function=self.embeddings,
             persist_directory=cfg.CHROMA_DIR,  # Uses the settings value
         )
 
+    @_traced
     def ingest(self, doc_id: str, text: str, metadata: dict | None = None) -> None:
-        docs = [Document(page_content=text, metadata=metadata or {})]
-        texts = self.text_splitter.split_documents(docs)
+        self._ingest([(doc_id, text, metadata)])
+
+    @_traced
+    def ingest_many(self, documents: Sequence[Tuple[str, str, dict | None]]) -> None:
+        """
+        Ingests several (doc_id, text, metadata) documents at once: their chunks
+        share embedding requests and upserts, so many small files cost a few
+        large calls instead of one small call each.
+        """
+        self._ingest(documents)
+
+    def _ingest(self, documents: Sequence[Tuple[str, str, dict | None]]) -> None:
+        # ingested_at (epoch seconds) orders a session's chunks and supports date-range filters
+        now = time.time()
+        texts: List[Document] = []
+        ids: List[str] = []
+        with ingest_stage_seconds.time(namespace=self.namespace, stage="split"):
+            for doc_id, text, metadata in documents:
+                doc = Document(page_content=text, metadata={"ingested_at": now, **(metadata or {}), "doc_id": doc_id})
+                chunks = self.text_splitter.split_documents([doc])
+                for i, chunk in enumerate(chunks):
+                    chunk.metadata["chunk"] = i
+                texts.extend(chunks)
+                ids.extend(f"{doc_id}_{i}" for i in range(len(chunks)))
         # TODO: Add error handling for ChromaDB operations
-        self.vectordb.add_documents(texts, ids=[f"{doc_id}_{i}" for i in range(len(texts))])
-        self.vectordb.persist()
+        batch = max(1, cfg.INGEST_UPSERT_BATCH_SIZE)
+        with ingest_stage_seconds.time(namespace=self.namespace, stage="upsert"):
+            # Batched: a large document splits into more chunks than Chroma accepts in one upsert
+            for start in range(0, len(texts), batch):
+                self.vectordb.add_documents(texts[start : start + batch], ids=ids[start : start + batch])
+        if hasattr(self.vectordb, "persist"):  # langchain_chroma persists automatically
+            with ingest_stage_seconds.time(namespace=self.namespace, stage="persist"):
+                self.vectordb.persist()
 
-    def query(self, query: str, k: int = 5, metadata_filter: dict | None = None) -> List[Document]:
+    @_traced
+    def query(self, query: str, k: int | None = None, metadata_filter: dict | None = None) -> List[Document]:
+        """Returns the top `k` chunks, or an adaptively sized set when `k` is None."""
         # TODO: Add error handling for ChromaDB operations
-        # TODO: Consider if metadata filtering should be part of the query
-        # results = self.vectordb.similarity_search_with_score(query, k=k, filter=metadata_filter)
-        return cast(List[Document], self.vectordb.similarity_search(query, k=k, filter=metadata_filter))
+        if k is not None:
+            with vector_search_seconds.time(namespace=self.namespace):
+                return cast(List[Document], self.vectordb.similarity_search(query, k=k, filter=metadata_filter))
+        return [doc for doc, _ in self.query_adaptive(query, metadata_filter=metadata_filter)]
+
+    @_traced
+    def get_documents(self, where: dict | None) -> List[Document]:
+        """Fetches chunks by metadata only (no embedding, no similarity search); every chunk if `where` is None."""
+        result = self.vectordb.get(where=where, include=["documents", "metadatas"])
+        return [
+            Document(id=chunk_id, page_content=text, metadata=meta or {})
+            for chunk_id, text, meta in zip(
+                result.get("ids") or [], result.get("documents") or [], result.get("metadatas") or []
+            )
+        ]
+
+    @_traced
+    def delete_documents(self, where: dict) -> None:
+        """Deletes chunks by metadata (e.g. every chunk of one doc_id before re-ingesting it)."""
+        self.vectordb.delete(where=where)
+
+    @_traced
+    def query_with_scores(
+        self, query: str, k: int = 5, metadata_filter: dict | None = None
+    ) -> List[Tuple[Document, float]]:
+        """Top `k` chunks with relevance scores in [0, 1] (higher is more relevant), best first."""
+        with vector_search_seconds.time(namespace=self.namespace):
+            results = self.vectordb.similarity_search_with_relevance_scores(query, k=k, filter=metadata_filter)
+        for doc, _ in results:
+            doc.metadata.setdefault("namespace", self.namespace)
+        return sorted(results, key=lambda pair: pair[1], reverse=True)
+
+    @_traced
+    def get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored vectors for the given chunk ids (a lookup by id, not a similarity search)."""
+        if not ids:
+            return {}
+        result = self.vectordb.get(ids=ids, include=["embeddings"])
+        embeddings = result.get("embeddings")
+        if embeddings is None:
+            return {}
+        return {chunk_id: [float(v) for v in vector] for chunk_id, vector in zip(result["ids"], embeddings)}
+
+    @_traced
+    def query_adaptive(self, query: str, metadata_filter: dict | None = None) -> List[Tuple[Document, float]]:
+        """
+        Score-aware retrieval: fetches up to the namespace ceiling, then keeps only
+        the relevant head of the list (see `select_k`). An unrelated query yields [].
+        """
+        min_k, max_k = cfg.RAG_K_LIMITS.get(self.namespace, (cfg.RAG_MIN_K, cfg.RAG_MAX_K))
+        results = self.query_with_scores(query, k=max_k, metadata_filter=metadata_filter)
+        scores = [score for _, score in results]
+        k = select_k(scores, cfg.RAG_RELEVANCE_THRESHOLD, cfg.RAG_SCORE_GAP, min_k, max_k)
+
+        for score in scores:
+            retrieval_scores.observe(score, namespace=self.namespace)
+        retrieval_k.observe(k, namespace=self.namespace)
+        return results[:k]
 
     def delete_collection(self) -> None:
         """Deletes the entire collection associated with this namespace."""
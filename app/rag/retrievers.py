@@ -0,0 +1,85 @@
+# app/rag/retrievers.py
+"""LangChain retrievers built on top of DocumentProcessor."""
+
+from typing import Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.rag.processor import DocumentProcessor
+
+
+class AdaptiveRetriever(BaseRetriever):
+    """Retriever whose k is chosen per query from relevance scores (see DocumentProcessor.query_adaptive)."""
+
+    processor: DocumentProcessor
+    metadata_filter: dict | None = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        results = self.processor.query_adaptive(query, metadata_filter=self.metadata_filter)
+        docs = []
+        for doc, score in results:
+            doc.metadata = {**doc.metadata, "relevance_score": score}
+            docs.append(doc)
+        return docs
+
+
+def and_filter(*filters: Optional[dict]) -> Optional[dict]:
+    """Combines Chroma `where` filters; Chroma needs an explicit $and for more than one condition."""
+    parts = [f for f in filters if f]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else {"$and": parts}
+
+
+class HierarchicalSessionRetriever(BaseRetriever):
+    """
+    Two-tier session memory: searches the compact per-session summaries first,
+    then the raw `session_data` chunks of the sessions those summaries point to
+    (metadata filter on session_id). Summaries only exist for sessions someone
+    summarized, so the raw search also covers every chunk no summary accounts
+    for: sessions without one, and chunks ingested after their session's
+    latest summary. Returns the summaries followed by the raw chunks. Until any
+    summaries exist (or when none match), it searches all of the caller's raw
+    chunks, like AdaptiveRetriever.
+    """
+
+    summary_processor: DocumentProcessor
+    session_processor: DocumentProcessor
+    max_sessions: int = 3
+    metadata_filter: dict | None = None
+
+    def _unsummarized_filters(self, selected: List[str]) -> List[dict]:
+        """Filters for the raw chunks that no summary covers, apart from the `selected` sessions."""
+        summarized_at: Dict[str, float] = {}
+        for doc in self.summary_processor.get_documents(self.metadata_filter):
+            session_id = doc.metadata.get("session_id")
+            if session_id:
+                ingested_at = float(doc.metadata.get("ingested_at", 0.0))
+                summarized_at[session_id] = max(ingested_at, summarized_at.get(session_id, ingested_at))
+        # $nin also matches chunks without a session_id
+        filters: List[dict] = [{"session_id": {"$nin": sorted(summarized_at) or selected}}]
+        for session_id, ingested_at in summarized_at.items():
+            if session_id not in selected:
+                filters.append({"$and": [{"session_id": session_id}, {"ingested_at": {"$gt": ingested_at}}]})
+        return filters
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        summaries = self.summary_processor.query_adaptive(query, metadata_filter=self.metadata_filter)
+        session_ids: List[str] = []
+        summary_docs: List[Document] = []
+        for doc, _ in summaries:
+            session_id = doc.metadata.get("session_id")
+            if session_id and session_id not in session_ids and len(session_ids) < self.max_sessions:
+                session_ids.append(session_id)
+                summary_docs.append(doc)
+        if not session_ids:
+            return [
+                doc for doc, _ in self.session_processor.query_adaptive(query, metadata_filter=self.metadata_filter)
+            ]
+
+        sessions = {"$or": [{"session_id": {"$in": session_ids}}, *self._unsummarized_filters(session_ids)]}
+        raw_filter = and_filter(sessions, self.metadata_filter)
+        raw_docs = [doc for doc, _ in self.session_processor.query_adaptive(query, metadata_filter=raw_filter)]
+        return summary_docs + raw_docs
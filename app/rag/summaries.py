@@ -0,0 +1,127 @@
+# app/rag/summaries.py
+"""
+Incremental session summaries.
+
+A checkpoint records which `session_data` chunks a session summary already
+covers and a hash of their content. Re-summarizing an unchanged session is a
+cache hit; when turns were appended since the last call only those new chunks
+are folded into the existing summary.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from app.core.metrics import counter
+from app.core.usage import CHARS_PER_TOKEN
+
+summary_requests = counter(
+    "dfm_session_summary_total",
+    "Session summary requests by outcome: cached, incremental fold or full summary.",
+    ("outcome",),
+)
+
+
+def pack_groups(texts: List[str], max_tokens: int) -> List[str]:
+    """
+    Packs `texts` in order into groups of at most ~`max_tokens` each (for the map
+    step of map-reduce summarization). A single text above the budget is split.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    groups: List[str] = []
+    current: List[str] = []
+    size = 0
+    for text in texts:
+        pieces = [text[i : i + max_chars] for i in range(0, len(text), max_chars)] or [""]
+        for piece in pieces:
+            if current and size + len(piece) > max_chars:
+                groups.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece) + 2
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+
+def order_chunks(docs: List[Document]) -> List[Document]:
+    """Transcript order: ingestion time, then document id, then chunk index."""
+    return sorted(
+        docs,
+        key=lambda d: (
+            d.metadata.get("ingested_at", 0.0),
+            str(d.metadata.get("doc_id", "")),
+            d.metadata.get("chunk", 0),
+        ),
+    )
+
+
+def content_hash(docs: List[Document]) -> str:
+    digest = hashlib.sha256()
+    for doc in docs:
+        digest.update(str(doc.id).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class SummaryCheckpoint:
+    summary: str
+    content_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+
+    def new_chunks(self, docs: List[Document]) -> Optional[List[Document]]:
+        """
+        Chunks added since this checkpoint, or None when chunks it already
+        covers were edited or removed (the summary must then be rebuilt).
+        """
+        covered = set(self.chunk_ids)
+        old = [doc for doc in docs if doc.id in covered]
+        if len(old) != len(covered) or content_hash(old) != self.content_hash:
+            return None
+        return [doc for doc in docs if doc.id not in covered]
+
+
+class SessionSummaryCache:
+    """LRU of per-session summary checkpoints."""
+
+    def __init__(self, max_sessions: int = 1000):
+        self.max_sessions = max_sessions
+        self._checkpoints: "OrderedDict[str, SummaryCheckpoint]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._checkpoints)
+
+    def get(self, session_id: str) -> Optional[SummaryCheckpoint]:
+        with self._lock:
+            checkpoint = self._checkpoints.get(session_id)
+            if checkpoint is not None:
+                self._checkpoints.move_to_end(session_id)
+            return checkpoint
+
+    def is_current(self, session_id: str, docs: List[Document]) -> bool:
+        checkpoint = self.get(session_id)
+        return checkpoint is not None and checkpoint.content_hash == content_hash(docs)
+
+    def store(self, session_id: str, summary: str, docs: List[Document]) -> SummaryCheckpoint:
+        checkpoint = SummaryCheckpoint(summary, content_hash(docs), [str(doc.id) for doc in docs])
+        with self._lock:
+            self._checkpoints[session_id] = checkpoint
+            self._checkpoints.move_to_end(session_id)
+            while len(self._checkpoints) > self.max_sessions:
+                self._checkpoints.popitem(last=False)
+        return checkpoint
+
+    def invalidate(self, session_id: str | None = None) -> None:
+        with self._lock:
+            if session_id is None:
+                self._checkpoints.clear()
+            else:
+                self._checkpoints.pop(session_id, None)
@@ -0,0 +1,8 @@
+# benchmarks/__init__.py
+"""
+Performance benchmarks that run the real app against deterministic fake
+providers (see `benchmarks.fakes`), so they cost nothing and are repeatable.
+
+    python -m benchmarks.chat --out results.json
+    python -m benchmarks.chat --compare baseline.json --threshold 0.15
+"""
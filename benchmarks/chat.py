@@ -0,0 +1,252 @@
+# benchmarks/chat.py
+"""
+End-to-end chat throughput and latency benchmark.
+
+Runs `create_app()` in-process (httpx ASGI transport, lifespan included) with
+fake LLM and embedding providers, then drives a chat endpoint at increasing
+concurrency levels. For each level it reports throughput, end-to-end latency
+percentiles and time to first byte of the response body (TTFT once the
+endpoint streams; for `/chat/text` it is the full reply). `--url` targets an
+already running server instead (real providers, whatever it is configured with).
+
+    python -m benchmarks.chat --levels 1,4,16,64 --requests 200 --out bench/chat.json
+    python -m benchmarks.chat --compare bench/chat-baseline.json --threshold 0.15
+"""
+
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import click
+import httpx
+
+from benchmarks.common import (
+    compare_results,
+    latency_summary,
+    load_report,
+    prepare_environment,
+    report_meta,
+    write_report,
+)
+
+# A mix of retrieval questions and small talk (the gate answers the latter without a vector search)
+MESSAGES = (
+    "What small step can I take today towards the plan we made?",
+    "How did I get through the hard weeks last winter?",
+    "Remind me what my future self said about asking friends for help.",
+    "hi",
+    "thanks, that helps",
+    "What should I do in the evening when the worry comes back?",
+    "Which parts of my safety plan worked best last time?",
+    "good morning",
+)
+
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "ttft_p95_ms", "error_rate")
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+
+async def _send(client: httpx.AsyncClient, path: str, message: str, session_id: str) -> tuple[bool, float, float]:
+    """One request; returns (ok, seconds to first body byte, seconds total)."""
+    start = time.perf_counter()
+    first: Optional[float] = None
+    async with client.stream("POST", path, json={"message": message, "session_id": session_id}) as response:
+        async for _ in response.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - start
+        ok = response.status_code == 200
+    total = time.perf_counter() - start
+    return ok, first if first is not None else total, total
+
+
+async def run_level(
+    client: httpx.AsyncClient, path: str, concurrency: int, requests: int, sessions: int, warmup: int = 0
+) -> Dict[str, Any]:
+    """`requests` chat turns with `concurrency` in flight, spread over `sessions` conversations."""
+    for i in range(warmup):
+        await _send(client, path, MESSAGES[i % len(MESSAGES)], f"bench-warmup-{i % sessions}")
+
+    counter = itertools.count()
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            try:
+                ok, ttft, total = await _send(client, path, MESSAGES[i % len(MESSAGES)], f"bench-{i % sessions}")
+            except httpx.HTTPError:
+                ok, ttft, total = False, 0.0, 0.0
+            if ok:
+                latencies.append(total)
+                ttfts.append(ttft)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+        **latency_summary(latencies),
+        **latency_summary(ttfts, prefix="ttft_"),
+    }
+
+
+async def run_levels(
+    client: httpx.AsyncClient, path: str, levels: Sequence[int], requests: int, sessions: int, warmup: int
+) -> List[Dict[str, Any]]:
+    results = []
+    for concurrency in levels:
+        result = await run_level(client, path, concurrency, requests, sessions, warmup)
+        click.echo(
+            f"concurrency={concurrency:<4} rps={result['throughput_rps']:<9} p50={result['p50_ms']}ms "
+            f"p95={result['p95_ms']}ms p99={result['p99_ms']}ms errors={result['errors']}",
+            err=True,
+        )
+        results.append(result)
+    return results
+
+
+async def run_in_process(
+    levels: Sequence[int],
+    requests: int,
+    sessions: int = 16,
+    warmup: int = 0,
+    path: str = "/chat/text",
+    llm: Any = None,
+    embeddings: Any = None,
+    create_tables: bool = True,
+) -> List[Dict[str, Any]]:
+    """Starts the app with fake providers (`benchmarks.fakes`) and runs every level against it."""
+    from app.db.init_db import init_db
+    from app.main import create_app
+    from benchmarks.fakes import fake_providers
+
+    if create_tables:
+        await init_db()
+    with fake_providers(llm, embeddings):
+        app = create_app()
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                return await run_levels(client, path, levels, requests, sessions, warmup)
+
+
+async def run_remote(
+    url: str, levels: Sequence[int], requests: int, sessions: int, warmup: int, path: str
+) -> List[Dict[str, Any]]:
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=None) as client:
+        return await run_levels(client, path, levels, requests, sessions, warmup)
+
+
+@click.command(help="Chat throughput/latency benchmark with fake LLM and embedding providers.")
+@click.option("--levels", default="1,4,16,64", show_default=True, help="Comma-separated concurrency levels.")
+@click.option("--requests", "n_requests", default=200, show_default=True, help="Requests per level.")
+@click.option("--sessions", default=16, show_default=True, help="Distinct session ids the requests rotate through.")
+@click.option("--warmup", default=5, show_default=True, help="Unmeasured requests before each level.")
+@click.option("--path", default="/chat/text", show_default=True, help="Chat endpoint to drive.")
+@click.option("--url", default=None, help="Benchmark a running server instead of an in-process app.")
+@click.option("--llm-ttft-ms", default=400.0, show_default=True, help="Fake LLM mean time to first token.")
+@click.option("--llm-jitter-ms", default=150.0, show_default=True, help="Standard deviation of the TTFT.")
+@click.option(
+    "--llm-distribution",
+    type=click.Choice(["fixed", "normal", "lognormal"]),
+    default="lognormal",
+    show_default=True,
+)
+@click.option("--llm-tokens-per-second", default=60.0, show_default=True, help="Fake LLM generation rate.")
+@click.option("--llm-reply-tokens", default=80, show_default=True, help="Tokens per fake LLM reply.")
+@click.option("--embed-ms", default=60.0, show_default=True, help="Fake embedding call mean latency.")
+@click.option("--embed-jitter-ms", default=20.0, show_default=True)
+@click.option("--seed", default=0, show_default=True, help="Seed for the latency distributions.")
+@click.option("--workdir", default=None, help="Scratch dir for the DB and Chroma (default: a temp dir).")
+@click.option("--out", "out_path", default="bench/chat.json", show_default=True, help="JSON report path.")
+@click.option("--compare", "baseline_path", default=None, help="Baseline report; exit 1 on regression.")
+@click.option("--threshold", default=0.10, show_default=True, help="Allowed regression (fraction) in compare mode.")
+def main(
+    levels: str,
+    n_requests: int,
+    sessions: int,
+    warmup: int,
+    path: str,
+    url: Optional[str],
+    llm_ttft_ms: float,
+    llm_jitter_ms: float,
+    llm_distribution: str,
+    llm_tokens_per_second: float,
+    llm_reply_tokens: int,
+    embed_ms: float,
+    embed_jitter_ms: float,
+    seed: int,
+    workdir: Optional[str],
+    out_path: str,
+    baseline_path: Optional[str],
+    threshold: float,
+) -> None:
+    concurrency_levels = [int(level) for level in levels.split(",") if level.strip()]
+    config = {
+        "levels": concurrency_levels,
+        "requests": n_requests,
+        "sessions": sessions,
+        "warmup": warmup,
+        "path": path,
+        "url": url,
+        "llm": {
+            "ttft_ms": llm_ttft_ms,
+            "jitter_ms": llm_jitter_ms,
+            "distribution": llm_distribution,
+            "tokens_per_second": llm_tokens_per_second,
+            "reply_tokens": llm_reply_tokens,
+        },
+        "embeddings": {"latency_ms": embed_ms, "jitter_ms": embed_jitter_ms},
+        "seed": seed,
+    }
+
+    if url:
+        results = asyncio.run(run_remote(url, concurrency_levels, n_requests, sessions, warmup, path))
+    else:
+        prepare_environment(workdir or tempfile.mkdtemp(prefix="dfm-bench-"))
+        from benchmarks.fakes import FakeChatModel, FakeEmbeddings, LatencyModel
+
+        llm = FakeChatModel(
+            ttft=LatencyModel(llm_ttft_ms, llm_jitter_ms, llm_distribution, seed=seed),
+            tokens_per_second=llm_tokens_per_second,
+            reply_tokens=llm_reply_tokens,
+        )
+        embeddings = FakeEmbeddings(latency=LatencyModel(embed_ms, embed_jitter_ms, seed=seed + 1))
+        results = asyncio.run(
+            run_in_process(concurrency_levels, n_requests, sessions, warmup, path, llm=llm, embeddings=embeddings)
+        )
+
+    write_report(out_path, {"benchmark": "chat", "meta": report_meta(config), "results": results})
+    click.echo(f"Report written to {os.path.abspath(out_path)}", err=True)
+
+    if baseline_path:
+        regressions = compare_results(
+            results,
+            load_report(baseline_path)["results"],
+            key="concurrency",
+            threshold=threshold,
+            lower_is_better=LOWER_IS_BETTER,
+            higher_is_better=HIGHER_IS_BETTER,
+        )
+        for regression in regressions:
+            click.echo(f"REGRESSION {regression}", err=True)
+        if regressions:
+            sys.exit(1)
+        click.echo(f"No regression beyond {threshold:.0%} against {baseline_path}", err=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/common.py
+"""Shared helpers: isolated settings, latency percentiles, peak RSS, JSON reports and baseline comparison."""
+
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from app.core.memory_diagnostics import rss_mb
+
+
+def prepare_environment(workdir: str) -> None:
+    """
+    Points the app at a scratch SQLite DB and Chroma directory under `workdir`,
+    with auth skipped. Must run before any `app.*` module that reads the settings
+    is imported (they are read once at import time).
+    """
+    os.makedirs(workdir, exist_ok=True)
+    # Never touch real data, whatever .env says
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["CHROMA_DB_PATH"] = os.path.join(workdir, "chroma")
+    os.environ["DEMO_MODE"] = "true"
+    os.environ["SKIP_AUTH"] = "true"
+    for key, value in {
+        "SECRET_KEY": "benchmark-secret-key",
+        "OPENAI_API_KEY": "benchmark-fake-key",
+        "DEMO_USER_EMAIL": "bench@example.com",
+        "DEMO_USER_PASSWORD": "benchmark",
+        "TRACING_ENABLED": "false",
+    }.items():
+        os.environ.setdefault(key, value)
+
+
+def percentile(values: Sequence[float], p: float) -> Optional[float]:
+    """The p-th percentile (0..100) with linear interpolation, or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(seconds: Sequence[float], prefix: str = "") -> Dict[str, Optional[float]]:
+    """{prefix}p50_ms / p95_ms / p99_ms / mean_ms / max_ms for latencies given in seconds."""
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        f"{prefix}p50_ms": ms(percentile(seconds, 50)),
+        f"{prefix}p95_ms": ms(percentile(seconds, 95)),
+        f"{prefix}p99_ms": ms(percentile(seconds, 99)),
+        f"{prefix}mean_ms": ms(sum(seconds) / len(seconds) if seconds else None),
+        f"{prefix}max_ms": ms(max(seconds) if seconds else None),
+    }
+
+
+class PeakRss:
+    """
+    Samples RSS in a background thread while the block runs; `peak_mb` is the
+    highest value seen (the process-wide ru_maxrss cannot be reset between runs).
+    """
+
+    def __init__(self, interval_seconds: float = 0.05):
+        self.interval_seconds = interval_seconds
+        self.start_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def __enter__(self) -> "PeakRss":
+        self.start_mb = self.peak_mb = rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def report_meta(config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+    }
+
+
+def write_report(path: str, report: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_results(
+    current: Iterable[Dict[str, Any]],
+    baseline: Iterable[Dict[str, Any]],
+    key: str,
+    threshold: float,
+    lower_is_better: Sequence[str] = (),
+    higher_is_better: Sequence[str] = (),
+) -> List[str]:
+    """
+    Matches result rows on `key` and returns one message per metric that is worse
+    than the baseline by more than `threshold` (a fraction, 0.1 = 10%). Rows or
+    metrics missing on either side are skipped.
+    """
+    baseline_rows = {row.get(key): row for row in baseline}
+    regressions: List[str] = []
+    for row in current:
+        base = baseline_rows.get(row.get(key))
+        if base is None:
+            continue
+        for metric in (*lower_is_better, *higher_is_better):
+            now, before = row.get(metric), base.get(metric)
+            if now is None or before is None:
+                continue
+            if metric in lower_is_better:
+                worse = now > before * (1 + threshold) if before > 0 else now > threshold
+            else:
+                worse = now < before * (1 - threshold)
+            if worse:
+                regressions.append(f"{key}={row.get(key)}: {metric} {now} vs baseline {before}")
+    return regressions
@@ -0,0 +1,242 @@
+# benchmarks/corpus.py
+"""
+Synthetic English and Hebrew documents of a given size.
+
+Documents are assembled from a seeded pool of paragraphs, so generating a
+100 MB document is cheap and the same (language, seed, index) always yields
+the same text. Paragraphs are separated by blank lines and sentences end in
+punctuation, so the text splitter sees realistic boundaries.
+
+`labelled_corpus` adds one known fact per document and a query that asks
+for it, for each of the four RAG namespaces. Facts are built from pairs of
+slot values, so every other document sharing one slot is a near-miss.
+"""
+
+import functools
+import itertools
+import random
+import re
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+WORDS: Dict[str, Tuple[str, ...]] = {
+    "en": tuple(
+        (
+            "today I want to remember that the hard days pass and small steps still count "
+            "my future self is proud of the walk I took this morning and of the call I made "
+            "to a friend when the evening felt heavy breathing slowly helps me notice what I feel "
+            "the plan says to write down one thing that went well rest drink water and ask for help "
+            "hope grows when I keep promises to myself even tiny ones like making tea or opening a window"
+        ).split()
+    ),
+    "he": tuple(
+        (
+            "היום אני רוצה לזכור שהימים הקשים עוברים וגם צעדים קטנים נחשבים "
+            "העצמי העתידי שלי גאה בהליכה שעשיתי הבוקר ובשיחה שעשיתי עם חבר "
+            "כשהערב הרגיש כבד נשימה איטית עוזרת לי לשים לב למה שאני מרגיש "
+            "התוכנית אומרת לכתוב דבר אחד שהלך טוב לנוח לשתות מים ולבקש עזרה "
+            "התקווה גדלה כשאני מקיים הבטחות לעצמי אפילו קטנות כמו להכין תה או לפתוח חלון"
+        ).split()
+    ),
+}
+LANGUAGES = tuple(WORDS)
+_POOL_SIZE = 256
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024**2, "MB": 1024**2, "G": 1024**3, "GB": 1024**3}
+
+
+def parse_size(value: str) -> int:
+    """'1KB', '2.5MB', '512' -> bytes (binary units)."""
+    match = _SIZE.match(value)
+    if match is None:
+        raise ValueError(f"Invalid size '{value}'")
+    number, unit = match.groups()
+    return int(float(number) * _UNITS[unit.upper()])
+
+
+@functools.lru_cache(maxsize=8)
+def _paragraphs(language: str, seed: int) -> List[str]:
+    words = WORDS[language]
+    rng = random.Random(f"{language}:{seed}")
+    paragraphs = []
+    for _ in range(_POOL_SIZE):
+        sentences = []
+        for _ in range(rng.randint(2, 6)):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(6, 18)))
+            sentences.append(sentence[0].upper() + sentence[1:] + rng.choice(".!?."))
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+
+def synthetic_document(language: str, size_bytes: int, seed: int = 0, index: int = 0) -> str:
+    """A document of about `size_bytes` UTF-8 bytes (never more)."""
+    if language not in WORDS:
+        raise ValueError(f"Unknown language '{language}' (expected one of {', '.join(LANGUAGES)})")
+    pool = _paragraphs(language, seed)
+    rng = random.Random(f"{language}:{seed}:{index}")
+    parts: List[str] = []
+    size = 0
+    while size < size_bytes:
+        paragraph = rng.choice(pool)
+        parts.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 2
+    text = "\n\n".join(parts).encode("utf-8")[:size_bytes]
+    return text.decode("utf-8", errors="ignore")  # a cut through a multi-byte letter drops it
+
+
+def synthetic_corpus(language: str, n_docs: int, size_bytes: int, seed: int = 0) -> Iterator[Tuple[str, str]]:
+    """(doc_id, text) pairs, generated lazily so large corpora never sit in memory at once."""
+    for index in range(n_docs):
+        yield f"bench-{language}-{seed}-{index}", synthetic_document(language, size_bytes, seed, index)
+
+
+# namespace -> (fact template, query template, first slot values, second slot values)
+_FACTS: Dict[str, Tuple[str, str, Tuple[str, ...], Tuple[str, ...]]] = {
+    "theory": (
+        "Research notes: {a} is recommended for {b} because it lowers arousal and widens attention.",
+        "Why is {a} recommended for {b}?",
+        (
+            "grounding",
+            "paced breathing",
+            "behavioural activation",
+            "cognitive reframing",
+            "opposite action",
+            "self compassion",
+            "values clarification",
+            "problem solving therapy",
+            "sleep scheduling",
+            "mindful walking",
+        ),
+        (
+            "panic",
+            "rumination",
+            "loneliness",
+            "insomnia",
+            "shame",
+            "anger",
+            "numbness",
+            "procrastination",
+            "grief",
+            "irritability",
+        ),
+    ),
+    "personal_plan": (
+        "Safety plan: when I notice {a}, I will {b} before anything else.",
+        "When I notice {a}, is my first step to {b}?",
+        (
+            "racing thoughts",
+            "skipping meals",
+            "staying in bed",
+            "pulling away from people",
+            "drinking alone",
+            "sleepless nights",
+            "crying spells",
+            "feeling trapped",
+            "snapping at family",
+            "scrolling for hours",
+        ),
+        (
+            "text my sister",
+            "step outside for ten minutes",
+            "hold an ice cube",
+            "play the calm playlist",
+            "call the crisis line",
+            "write in the red notebook",
+            "make a cup of tea",
+            "visit the neighbour",
+            "take a cold shower",
+            "open the hope box",
+        ),
+    ),
+    "session_data": (
+        "Session log: on {a} we discussed {b} and agreed on one concrete step.",
+        "What did we discuss about {b} on {a}?",
+        (
+            "Monday",
+            "Tuesday",
+            "Wednesday",
+            "Thursday",
+            "Friday",
+            "Saturday",
+            "Sunday",
+            "the holiday",
+            "the retreat",
+            "the intake",
+        ),
+        (
+            "the job interview",
+            "the argument with dad",
+            "moving flats",
+            "the exam results",
+            "the breakup",
+            "the new medication",
+            "the volunteering offer",
+            "the court date",
+            "the birthday party",
+            "the dentist visit",
+        ),
+    ),
+    "future_me": (
+        "Letter from my future self: {a} from now I {b}, and it started with small steps.",
+        "Where am I {a} from now, did I {b}?",
+        (
+            "one year",
+            "two years",
+            "three years",
+            "five years",
+            "seven years",
+            "ten years",
+            "twelve years",
+            "fifteen years",
+            "twenty years",
+            "six months",
+        ),
+        (
+            "finished the nursing degree",
+            "adopted a rescue dog",
+            "ran a marathon",
+            "opened a bakery",
+            "learned the guitar",
+            "moved near the sea",
+            "became a mentor",
+            "rebuilt things with mum",
+            "published a poem",
+            "planted an orchard",
+        ),
+    ),
+}
+RAG_NAMESPACES = tuple(_FACTS)
+
+
+class LabelledDocument(NamedTuple):
+    namespace: str
+    doc_id: str
+    text: str
+
+
+class LabelledQuery(NamedTuple):
+    namespace: str
+    query: str
+    relevant_doc_id: str
+
+
+def labelled_corpus(
+    docs_per_namespace: int, size_bytes: int = 2048, seed: int = 0
+) -> Tuple[List[LabelledDocument], List[LabelledQuery]]:
+    """
+    Documents of filler text with one fact each, plus one query per document
+    whose only correct answer is that document. At most 100 documents per
+    namespace (the number of distinct slot pairs).
+    """
+    documents: List[LabelledDocument] = []
+    queries: List[LabelledQuery] = []
+    for namespace, (fact, question, first, second) in _FACTS.items():
+        rng = random.Random(f"{namespace}:{seed}")
+        pairs = list(itertools.product(first, second))
+        rng.shuffle(pairs)
+        for index, (a, b) in enumerate(pairs[:docs_per_namespace]):
+            doc_id = f"eval-{namespace}-{index}"
+            paragraphs = synthetic_document("en", size_bytes, seed, index).split("\n\n")
+            paragraphs.insert(rng.randint(0, len(paragraphs)), fact.format(a=a, b=b))
+            documents.append(LabelledDocument(namespace, doc_id, "\n\n".join(paragraphs)))
+            queries.append(LabelledQuery(namespace, question.format(a=a, b=b), doc_id))
+    return documents, queries
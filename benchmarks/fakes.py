@@ -0,0 +1,258 @@
+# benchmarks/fakes.py
+"""
+Deterministic stand-ins for the OpenAI chat model and embeddings.
+
+Latency is drawn from a seeded distribution, so two runs with the same seed
+see the same delays; replies and vectors depend only on the input text.
+`FakeEmbeddings` hashes words into a fixed-size vector, so texts sharing
+words are close and similarity search still returns sensible neighbours.
+`OnnxEmbeddings` runs a small real model on the CPU instead, for when the
+embedding cost itself is what is being measured.
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from unittest import mock
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, Field
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_VOCABULARY = (
+    "hope future plan step today small kind breathe walk call friend write rest "
+    "notice feel safe strong proud trust morning evening week goal care"
+).split()
+
+
+@dataclass
+class LatencyModel:
+    """
+    Delay in seconds: `fixed` (always `mean_ms`), `normal` (clipped at 0) or
+    `lognormal` (long right tail, like real API latency), with `jitter_ms` as
+    the standard deviation.
+    """
+
+    mean_ms: float = 0.0
+    jitter_ms: float = 0.0
+    distribution: str = "lognormal"
+    seed: int = 0
+    _rng: random.Random = field(init=False, repr=False)
+    _lock: Any = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        if self.distribution not in ("fixed", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{self.distribution}'")
+        self._rng = random.Random(self.seed)
+
+    def sample(self) -> float:
+        if self.mean_ms <= 0:
+            return 0.0
+        if self.distribution == "fixed" or self.jitter_ms <= 0:
+            return self.mean_ms / 1000
+        with self._lock:
+            if self.distribution == "normal":
+                return max(0.0, self._rng.gauss(self.mean_ms, self.jitter_ms)) / 1000
+            # Parameters of the underlying normal that give this mean and standard deviation
+            sigma2 = math.log(1 + (self.jitter_ms / self.mean_ms) ** 2)
+            return self._rng.lognormvariate(math.log(self.mean_ms) - sigma2 / 2, math.sqrt(sigma2)) / 1000
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def reply_tokens(prompt: str, n: int) -> List[str]:
+    """`n` words (each with a trailing space) chosen from the prompt's hash: same prompt, same reply."""
+    rng = random.Random(_digest(prompt))
+    return [rng.choice(_VOCABULARY) + " " for _ in range(n)]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Replies with `reply_tokens` words chosen from the prompt's hash, after
+    `ttft` (time to first token) plus one token every 1/`tokens_per_second`.
+    Streams token by token, and reports OpenAI-style token usage.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_name: str = "fake-chat"
+    ttft: LatencyModel = Field(default_factory=LatencyModel)
+    tokens_per_second: float = 0.0  # 0 = the whole reply arrives with the first token
+    reply_tokens: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _prompt(self, messages: List[BaseMessage]) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _tokens(self, prompt: str) -> List[str]:
+        return reply_tokens(prompt, self.reply_tokens)
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _result(self, prompt: str, tokens: List[str]) -> ChatResult:
+        from app.core.usage import (
+            estimate_tokens,  # imported late: it reads the app settings
+        )
+
+        text = "".join(tokens).strip()
+        token_usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": len(tokens),
+            "total_tokens": estimate_tokens(prompt) + len(tokens),
+        }
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={"token_usage": token_usage, "model_name": self.model_name},
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = self._prompt(messages)
+        tokens = self._tokens(prompt)
+        time.sleep(self.ttft.sample() + self._token_delay() * len(tokens))
+        return self._result(prompt, tokens)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = self._prompt(messages)
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.ttft.sample() + self._token_delay() * len(tokens))
+        return self._result(prompt, tokens)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.ttft.sample())
+        for i, token in enumerate(self._tokens(self._prompt(messages))):
+            if i:
+                time.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.ttft.sample())
+        for i, token in enumerate(self._tokens(self._prompt(messages))):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors (unit length), with a per-call latency."""
+
+    def __init__(self, dimensions: int = 256, latency: Optional[LatencyModel] = None, model: str = "fake-embedding"):
+        self.dimensions = dimensions
+        self.latency = latency or LatencyModel()
+        self.model = model
+
+    def vector(self, text: str) -> List[float]:
+        values = [0.0] * self.dimensions
+        for word in _WORD.findall(text.lower()):
+            h = _digest(word)
+            values[h % self.dimensions] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in values))
+        if norm == 0:
+            values[0], norm = 1.0, 1.0  # no words: any fixed unit vector
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency.sample())
+        return [self.vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency.sample())
+        return self.vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency.sample())
+        return [self.vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency.sample())
+        return self.vector(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    all-MiniLM-L6-v2 on onnxruntime, through chromadb's bundled embedding function
+    (the model, ~80 MB, is downloaded to ~/.cache/chroma on first use).
+    """
+
+    model = "all-MiniLM-L6-v2"
+
+    def __init__(self) -> None:
+        try:
+            from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+        except ImportError as e:
+            raise RuntimeError("The CPU embedding backend needs chromadb with onnxruntime installed") from e
+        self._function = ONNXMiniLM_L6_V2()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [[float(v) for v in vector] for vector in self._function(texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+@contextmanager
+def fake_providers(llm: Optional[FakeChatModel] = None, embeddings: Optional[FakeEmbeddings] = None) -> Iterator[None]:
+    """
+    Makes orchestrators and document processors created inside the block use the
+    fakes instead of ChatOpenAI / OpenAIEmbeddings (callbacks are kept).
+    """
+    llm = llm or FakeChatModel()
+    embeddings = embeddings or FakeEmbeddings()
+
+    def chat_model(**kwargs: Any) -> FakeChatModel:
+        return llm.model_copy(update={"callbacks": kwargs.get("callbacks")})
+
+    with (
+        mock.patch("app.api.orchestrator.ChatOpenAI", side_effect=chat_model),
+        mock.patch("app.rag.processor.OpenAIEmbeddings", return_value=embeddings),
+    ):
+        yield
@@ -0,0 +1,302 @@
+# benchmarks/ingest.py
+"""
+Ingestion benchmark for `DocumentProcessor.ingest` and `POST /rag/ingest/`.
+
+Feeds synthetic English and/or Hebrew corpora (`benchmarks.corpus`) through
+either target and reports, per scenario (target, language, document size,
+document count): time spent splitting, embedding, upserting into Chroma and
+persisting (from the processor's stage histograms), docs/s, chunks/s, MB/s,
+per-document latency percentiles and peak RSS. Embeddings come from the
+hashing fake (with an optional per-call latency) or a small ONNX model run
+on the CPU.
+
+    python -m benchmarks.ingest --languages en,he --docs 1000 --doc-size 8KB
+    python -m benchmarks.ingest --target endpoint --docs 100 --doc-size 1MB --concurrency 4
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import click
+import httpx
+
+from benchmarks.common import (
+    PeakRss,
+    compare_results,
+    latency_summary,
+    load_report,
+    prepare_environment,
+    report_meta,
+    write_report,
+)
+from benchmarks.corpus import LANGUAGES, parse_size, synthetic_corpus
+
+LOWER_IS_BETTER = ("split_s", "embed_s", "upsert_s", "persist_s", "p95_ms", "peak_rss_mb")
+HIGHER_IS_BETTER = ("docs_per_s", "chunks_per_s", "mb_per_s")
+
+
+def _stage_totals(namespace: str) -> Dict[str, float]:
+    """Cumulative seconds per ingest stage so far (the difference across a run is that run's cost)."""
+    from app.rag.processor import embedding_seconds, ingest_stage_seconds
+
+    totals = {stage: ingest_stage_seconds.sum(namespace=namespace, stage=stage) for stage in ("split", "upsert")}
+    totals["embed"] = embedding_seconds.sum(kind="documents")
+    totals["persist"] = ingest_stage_seconds.sum(namespace=namespace, stage="persist")
+    totals["persist_calls"] = ingest_stage_seconds.count(namespace=namespace, stage="persist")
+    return totals
+
+
+def _chunk_count(namespace: str) -> int:
+    from app.rag.processor import DocumentProcessor
+
+    return int(DocumentProcessor(namespace).vectordb._collection.count())
+
+
+Outcome = Tuple[List[float], List[str]]  # per-document seconds of the ingested docs, error messages
+
+
+async def measure(
+    scenario: Dict[str, Any], namespace: str, size_bytes: int, run: Callable[[], Awaitable[Outcome]]
+) -> Dict[str, Any]:
+    """Awaits `run()` and turns its outcome, the stage histograms and RSS into a result row."""
+    chunks_before = _chunk_count(namespace)
+    before = _stage_totals(namespace)
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        latencies, errors = await run()
+        elapsed = time.perf_counter() - start
+    after = _stage_totals(namespace)
+    chunks = _chunk_count(namespace) - chunks_before
+    stage = {name: after[name] - before[name] for name in after}
+
+    ingested = len(latencies)
+    return {
+        **scenario,
+        "docs": ingested,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "chunks": chunks,
+        "elapsed_s": round(elapsed, 3),
+        # Stage seconds are summed over documents (and over workers when concurrency > 1)
+        "split_s": round(stage["split"], 3),
+        "embed_s": round(stage["embed"], 3),
+        "upsert_s": round(stage["upsert"], 3),  # includes embed_s
+        "upsert_write_s": round(stage["upsert"] - stage["embed"], 3),
+        "persist_s": round(stage["persist"], 3) if stage["persist_calls"] else None,  # Chroma >= 0.4 autopersists
+        "docs_per_s": round(ingested / elapsed, 3) if elapsed > 0 else 0.0,
+        "chunks_per_s": round(chunks / elapsed, 3) if elapsed > 0 else 0.0,
+        "mb_per_s": round(ingested * size_bytes / 1024**2 / elapsed, 3) if elapsed > 0 else 0.0,
+        **latency_summary(latencies),
+        "rss_start_mb": round(rss.start_mb, 1),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+    }
+
+
+def _processor_run(
+    corpus: Iterator[Tuple[str, str]], namespace: str, concurrency: int
+) -> Callable[[], Awaitable[Outcome]]:
+    from app.rag.processor import DocumentProcessor
+
+    processor = DocumentProcessor(namespace)
+
+    def ingest_one(item: Tuple[str, str]) -> Tuple[float, Optional[str]]:
+        doc_id, text = item
+        start = time.perf_counter()
+        try:
+            processor.ingest(doc_id, text, metadata={"namespace": namespace})
+        except Exception as e:
+            return time.perf_counter() - start, f"{doc_id}: {type(e).__name__}: {e}"
+        return time.perf_counter() - start, None
+
+    def ingest_all() -> Outcome:
+        latencies: List[float] = []
+        errors: List[str] = []
+
+        def collect(done: set) -> None:
+            for future in done:
+                seconds, error = future.result()
+                if error is None:
+                    latencies.append(seconds)
+                else:
+                    errors.append(error)
+
+        workers = max(1, concurrency)
+        pending: set[Future] = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for item in corpus:
+                # Submit lazily (unlike pool.map), so only ~2 documents per worker are in memory at once
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(ingest_one, item))
+            collect(wait(pending).done)
+        return latencies, errors
+
+    async def run() -> Outcome:
+        return await asyncio.to_thread(ingest_all)
+
+    return run
+
+
+async def _endpoint_ingest(
+    client: httpx.AsyncClient, corpus: Iterator[Tuple[str, str]], namespace: str, concurrency: int
+) -> Outcome:
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def worker() -> None:
+        for doc_id, text in corpus:  # a shared iterator: each document goes to exactly one worker
+            start = time.perf_counter()
+            response = await client.post(
+                "/rag/ingest/",
+                data={"namespace": namespace, "doc_id": doc_id},
+                files={"file": (f"{doc_id}.txt", text.encode("utf-8"), "text/plain")},
+            )
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(f"{doc_id}: HTTP {response.status_code}: {response.text[:200]}")
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return latencies, errors
+
+
+async def run_endpoint(scenarios: List[Dict[str, Any]], namespace: str, concurrency: int, seed: int) -> List[dict]:
+    from app.db.init_db import init_db
+    from app.main import create_app
+
+    await init_db()
+    results = []
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in scenarios:
+                corpus = synthetic_corpus(scenario["language"], scenario["n_docs"], scenario["size_bytes"], seed)
+
+                def run(corpus: Iterator[Tuple[str, str]] = corpus) -> Awaitable[Outcome]:
+                    return _endpoint_ingest(client, corpus, namespace, concurrency)
+
+                results.append(await measure(scenario, namespace, scenario["size_bytes"], run))
+                _echo(results[-1])
+    return results
+
+
+async def run_processor(scenarios: List[Dict[str, Any]], namespace: str, concurrency: int, seed: int) -> List[dict]:
+    results = []
+    for scenario in scenarios:
+        corpus = synthetic_corpus(scenario["language"], scenario["n_docs"], scenario["size_bytes"], seed)
+        run = _processor_run(corpus, namespace, concurrency)
+        results.append(await measure(scenario, namespace, scenario["size_bytes"], run))
+        _echo(results[-1])
+    return results
+
+
+def _echo(result: Dict[str, Any]) -> None:
+    click.echo(
+        f"{result['scenario']:<32} docs/s={result['docs_per_s']:<9} chunks/s={result['chunks_per_s']:<10} "
+        f"split={result['split_s']}s embed={result['embed_s']}s upsert={result['upsert_s']}s "
+        f"peak_rss={result['peak_rss_mb']}MB errors={result['errors']}",
+        err=True,
+    )
+
+
+def build_scenarios(target: str, languages: List[str], n_docs: int, doc_size: str) -> List[Dict[str, Any]]:
+    size_bytes = parse_size(doc_size)
+    return [
+        {
+            "scenario": f"{target}/{language}/{doc_size}/{n_docs}",
+            "target": target,
+            "language": language,
+            "n_docs": n_docs,
+            "size_bytes": size_bytes,
+        }
+        for language in languages
+    ]
+
+
+@click.command(help="Ingestion benchmark: split/embed/upsert/persist times, throughput and peak RSS.")
+@click.option("--target", type=click.Choice(["processor", "endpoint"]), default="processor", show_default=True)
+@click.option("--languages", default="en,he", show_default=True, help=f"Comma-separated, from {', '.join(LANGUAGES)}.")
+@click.option("--docs", "n_docs", default=100, show_default=True, help="Documents per scenario (10 to 100k).")
+@click.option("--doc-size", default="8KB", show_default=True, help="Size of each document (1KB to 100MB).")
+@click.option("--concurrency", default=1, show_default=True, help="Worker threads (processor) or in-flight requests.")
+@click.option("--namespace", default="theory", show_default=True, help="Chroma collection to ingest into.")
+@click.option("--embeddings", type=click.Choice(["fake", "cpu"]), default="fake", show_default=True)
+@click.option("--embed-ms", default=0.0, show_default=True, help="Per-call latency added to the fake embeddings.")
+@click.option("--seed", default=0, show_default=True)
+@click.option("--workdir", default=None, help="Scratch dir for the DB and Chroma (default: a temp dir).")
+@click.option("--out", "out_path", default="bench/ingest.json", show_default=True, help="JSON report path.")
+@click.option("--compare", "baseline_path", default=None, help="Baseline report; exit 1 on regression.")
+@click.option("--threshold", default=0.10, show_default=True, help="Allowed regression (fraction) in compare mode.")
+def main(
+    target: str,
+    languages: str,
+    n_docs: int,
+    doc_size: str,
+    concurrency: int,
+    namespace: str,
+    embeddings: str,
+    embed_ms: float,
+    seed: int,
+    workdir: Optional[str],
+    out_path: str,
+    baseline_path: Optional[str],
+    threshold: float,
+) -> None:
+    selected = [language.strip() for language in languages.split(",") if language.strip()]
+    unknown = [language for language in selected if language not in LANGUAGES]
+    if unknown:
+        raise click.BadParameter(f"Unknown language(s): {', '.join(unknown)}", param_hint="--languages")
+    scenarios = build_scenarios(target, selected, n_docs, doc_size)
+
+    prepare_environment(workdir or tempfile.mkdtemp(prefix="dfm-bench-"))
+    from benchmarks.fakes import (
+        FakeEmbeddings,
+        LatencyModel,
+        OnnxEmbeddings,
+        fake_providers,
+    )
+
+    embedder = OnnxEmbeddings() if embeddings == "cpu" else FakeEmbeddings(latency=LatencyModel(embed_ms, seed=seed))
+    with fake_providers(embeddings=embedder):
+        run = run_endpoint if target == "endpoint" else run_processor
+        results = asyncio.run(run(scenarios, namespace, concurrency, seed))
+
+    config = {
+        "target": target,
+        "languages": selected,
+        "docs": n_docs,
+        "doc_size": doc_size,
+        "concurrency": concurrency,
+        "namespace": namespace,
+        "embeddings": embeddings,
+        "embed_ms": embed_ms,
+        "seed": seed,
+    }
+    write_report(out_path, {"benchmark": "ingest", "meta": report_meta(config), "results": results})
+    click.echo(f"Report written to {os.path.abspath(out_path)}", err=True)
+
+    if baseline_path:
+        regressions = compare_results(
+            results,
+            load_report(baseline_path)["results"],
+            key="scenario",
+            threshold=threshold,
+            lower_is_better=LOWER_IS_BETTER,
+            higher_is_better=HIGHER_IS_BETTER,
+        )
+        for regression in regressions:
+            click.echo(f"REGRESSION {regression}", err=True)
+        if regressions:
+            sys.exit(1)
+        click.echo(f"No regression beyond {threshold:.0%} against {baseline_path}", err=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+# benchmarks/openai_mock.py
+"""
+Local OpenAI-compatible stand-in for load tests without network or API spend.
+
+Implements `POST /v1/chat/completions` (plain and `stream=true` SSE, with
+`stream_options.include_usage`), `POST /v1/embeddings` (float and base64
+encodings) and `GET /v1/models`. Point the app at it with
+
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=mock uvicorn app.main:app
+    python -m benchmarks.openai_mock --port 8090 --ttft-ms 400 --tokens-per-second 50 --rate-limit-rps 20
+
+Behaviour (latency distribution, token rate, error rate, 429 rate limit) can
+be scripted over time with `--script phases.json`, a list of
+`{"at_s": 30, "error_rate": 0.2, ...}` overrides applied once `at_s` seconds
+have passed, and changed at runtime with `POST /_mock/behaviour`.
+`GET /_mock/stats` counts responses by outcome.
+
+Cassettes: `--mode record` forwards every request to `--upstream` (the real
+API, using the caller's Authorization header) and appends the exchange to
+`--cassette` (JSON lines); `--mode replay` serves those recorded responses
+(with the scripted latency, errors and 429s applied), so a captured
+real-model session can be replayed offline.
+"""
+
+import asyncio
+import base64
+import dataclasses
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import click
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from benchmarks.fakes import FakeEmbeddings, LatencyModel, reply_tokens
+
+_STREAM_HEADERS = {"Cache-Control": "no-cache"}
+
+
+def estimate_tokens(text: str) -> int:
+    # Same estimate as app.core.usage, which cannot be imported here: the server runs without app settings
+    return len(text) // 4 + 1
+
+
+@dataclasses.dataclass
+class MockBehaviour:
+    ttft_ms: float = 300.0  # chat: delay before the first token
+    jitter_ms: float = 100.0
+    distribution: str = "lognormal"
+    tokens_per_second: float = 50.0  # chat: generation rate after the first token (0 = instant)
+    reply_tokens: int = 60
+    embed_ms: float = 50.0  # embeddings: delay per request
+    error_rate: float = 0.0  # fraction of requests answered with a 500
+    rate_limit_rps: float = 0.0  # token bucket refill rate; 0 = no rate limit
+    retry_after_s: float = 1.0  # Retry-After sent with 429s
+
+    def updated(self, overrides: Dict[str, Any]) -> "MockBehaviour":
+        known = {f.name for f in dataclasses.fields(self)}
+        unknown = set(overrides) - known - {"at_s"}
+        if unknown:
+            raise ValueError(f"Unknown behaviour field(s): {', '.join(sorted(unknown))}")
+        return dataclasses.replace(self, **{k: v for k, v in overrides.items() if k in known})
+
+
+class MockState:
+    """Current behaviour (base + elapsed script phases + runtime overrides), rate limiter and counters."""
+
+    def __init__(self, behaviour: MockBehaviour, script: Optional[List[Dict[str, Any]]] = None, seed: int = 0):
+        self.base = behaviour
+        self.script = sorted(script or [], key=lambda phase: phase.get("at_s", 0))
+        for phase in self.script:
+            behaviour.updated(phase)  # fail fast on typos
+        self.overrides: Dict[str, Any] = {}
+        self.started = time.monotonic()
+        self.stats: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._seed = seed
+        self._lock = threading.Lock()
+        self._tokens = float("inf")  # a full bucket: clamped to capacity on the first request
+        self._refilled = time.monotonic()
+
+    def behaviour(self) -> MockBehaviour:
+        elapsed = time.monotonic() - self.started
+        current = self.base
+        for phase in self.script:
+            if phase.get("at_s", 0) <= elapsed:
+                current = current.updated(phase)
+        return current.updated(self.overrides) if self.overrides else current
+
+    def latency(self, behaviour: MockBehaviour, mean_ms: float) -> float:
+        with self._lock:
+            seed = self._rng.randrange(2**32)
+        return LatencyModel(mean_ms, behaviour.jitter_ms, behaviour.distribution, seed=seed).sample()
+
+    def admit(self, behaviour: MockBehaviour) -> Optional[Response]:
+        """None to serve the request, or the injected 429/500 response."""
+        with self._lock:
+            if behaviour.rate_limit_rps > 0:
+                now = time.monotonic()
+                capacity = max(1.0, behaviour.rate_limit_rps)  # allow a one-second burst
+                self._tokens = min(capacity, self._tokens + (now - self._refilled) * behaviour.rate_limit_rps)
+                self._refilled = now
+                if self._tokens < 1:
+                    self.stats["rate_limited"] += 1
+                    return _error(
+                        429,
+                        "Rate limit reached for requests (mock)",
+                        "requests",
+                        "rate_limit_exceeded",
+                        headers={"Retry-After": f"{behaviour.retry_after_s:g}"},
+                    )
+                self._tokens -= 1
+            if behaviour.error_rate > 0 and self._rng.random() < behaviour.error_rate:
+                self.stats["server_error"] += 1
+                return _error(500, "The server had an error while processing your request (mock)", "server_error")
+        return None
+
+
+def _error(status: int, message: str, kind: str, code: Optional[str] = None, headers: Optional[dict] = None):
+    body = {"error": {"message": message, "type": kind, "param": None, "code": code}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+class Cassette:
+    """Recorded exchanges (JSON lines), keyed by endpoint plus the canonical request body."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def key(path: str, body: Dict[str, Any]) -> str:
+        return hashlib.sha256(f"{path}\0{json.dumps(body, sort_keys=True)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.entries[entry["key"]] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):  # content parts
+            content = " ".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+        parts.append(str(content))
+    return "\n".join(parts)
+
+
+def _sse(payload: Any) -> str:
+    return f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n"
+
+
+def create_mock_app(
+    state: MockState,
+    mode: str = "synthetic",
+    cassette: Optional[Cassette] = None,
+    upstream: Optional[str] = None,
+    upstream_transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> FastAPI:
+    """
+    mode: synthetic (generated replies), record (proxy to `upstream` and record)
+    or replay (from `cassette`). `upstream_transport` overrides the network
+    transport in record mode (tests record against another mock app).
+    """
+    if mode in ("record", "replay") and cassette is None:
+        raise ValueError(f"Mode '{mode}' needs a cassette")
+    app = FastAPI(title="OpenAI mock")
+    counter = {"n": 0}
+
+    def next_id() -> str:
+        counter["n"] += 1
+        return f"chatcmpl-mock-{counter['n']}"
+
+    async def record(request: Request, path: str, body: Dict[str, Any]) -> Response:
+        headers = {"Authorization": request.headers.get("Authorization", "")}
+        key = Cassette.key(path, body)
+        client = httpx.AsyncClient(
+            base_url=upstream or "https://api.openai.com/v1", timeout=120, transport=upstream_transport
+        )
+        if not body.get("stream"):
+            async with client:
+                upstream_response = await client.post(path, json=body, headers=headers)
+            if upstream_response.status_code == 200:
+                cassette.add({"key": key, "path": path, "status": 200, "body": upstream_response.json()})  # type: ignore[union-attr]
+            state.stats[f"recorded_{upstream_response.status_code}"] += 1
+            return Response(
+                upstream_response.content,
+                status_code=upstream_response.status_code,
+                media_type=upstream_response.headers.get("content-type"),
+            )
+
+        async def relay() -> AsyncIterator[str]:
+            events: List[str] = []
+            async with client, client.stream("POST", path, json=body, headers=headers) as upstream_response:
+                async for line in upstream_response.aiter_lines():
+                    if line.startswith("data: "):
+                        events.append(line[len("data: ") :])
+                        yield line + "\n\n"
+                if upstream_response.status_code == 200:
+                    cassette.add({"key": key, "path": path, "status": 200, "events": events})  # type: ignore[union-attr]
+            state.stats["recorded_stream"] += 1
+
+        return StreamingResponse(relay(), media_type="text/event-stream", headers=_STREAM_HEADERS)
+
+    async def replay(path: str, body: Dict[str, Any], behaviour: MockBehaviour) -> Response:
+        entry = cassette.get(Cassette.key(path, body))  # type: ignore[union-attr]
+        if entry is None:
+            state.stats["cassette_miss"] += 1
+            return _error(404, "No recorded response for this request in the cassette (mock)", "invalid_request_error")
+        state.stats["replayed"] += 1
+        delay = state.latency(behaviour, behaviour.ttft_ms if path.endswith("completions") else behaviour.embed_ms)
+        if "events" not in entry:
+            await asyncio.sleep(delay)
+            return JSONResponse(entry["body"])
+
+        async def events() -> AsyncIterator[str]:
+            await asyncio.sleep(delay)
+            for i, event in enumerate(entry["events"]):
+                if i and behaviour.tokens_per_second > 0 and event != "[DONE]":
+                    await asyncio.sleep(1 / behaviour.tokens_per_second)
+                yield _sse(event)
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers=_STREAM_HEADERS)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Response:
+        body = await request.json()
+        if mode == "record":
+            return await record(request, "/chat/completions", body)
+        behaviour = state.behaviour()
+        rejected = state.admit(behaviour)
+        if rejected is not None:
+            return rejected
+        if mode == "replay":
+            return await replay("/chat/completions", body, behaviour)
+
+        model = body.get("model", "mock-chat")
+        prompt = _prompt_text(body.get("messages") or [])
+        tokens = reply_tokens(prompt, int(body.get("max_tokens") or behaviour.reply_tokens))
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": len(tokens),
+            "total_tokens": estimate_tokens(prompt) + len(tokens),
+        }
+        token_delay = 1 / behaviour.tokens_per_second if behaviour.tokens_per_second > 0 else 0.0
+        ttft = state.latency(behaviour, behaviour.ttft_ms)
+        completion_id, created = next_id(), int(time.time())
+        state.stats["ok"] += 1
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + token_delay * max(0, len(tokens) - 1))
+            message = {"role": "assistant", "content": "".join(tokens).strip()}
+            return JSONResponse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": "stop", "logprobs": None}],
+                    "usage": usage,
+                }
+            )
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+            choice = {"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [choice],
+            }
+
+        async def stream() -> AsyncIterator[str]:
+            await asyncio.sleep(ttft)
+            yield _sse(chunk({"role": "assistant", "content": ""}))
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(token_delay)
+                yield _sse(chunk({"content": token}))
+            yield _sse(chunk({}, "stop"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                final = {**chunk({}), "choices": [], "usage": usage}
+                yield _sse(final)
+            yield _sse("[DONE]")
+
+        return StreamingResponse(stream(), media_type="text/event-stream", headers=_STREAM_HEADERS)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request) -> Response:
+        body = await request.json()
+        if mode == "record":
+            return await record(request, "/embeddings", body)
+        behaviour = state.behaviour()
+        rejected = state.admit(behaviour)
+        if rejected is not None:
+            return rejected
+        if mode == "replay":
+            return await replay("/embeddings", body, behaviour)
+
+        inputs = body.get("input")
+        if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        # Token arrays are embedded by their ids' text: still deterministic per input
+        texts = [item if isinstance(item, str) else " ".join(map(str, item)) for item in inputs or []]
+        embedder = FakeEmbeddings(dimensions=int(body.get("dimensions") or 1536))
+        await asyncio.sleep(state.latency(behaviour, behaviour.embed_ms))
+        data = []
+        for index, text in enumerate(texts):
+            vector = embedder.vector(text)
+            if body.get("encoding_format") == "base64":
+                encoded: Any = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            else:
+                encoded = vector
+            data.append({"object": "embedding", "index": index, "embedding": encoded})
+        state.stats["ok"] += 1
+        prompt_tokens = sum(estimate_tokens(text) for text in texts)
+        return JSONResponse(
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "mock-embedding"),
+                "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+            }
+        )
+
+    @app.get("/v1/models")
+    async def models() -> Dict[str, Any]:
+        names = ("gpt-4o", "gpt-4o-mini", "text-embedding-3-small", "text-embedding-ada-002")
+        return {"object": "list", "data": [{"id": n, "object": "model", "owned_by": "mock"} for n in names]}
+
+    @app.get("/_mock/stats")
+    async def stats() -> Dict[str, Any]:
+        return {
+            "mode": mode,
+            "uptime_s": round(time.monotonic() - state.started, 3),
+            "behaviour": dataclasses.asdict(state.behaviour()),
+            "responses": dict(state.stats),
+        }
+
+    @app.post("/_mock/behaviour")
+    async def set_behaviour(overrides: Dict[str, Any]) -> Response:
+        try:
+            state.base.updated(overrides)
+        except (TypeError, ValueError) as e:
+            return _error(400, str(e), "invalid_request_error")
+        state.overrides.update(overrides)
+        return JSONResponse(dataclasses.asdict(state.behaviour()))
+
+    return app
+
+
+@click.command(help="Run the local OpenAI-compatible mock server.")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8090, show_default=True)
+@click.option("--ttft-ms", default=300.0, show_default=True, help="Mean time to first token.")
+@click.option("--jitter-ms", default=100.0, show_default=True, help="Standard deviation of the delays.")
+@click.option(
+    "--distribution", type=click.Choice(["fixed", "normal", "lognormal"]), default="lognormal", show_default=True
+)
+@click.option("--tokens-per-second", default=50.0, show_default=True)
+@click.option("--reply-tokens", default=60, show_default=True)
+@click.option("--embed-ms", default=50.0, show_default=True, help="Mean embeddings request delay.")
+@click.option("--error-rate", default=0.0, show_default=True, help="Fraction of requests answered with 500.")
+@click.option("--rate-limit-rps", default=0.0, show_default=True, help="Requests/s before 429s (0 = unlimited).")
+@click.option("--retry-after-s", default=1.0, show_default=True, help="Retry-After sent with 429s.")
+@click.option("--script", "script_path", default=None, help="JSON list of timed behaviour overrides.")
+@click.option("--mode", type=click.Choice(["synthetic", "record", "replay"]), default="synthetic", show_default=True)
+@click.option("--cassette", "cassette_path", default=None, help="JSON-lines cassette for record/replay.")
+@click.option("--upstream", default="https://api.openai.com/v1", show_default=True, help="Real API for record mode.")
+@click.option("--seed", default=0, show_default=True)
+def main(
+    host: str,
+    port: int,
+    ttft_ms: float,
+    jitter_ms: float,
+    distribution: str,
+    tokens_per_second: float,
+    reply_tokens: int,
+    embed_ms: float,
+    error_rate: float,
+    rate_limit_rps: float,
+    retry_after_s: float,
+    script_path: Optional[str],
+    mode: str,
+    cassette_path: Optional[str],
+    upstream: str,
+    seed: int,
+) -> None:
+    import uvicorn
+
+    behaviour = MockBehaviour(
+        ttft_ms=ttft_ms,
+        jitter_ms=jitter_ms,
+        distribution=distribution,
+        tokens_per_second=tokens_per_second,
+        reply_tokens=reply_tokens,
+        embed_ms=embed_ms,
+        error_rate=error_rate,
+        rate_limit_rps=rate_limit_rps,
+        retry_after_s=retry_after_s,
+    )
+    script = None
+    if script_path:
+        with open(script_path, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    if mode != "synthetic" and not cassette_path:
+        raise click.BadParameter(f"--mode {mode} needs --cassette", param_hint="--cassette")
+    cassette = Cassette(cassette_path) if cassette_path else None
+    app = create_mock_app(MockState(behaviour, script, seed), mode, cassette, upstream)
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+# benchmarks/retrieval.py
+"""
+Offline retrieval quality-versus-latency evaluation.
+
+Builds the labelled corpus from `benchmarks.corpus` (one fact per document,
+one query per fact, across theory / personal_plan / session_data / future_me)
+into a fresh Chroma index per index setting (chunk size, embedding precision,
+HNSW parameters), then runs every query through each retrieval strategy at
+each k and reports recall@k and MRR next to latency percentiles and index size.
+
+Strategies:
+  vector    DocumentProcessor.query(k) in the query's namespace
+  adaptive  DocumentProcessor.query_adaptive (score-aware k, as in production)
+  combined  all four namespaces searched and merged by relevance score
+  mmr       maximal marginal relevance over 4k candidates
+  hybrid    vector and BM25 rankings fused with reciprocal rank fusion
+  rerank    4k vector candidates re-ordered by a re-ranker (--reranker)
+
+    python -m benchmarks.retrieval --k 1,3,5 --chunk-size 500,1000 --quantize none,int8
+    python -m benchmarks.retrieval --strategies vector,hybrid --hnsw 16:100:10,32:200:50
+"""
+
+import importlib
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+import warnings
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import click
+
+from benchmarks.common import (
+    compare_results,
+    latency_summary,
+    load_report,
+    prepare_environment,
+    report_meta,
+    write_report,
+)
+from benchmarks.corpus import (
+    RAG_NAMESPACES,
+    LabelledDocument,
+    LabelledQuery,
+    labelled_corpus,
+    parse_size,
+)
+
+STRATEGIES = ("vector", "adaptive", "combined", "mmr", "hybrid", "rerank")
+LOWER_IS_BETTER = ("p95_ms", "index_mb")
+HIGHER_IS_BETTER = ("recall_at_k", "mrr")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+Reranker = Callable[[str, List[Any]], List[float]]  # (query, documents) -> one score per document
+
+
+def _tokens(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def overlap_reranker(query: str, docs: List[Any]) -> List[float]:
+    """Baseline re-ranker: share of the query's distinct words found in each chunk."""
+    words = set(_tokens(query))
+    return [len(words & set(_tokens(doc.page_content))) / (len(words) or 1) for doc in docs]
+
+
+def load_reranker(path: str) -> Reranker:
+    """'overlap' or a "module:function" path to a (query, documents) -> scores callable."""
+    if path == "overlap":
+        return overlap_reranker
+    module_name, _, attr = path.partition(":")
+    try:
+        reranker = getattr(importlib.import_module(module_name), attr)
+    except (ImportError, AttributeError, ValueError) as e:
+        raise click.BadParameter(f"Could not load re-ranker '{path}': {e}", param_hint="--reranker")
+    if not callable(reranker):
+        raise click.BadParameter(f"Re-ranker '{path}' is not callable", param_hint="--reranker")
+    return reranker
+
+
+class BM25:
+    """Okapi BM25 over a fixed list of chunks (the lexical half of `hybrid`)."""
+
+    def __init__(self, docs: List[Any], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1, self.b = k1, b
+        self.frequencies = [Counter(_tokens(doc.page_content)) for doc in docs]
+        self.lengths = [sum(tf.values()) for tf in self.frequencies]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_frequency: Counter = Counter()
+        for tf in self.frequencies:
+            document_frequency.update(tf.keys())
+        n = len(docs)
+        self.idf = {word: math.log(1 + (n - df + 0.5) / (df + 0.5)) for word, df in document_frequency.items()}
+
+    def search(self, query: str, k: int) -> List[Any]:
+        words = [w for w in set(_tokens(query)) if w in self.idf]
+        scores = []
+        for i, tf in enumerate(self.frequencies):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_length or 1))
+            score = sum(self.idf[w] * tf[w] * (self.k1 + 1) / (tf[w] + norm) for w in words if w in tf)
+            if score > 0:
+                scores.append((score, i))
+        scores.sort(reverse=True)
+        return [self.docs[i] for _, i in scores[:k]]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Any]], k: int, constant: int = 60) -> List[Any]:
+    scores: Dict[str, float] = {}
+    by_id: Dict[str, Any] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1 / (constant + rank + 1)
+            by_id[doc.id] = doc
+    return [by_id[doc_id] for doc_id in sorted(scores, key=scores.__getitem__, reverse=True)[:k]]
+
+
+def quantize(vector: List[float], mode: str) -> List[float]:
+    """Round-trips a vector through float16 or symmetric per-vector int8, to measure the recall cost."""
+    if mode == "float16":
+        import numpy as np
+
+        return [float(v) for v in np.asarray(vector, dtype=np.float16)]
+    if mode == "int8":
+        scale = max((abs(v) for v in vector), default=0.0) / 127 or 1.0
+        return [round(v / scale) * scale for v in vector]
+    return vector
+
+
+_BYTES_PER_VALUE = {"none": 4, "float16": 2, "int8": 1}
+
+
+def _quantized(inner: Any, mode: str) -> Any:
+    from langchain_core.embeddings import Embeddings
+
+    class QuantizedEmbeddings(Embeddings):
+        model = f"{getattr(inner, 'model', 'unknown')}-{mode}"
+
+        def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            return [quantize(v, mode) for v in inner.embed_documents(texts)]
+
+        def embed_query(self, text: str) -> List[float]:
+            return quantize(inner.embed_query(text), mode)
+
+    return QuantizedEmbeddings() if mode != "none" else inner
+
+
+def parse_hnsw(spec: str) -> Optional[Dict[str, int]]:
+    """'default' or 'M:ef_construction:ef_search' -> Chroma HNSW configuration."""
+    if spec == "default":
+        return None
+    try:
+        max_neighbors, ef_construction, ef_search = (int(part) for part in spec.split(":"))
+    except ValueError:
+        raise click.BadParameter(f"Expected M:ef_construction:ef_search, got '{spec}'", param_hint="--hnsw")
+    return {"max_neighbors": max_neighbors, "ef_construction": ef_construction, "ef_search": ef_search}
+
+
+def _directory_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1024**2
+
+
+class Index:
+    """The labelled corpus ingested with one index setting: a DocumentProcessor per namespace."""
+
+    def __init__(
+        self,
+        documents: List[LabelledDocument],
+        directory: str,
+        embeddings: Any,
+        chunk_size: int,
+        quantization: str,
+        hnsw: str,
+    ):
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from langchain_chroma import Chroma
+
+        from app.rag.processor import DocumentProcessor
+        from benchmarks.fakes import fake_providers
+
+        self.name = f"chunk={chunk_size}/quant={quantization}/hnsw={hnsw}"
+        self.chunk_size, self.quantization, self.hnsw = chunk_size, quantization, hnsw
+        hnsw_config = parse_hnsw(hnsw)
+        start = time.perf_counter()
+        self.processors: Dict[str, Any] = {}
+        with fake_providers(embeddings=_quantized(embeddings, quantization)):
+            for namespace in RAG_NAMESPACES:
+                processor = DocumentProcessor(namespace)
+                processor.text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=chunk_size, chunk_overlap=chunk_size // 10
+                )
+                processor.vectordb = Chroma(
+                    collection_name=namespace,
+                    embedding_function=processor.embeddings,
+                    persist_directory=directory,
+                    collection_configuration={"hnsw": hnsw_config} if hnsw_config else None,
+                )
+                self.processors[namespace] = processor
+        for doc in documents:
+            self.processors[doc.namespace].ingest(doc.doc_id, doc.text, metadata={"namespace": doc.namespace})
+        self.build_s = time.perf_counter() - start
+        self.index_mb = _directory_mb(directory)
+
+        self.chunks: Dict[str, List[Any]] = {}
+        for namespace, processor in self.processors.items():
+            self.chunks[namespace] = processor.get_documents(where={"namespace": namespace})
+        self.n_chunks = sum(len(chunks) for chunks in self.chunks.values())
+        self.bm25 = {namespace: BM25(chunks) for namespace, chunks in self.chunks.items()}
+
+    def vector_mb(self, dimensions: int) -> float:
+        """Raw vector payload at this precision (Chroma itself always stores float32)."""
+        return self.n_chunks * dimensions * _BYTES_PER_VALUE[self.quantization] / 1024**2
+
+    def search(self, strategy: str, query: LabelledQuery, k: int, reranker: Reranker) -> List[Any]:
+        processor = self.processors[query.namespace]
+        fetch_k = max(4 * k, 20)
+        if strategy == "vector":
+            return processor.query(query.query, k=k)
+        if strategy == "adaptive":
+            return processor.query(query.query)
+        if strategy == "combined":
+            scored = [pair for p in self.processors.values() for pair in p.query_with_scores(query.query, k=k)]
+            return [doc for doc, _ in sorted(scored, key=lambda pair: pair[1], reverse=True)[:k]]
+        if strategy == "mmr":
+            return processor.vectordb.max_marginal_relevance_search(query.query, k=k, fetch_k=fetch_k)
+        if strategy == "hybrid":
+            vector = processor.query(query.query, k=fetch_k)
+            lexical = self.bm25[query.namespace].search(query.query, fetch_k)
+            return reciprocal_rank_fusion([vector, lexical], k)
+        if strategy == "rerank":
+            candidates = processor.query(query.query, k=fetch_k)
+            scores = reranker(query.query, candidates)
+            order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+            return [candidates[i] for i in order[:k]]
+        raise ValueError(f"Unknown strategy '{strategy}'")
+
+
+def evaluate(
+    index: Index, queries: Sequence[LabelledQuery], strategy: str, k: Optional[int], reranker: Reranker
+) -> Dict[str, Any]:
+    """Recall@k, MRR and latency of one strategy at one k (k=None: the strategy chooses, adaptive only)."""
+    from app.rag.processor import QueryCachingEmbeddings
+
+    QueryCachingEmbeddings._cache.clear()  # every pass starts cold, so latencies are comparable
+    hits, reciprocal_ranks, latencies, returned = 0, 0.0, [], 0
+    for query in queries:
+        start = time.perf_counter()
+        docs = index.search(strategy, query, k or 0, reranker)
+        latencies.append(time.perf_counter() - start)
+        returned += len(docs)
+        doc_ids = [doc.metadata.get("doc_id") for doc in docs]
+        if query.relevant_doc_id in doc_ids:
+            hits += 1
+            reciprocal_ranks += 1 / (doc_ids.index(query.relevant_doc_id) + 1)
+    n = len(queries) or 1
+    k_label = k if k is not None else "adaptive"
+    return {
+        "run": f"{index.name}/{strategy}/k={k_label}",
+        "index": index.name,
+        "chunk_size": index.chunk_size,
+        "quantization": index.quantization,
+        "hnsw": index.hnsw,
+        "strategy": strategy,
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": round(hits / n, 4),
+        "mrr": round(reciprocal_ranks / n, 4),
+        "avg_results": round(returned / n, 2),
+        **latency_summary(latencies),
+        "chunks": index.n_chunks,
+        "index_mb": round(index.index_mb, 3),
+        "build_s": round(index.build_s, 3),
+    }
+
+
+def run_evaluation(
+    documents: List[LabelledDocument],
+    queries: List[LabelledQuery],
+    workdir: str,
+    embeddings: Any,
+    dimensions: int,
+    ks: Sequence[int],
+    chunk_sizes: Sequence[int],
+    quantizations: Sequence[str],
+    hnsw_specs: Sequence[str],
+    strategies: Sequence[str],
+    reranker: Reranker = overlap_reranker,
+) -> List[Dict[str, Any]]:
+    # Chroma's default L2 distance can map to scores slightly outside [0, 1]; LangChain warns on every query
+    warnings.filterwarnings("ignore", message="Relevance scores must be between 0 and 1")
+    results = []
+    for i, (chunk_size, quantization, hnsw) in enumerate(
+        (c, q, h) for c in chunk_sizes for q in quantizations for h in hnsw_specs
+    ):
+        index = Index(documents, os.path.join(workdir, f"index-{i}"), embeddings, chunk_size, quantization, hnsw)
+        click.echo(f"{index.name}: {index.n_chunks} chunks, {index.index_mb:.1f} MB, {index.build_s:.1f}s", err=True)
+        for strategy in strategies:
+            for k in [None] if strategy == "adaptive" else ks:
+                result = evaluate(index, queries, strategy, k, reranker)
+                result["vector_mb"] = round(index.vector_mb(dimensions), 3)
+                click.echo(
+                    f"  {strategy:<9} k={str(k if k is not None else '~'):<3} recall={result['recall_at_k']:<6} "
+                    f"mrr={result['mrr']:<6} p50={result['p50_ms']}ms p95={result['p95_ms']}ms",
+                    err=True,
+                )
+                results.append(result)
+    return results
+
+
+def _split(value: str) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()]
+
+
+@click.command(help="Retrieval recall/MRR versus latency and index size across retrieval settings.")
+@click.option("--docs-per-namespace", default=50, show_default=True, help="Labelled documents per namespace (max 100).")
+@click.option("--doc-size", default="2KB", show_default=True, help="Filler text per document.")
+@click.option("--k", "ks", default="1,3,5,10", show_default=True, help="Comma-separated k values.")
+@click.option("--chunk-size", "chunk_sizes", default="500,1000", show_default=True, help="Comma-separated.")
+@click.option("--strategies", default=",".join(STRATEGIES), show_default=True, help="Comma-separated.")
+@click.option("--quantize", "quantizations", default="none", show_default=True, help="none, float16, int8.")
+@click.option(
+    "--hnsw",
+    "hnsw_specs",
+    default="default",
+    show_default=True,
+    help="'default' or M:ef_construction:ef_search, comma-separated.",
+)
+@click.option("--reranker", default="overlap", show_default=True, help="'overlap' or module:function.")
+@click.option("--embeddings", type=click.Choice(["fake", "cpu"]), default="fake", show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@click.option("--workdir", default=None, help="Scratch dir for the indexes (default: a temp dir).")
+@click.option("--out", "out_path", default="bench/retrieval.json", show_default=True, help="JSON report path.")
+@click.option("--compare", "baseline_path", default=None, help="Baseline report; exit 1 on regression.")
+@click.option("--threshold", default=0.05, show_default=True, help="Allowed regression (fraction) in compare mode.")
+def main(
+    docs_per_namespace: int,
+    doc_size: str,
+    ks: str,
+    chunk_sizes: str,
+    strategies: str,
+    quantizations: str,
+    hnsw_specs: str,
+    reranker: str,
+    embeddings: str,
+    seed: int,
+    workdir: Optional[str],
+    out_path: str,
+    baseline_path: Optional[str],
+    threshold: float,
+) -> None:
+    selected = _split(strategies)
+    unknown = [s for s in selected if s not in STRATEGIES]
+    if unknown:
+        raise click.BadParameter(f"Unknown strategies: {', '.join(unknown)}", param_hint="--strategies")
+    modes = _split(quantizations)
+    if any(mode not in _BYTES_PER_VALUE for mode in modes):
+        raise click.BadParameter("Expected none, float16 or int8", param_hint="--quantize")
+    hnsw = _split(hnsw_specs)
+    for spec in hnsw:
+        parse_hnsw(spec)
+    rerank = load_reranker(reranker)
+
+    workdir = workdir or tempfile.mkdtemp(prefix="dfm-eval-")
+    prepare_environment(workdir)
+    from benchmarks.fakes import FakeEmbeddings, OnnxEmbeddings
+
+    embedder: Any = OnnxEmbeddings() if embeddings == "cpu" else FakeEmbeddings()
+    dimensions = len(embedder.embed_query("dimensions"))
+    documents, queries = labelled_corpus(docs_per_namespace, parse_size(doc_size), seed)
+    results = run_evaluation(
+        documents,
+        queries,
+        workdir,
+        embedder,
+        dimensions,
+        ks=[int(k) for k in _split(ks)],
+        chunk_sizes=[int(c) for c in _split(chunk_sizes)],
+        quantizations=modes,
+        hnsw_specs=hnsw,
+        strategies=selected,
+        reranker=rerank,
+    )
+
+    config = {
+        "docs_per_namespace": docs_per_namespace,
+        "doc_size": doc_size,
+        "queries": len(queries),
+        "k": ks,
+        "chunk_sizes": chunk_sizes,
+        "strategies": selected,
+        "quantize": modes,
+        "hnsw": hnsw,
+        "reranker": reranker,
+        "embeddings": embeddings,
+        "dimensions": dimensions,
+        "seed": seed,
+    }
+    write_report(out_path, {"benchmark": "retrieval", "meta": report_meta(config), "results": results})
+    click.echo(f"Report written to {os.path.abspath(out_path)}", err=True)
+
+    if baseline_path:
+        regressions = compare_results(
+            results,
+            load_report(baseline_path)["results"],
+            key="run",
+            threshold=threshold,
+            lower_is_better=LOWER_IS_BETTER,
+            higher_is_better=HIGHER_IS_BETTER,
+        )
+        for regression in regressions:
+            click.echo(f"REGRESSION {regression}", err=True)
+        if regressions:
+            sys.exit(1)
+        click.echo(f"No regression beyond {threshold:.0%} against {baseline_path}", err=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -42,6 +42,7 @@ echo
 # ——————————————————————————————————————————
 for ns in "${DEMO_NS[@]}"; do
   rm -rf "${CHROMA_DB_PATH}/${ns:?}"* 2>/dev/null || true # Consistently use CHROMA_DB_PATH and ensure ns is set
+  rm -f "data/ingest_manifests/${ns}.jsonl" # resume checkpoints of `rag ingest` no longer match the store
 done
 echo "🧹  Cleared old demo collections."
 
@@ -68,4 +69,18 @@ curl -sS -X POST "$DFM_API_URL/rag/ingest/" \
   -F namespace=future_me     -F doc_id=future_demo  \
   -F file=@demo_data/future_me_profile.txt && echo
 
+# ——————————————————————————————————————————
+# 3. Optional: bulk corpus, one subdirectory per namespace
+#    (CORPUS_DIR/theory, CORPUS_DIR/future_me, ...), uploaded in parallel.
+#    Interrupted? Re-run `python -m app.cli rag ingest ...` alone to resume.
+# ——————————————————————————————————————————
+if [ -n "${CORPUS_DIR:-}" ]; then
+  for ns in "${DEMO_NS[@]}"; do
+    if [ -d "$CORPUS_DIR/$ns" ]; then
+      python -m app.cli rag ingest --namespace "$ns" --source-dir "$CORPUS_DIR/$ns" \
+        --url "$DFM_API_URL" --concurrency "${INGEST_CONCURRENCY:-16}"
+    fi
+  done
+fi
+
 echo "✅  Demo documents ingested cleanly."
@@ -1,7 +1,9 @@
 # streamlit_app.py
 import os
 import sys
+import uuid
 
+import httpx
 import streamlit as st
 
 # Add project root to sys.path to allow 'from app...' imports
@@ -13,7 +15,7 @@ if PROJECT_ROOT not in sys.path:
 
 # Now that sys.path is configured, we can import from 'app'
 try:
-    from app.clients.api_client import SyncAPI  # Using the synchronous client
+    from app.clients.api_client import APIError, SyncAPI  # Using the synchronous client
     from app.core.settings import Settings, get_settings
 except ImportError as e:
     st.error(
@@ -30,6 +32,32 @@ except Exception as e:
     st.stop()
 
 API_BASE_URL = os.getenv("DFM_API_URL", "http://localhost:8000")
+HISTORY_WINDOW = cfg.STREAMLIT_HISTORY_WINDOW  # messages rendered per rerun, and per "load earlier" step
+
+
+@st.cache_resource
+def shared_http_client() -> httpx.Client:
+    """One connection pool for the whole Streamlit process; each session's SyncAPI sends its own token."""
+    return httpx.Client(
+        base_url=API_BASE_URL,
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+
+
+def start_new_conversation() -> None:
+    st.session_state.chat_session_id = uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.chat_session_id
+    reset_history()
+
+
+def reset_history() -> None:
+    """Forgets the locally held messages; the current conversation is fetched again from the API."""
+    st.session_state.messages = []
+    st.session_state.history_window = HISTORY_WINDOW
+    st.session_state.history_before = None  # cursor of the next older page on the server
+    st.session_state.history_loaded = False
+
 
 # --- Language Strings (similar to cli.py, but for Streamlit UI elements) ---
 UI_STRINGS_STREAMLIT = {
@@ -56,6 +84,8 @@ UI_STRINGS_STREAMLIT = {
         "api_connection_error": "Could not connect to the API server. Please ensure it's running.",
         "chat_error": "Error getting response from AI.",
         "help_link_text": "Help / Readme",
+        "load_earlier_button": "Load earlier messages",
+        "history_error": "Could not load earlier messages.",
     },
     "he": {
         "page_title": "אני מהעתיד - צ'אט",
@@ -80,6 +110,8 @@ UI_STRINGS_STREAMLIT = {
         "api_connection_error": "לא ניתן להתחבר לשרת ה-API. אנא ודא/י שהוא פועל.",
         "chat_error": "שגיאה בקבלת תגובה מהבינה המלאכותית.",
         "help_link_text": "עזרה / קרא אותי",
+        "load_earlier_button": "טען הודעות קודמות",
+        "history_error": "לא ניתן היה לטעון הודעות קודמות.",
     },
 }
 
@@ -89,12 +121,18 @@ if "auth_token" not in st.session_state:
 if "user_email" not in st.session_state:
     st.session_state.user_email = None
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    reset_history()
+if "chat_session_id" not in st.session_state:
+    # Kept in the URL, so a reloaded page (after logging in again) resumes the same conversation
+    st.session_state.chat_session_id = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.chat_session_id
+if "streaming_supported" not in st.session_state:
+    st.session_state.streaming_supported = True  # set to False once the API answers /chat/stream with 404
 if "current_language" not in st.session_state:
     st.session_state.current_language = cfg.APP_DEFAULT_LANGUAGE
 if "api_client" not in st.session_state:
     try:
-        st.session_state.api_client = SyncAPI(API_BASE_URL)
+        st.session_state.api_client = SyncAPI(API_BASE_URL, client=shared_http_client())
     except Exception as e:
         st.error(f"Failed to initialize API client: {e}")
         st.stop()
@@ -213,7 +251,7 @@ with st.sidebar:
                     st.session_state.auth_token = api.token  # Store the token
                     st.session_state.user_email = email_input
                     # api._token is managed internally by SyncAPI after login
-                    st.session_state.messages = []  # Clear messages on new login
+                    reset_history()  # Clear messages on new login; the conversation is reloaded for this user
                     st.rerun()
                 except Exception as e:
                     st.error(f"{STR['auth_error_login']} {e}")
@@ -234,10 +272,8 @@ with st.sidebar:
         if st.button(STR["logout_button"], key="logout_btn_streamlit", use_container_width=True):
             st.session_state.auth_token = None
             st.session_state.user_email = None
-            api.token = None  # Explicitly clear token in shared API client instance
-            if "Authorization" in api.client.headers:  # Also clear header from httpx client
-                del api.client.headers["Authorization"]
-            st.session_state.messages = []
+            api.token = None  # Only this session's client: the HTTP pool is shared and carries no token
+            start_new_conversation()
             st.rerun()
 
     st.sidebar.markdown("---")  # Separator
@@ -257,8 +293,35 @@ if cfg.STREAMLIT_DEBUG:
 # if st.session_state.auth_token:
 if cfg.SKIP_AUTH or st.session_state.auth_token:
     # Show chat interface if auth is skipped OR if a real auth token exists
-    # Display chat messages from history
-    for message in st.session_state.messages:
+    # Only the last history_window messages are rendered; older ones are behind "load earlier"
+    if not st.session_state.history_loaded:
+        try:
+            page = api.history(st.session_state.chat_session_id, limit=HISTORY_WINDOW)
+            st.session_state.messages = [{"role": m["role"], "content": m["content"]} for m in page["messages"]]
+            st.session_state.history_before = page["next_before"]
+        except Exception as e:  # An API without /chat/history: start from an empty conversation
+            if cfg.STREAMLIT_DEBUG:
+                st.caption(f"DEBUG: history not loaded: {e}")
+        st.session_state.history_loaded = True
+
+    messages = st.session_state.messages
+    hidden = len(messages) - st.session_state.history_window
+    if hidden > 0 or st.session_state.history_before is not None:
+        if st.button(STR["load_earlier_button"], key="load_earlier_btn_streamlit"):
+            if hidden < HISTORY_WINDOW and st.session_state.history_before is not None:
+                try:
+                    page = api.history(
+                        st.session_state.chat_session_id, before=st.session_state.history_before, limit=HISTORY_WINDOW
+                    )
+                    older = [{"role": m["role"], "content": m["content"]} for m in page["messages"]]
+                    st.session_state.messages = older + messages
+                    st.session_state.history_before = page["next_before"]
+                except Exception as e:
+                    st.error(f"{STR['history_error']} {e}")
+            st.session_state.history_window += HISTORY_WINDOW
+            st.rerun()
+
+    for message in messages[-st.session_state.history_window :]:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
@@ -270,22 +333,29 @@ if cfg.SKIP_AUTH or st.session_state.auth_token:
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Get assistant response
+        # Get assistant response, rendered token by token as it streams in
         with st.chat_message("assistant"):
-            message_placeholder = st.empty()
+            session_id = st.session_state.chat_session_id
             try:
-                # Call the API and get the ChatResponse object
-                assistant_response_obj = api.chat(prompt)
-                # Extract the actual reply string from the object
-                assistant_reply_string = assistant_response_obj.reply
-                # Display only the string content using markdown
-                message_placeholder.markdown(assistant_reply_string)
+                assistant_reply_string = None
+                if st.session_state.streaming_supported:
+                    try:
+                        assistant_reply_string = str(st.write_stream(api.chat_stream(prompt, session_id=session_id)))
+                    except APIError as e:
+                        if e.status_code not in (404, 405):
+                            raise
+                        st.session_state.streaming_supported = False  # older API: use the blocking endpoint
+                if assistant_reply_string is None:
+                    assistant_reply_string = api.chat(prompt, session_id=session_id).reply
+                    st.markdown(assistant_reply_string)
                 # Store the string content in session state for history
                 st.session_state.messages.append({"role": "assistant", "content": assistant_reply_string})
             except Exception as e:
+                if isinstance(e, APIError) and e.status_code == 403:
+                    start_new_conversation()  # e.g. a shared ?session= link: that conversation is not ours
                 st.error(f"{STR['chat_error']}: {e}")
                 assistant_response = f"Sorry, I encountered an error: {e}"  # Provide error to user
-                message_placeholder.markdown(assistant_response)
+                st.markdown(assistant_response)
                 st.session_state.messages.append({"role": "assistant", "content": assistant_response})
     if cfg.STREAMLIT_DEBUG:
         st.write("DEBUG: Chat UI should be visible.")  # Add this to confirm this block is entered
@@ -0,0 +1,72 @@
+# tests/test_admin.py
+import os
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.memory_diagnostics import module_of
+from app.core.settings import get_settings
+
+_kept_alive = []
+
+
+def _leak(n: int) -> None:
+    _kept_alive.extend(bytearray(1024) for _ in range(n))
+
+
+def test_module_of_uses_the_most_specific_path_entry():
+    roots = sorted(["/srv/app", "/usr/lib/python3.11", "/usr/lib/python3.11/site-packages"], key=len, reverse=True)
+    assert module_of("/srv/app/app/rag/processor.py", roots) == "app.rag.processor"
+    assert module_of("/usr/lib/python3.11/site-packages/chromadb/__init__.py", roots) == "chromadb"
+    assert module_of("/usr/lib/python3.11/json/decoder.py", roots) == "json.decoder"
+    assert module_of("<string>", roots) == "<string>"
+
+
+@pytest.fixture
+def admin_client(monkeypatch):
+    from app.main import create_app
+
+    monkeypatch.setattr(get_settings(), "SKIP_AUTH", True)
+    client = TestClient(create_app())
+    yield client
+    client.post("/admin/memory/tracemalloc/stop")
+
+
+def test_tracemalloc_snapshots_diff_by_module(admin_client):
+    assert admin_client.get("/admin/memory/top").status_code == 409  # not tracing yet
+
+    started = admin_client.post("/admin/memory/tracemalloc/start", params={"frames": 1}).json()
+    assert started["tracing"] is True and started["traceback_frames"] == 1
+    base = admin_client.post("/admin/memory/snapshots").json()["id"]
+    _leak(2000)  # ~2 MB held by this module
+    after = admin_client.post("/admin/memory/snapshots").json()["id"]
+
+    diff = admin_client.get("/admin/memory/diff", params={"base": base, "compare": after}).json()
+    top = diff["rows"][0]
+    assert top["site"].endswith("test_admin") and top["size_diff_kb"] > 1500
+    by_line = admin_client.get("/admin/memory/diff", params={"base": base, "group_by": "line"}).json()
+    assert any(row["site"].startswith(os.path.abspath(__file__)) for row in by_line["rows"][:3])
+    assert admin_client.get("/admin/memory/top", params={"group_by": "package", "limit": 5}).json()["rows"]
+    assert admin_client.get("/admin/memory/diff", params={"base": 999}).status_code == 404
+
+    status = admin_client.get("/admin/memory").json()
+    assert status["tracemalloc"]["traced_mb"] > 1 and len(status["tracemalloc"]["snapshots"]) == 2
+    assert status["process"]["rss_mb"] > 0
+    assert "max" in status["caches"]["query_embedding_cache"] and "db_pool" in status["caches"]
+
+    assert admin_client.post("/admin/memory/tracemalloc/stop").json()["tracing"] is False
+    _kept_alive.clear()
+
+
+@pytest.mark.demo_mode(False)
+def test_memory_endpoints_are_for_superusers_only(client: TestClient):
+    with client:
+        assert client.get("/admin/memory").status_code == 401
+        email = f"admin_test_{uuid.uuid4().hex[:8]}@example.com"
+        client.post("/auth/register", json={"email": email, "password": "testpassword"})
+        token = client.post("/auth/login", data={"username": email, "password": "testpassword"}).json()["access_token"]
+        response = client.get("/admin/memory", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 403
+        response = client.get("/usage/summary", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 403  # per-user costs of everyone
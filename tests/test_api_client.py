@@ -0,0 +1,116 @@
+# tests/test_api_client.py
+import base64
+import importlib.util
+import json
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+from app.clients.api_client import APIError, AsyncAPI, retry_after_seconds
+
+
+def _jwt(exp: float) -> str:
+    def part(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+    return f"{part({'alg': 'HS256'})}.{part({'sub': 'u', 'exp': exp})}.signature"
+
+
+class _Server:
+    """Scripted responses for /chat/text and /chat/stream; counts logins and remembers the tokens it saw."""
+
+    def __init__(self, chat_statuses=(), token_ttl=3600.0):
+        self.chat_statuses = list(chat_statuses)
+        self.token_ttl = token_ttl
+        self.logins = 0
+        self.seen_tokens = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/auth/login":
+            self.logins += 1
+            return httpx.Response(
+                200, json={"access_token": _jwt(time.time() + self.token_ttl), "token_type": "bearer"}
+            )
+        self.seen_tokens.append(request.headers.get("authorization"))
+        if self.chat_statuses:
+            status, headers = self.chat_statuses.pop(0)
+            return httpx.Response(status, headers=headers, json={"detail": "busy"})
+        if request.url.path == "/chat/stream":
+            lines = [
+                json.dumps({"delta": "Hello"}),
+                json.dumps({"delta": " there"}),
+                json.dumps({"reply": "Hello there"}),
+            ]
+            return httpx.Response(200, content="\n".join(lines) + "\n")
+        return httpx.Response(200, json={"reply": "hi", "session_id": json.loads(request.content)["session_id"]})
+
+
+def _api(server: _Server, **kwargs) -> AsyncAPI:
+    return AsyncAPI("http://api", transport=httpx.MockTransport(server), backoff_base=0.001, **kwargs)
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert retry_after_seconds("2.5") == 2.5
+    assert 28 < retry_after_seconds(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert retry_after_seconds(None) is None and retry_after_seconds("soon") is None
+
+
+@pytest.mark.asyncio
+async def test_retries_overloaded_responses_then_gives_up():
+    server = _Server(chat_statuses=[(429, {"Retry-After": "0"}), (503, {})])
+    async with _api(server) as api:
+        await api.login("a@example.com", "pw")
+        assert await api.chat("hello", session_id="s1") == "hi"
+        assert len(server.seen_tokens) == 3
+
+    server = _Server(chat_statuses=[(504, {})] * 3)
+    async with _api(server, max_retries=2) as api:
+        await api.login("a@example.com", "pw")
+        with pytest.raises(APIError) as excinfo:
+            await api.chat("hello")
+        assert excinfo.value.status_code == 504 and len(server.seen_tokens) == 3
+
+
+@pytest.mark.asyncio
+async def test_relogs_in_once_after_401_and_before_the_token_expires():
+    server = _Server(chat_statuses=[(401, {})])
+    async with _api(server) as api:
+        await api.login("a@example.com", "pw")
+        assert await api.chat("hello") == "hi"
+        assert server.logins == 2 and server.seen_tokens[0] != server.seen_tokens[1]
+
+    server = _Server(token_ttl=10)  # inside the refresh margin: every call logs in again first
+    async with _api(server, refresh_margin=60) as api:
+        await api.login("a@example.com", "pw")
+        await api.chat("hello")
+        assert server.logins == 2
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_yields_deltas_and_raises_stream_errors():
+    server = _Server(chat_statuses=[(503, {"Retry-After": "0"})])
+    async with _api(server) as api:
+        await api.login("a@example.com", "pw")
+        assert [chunk async for chunk in api.chat_stream("hello")] == ["Hello", " there"]
+
+    def failing(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=json.dumps({"delta": "Hel"}) + "\n" + json.dumps({"error": "upstream"}))
+
+    async with AsyncAPI("http://api", transport=httpx.MockTransport(failing)) as api:
+        chunks = []
+        with pytest.raises(APIError, match="upstream"):
+            async for chunk in api.chat_stream("hello"):
+                chunks.append(chunk)
+        assert chunks == ["Hel"]
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_limits_and_optional_http2():
+    async with AsyncAPI("http://api", max_connections=7, max_keepalive_connections=3) as api:
+        pool = api._client._transport._pool
+        assert pool._max_connections == 7 and pool._max_keepalive_connections == 3
+    if importlib.util.find_spec("h2") is None:
+        with pytest.raises(APIError, match="httpx\\[http2\\]"):
+            AsyncAPI("http://api", http2=True)
@@ -0,0 +1,256 @@
+# tests/test_benchmarks.py
+import dataclasses
+import time
+
+import httpx
+import pytest
+from langchain_core.documents import Document
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from app.core.settings import get_settings
+from app.rag.processor import DocumentProcessor
+from benchmarks.chat import HIGHER_IS_BETTER, LOWER_IS_BETTER, run_in_process
+from benchmarks.common import compare_results, latency_summary, percentile
+from benchmarks.corpus import (
+    labelled_corpus,
+    parse_size,
+    synthetic_corpus,
+    synthetic_document,
+)
+from benchmarks.fakes import FakeChatModel, FakeEmbeddings, LatencyModel, fake_providers
+from benchmarks.ingest import build_scenarios, run_processor
+from benchmarks.openai_mock import Cassette, MockBehaviour, MockState, create_mock_app
+from benchmarks.retrieval import BM25, quantize, reciprocal_rank_fusion, run_evaluation
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) is None
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile(list(range(101)), 95) == 95
+    assert latency_summary([0.1, 0.2])["p50_ms"] == pytest.approx(150.0)
+
+
+def test_compare_results_flags_regressions_past_threshold():
+    baseline = [{"concurrency": 1, "p95_ms": 100.0, "throughput_rps": 10.0, "error_rate": 0.0}]
+    within = [{"concurrency": 1, "p95_ms": 109.0, "throughput_rps": 9.5, "error_rate": 0.0}]
+    worse = [
+        {"concurrency": 1, "p95_ms": 130.0, "throughput_rps": 8.0, "error_rate": 0.5},
+        {"concurrency": 64, "p95_ms": 999.0},  # not in the baseline: skipped
+    ]
+
+    kwargs = dict(key="concurrency", lower_is_better=LOWER_IS_BETTER, higher_is_better=HIGHER_IS_BETTER)
+    assert compare_results(within, baseline, threshold=0.1, **kwargs) == []
+    regressions = compare_results(worse, baseline, threshold=0.1, **kwargs)
+    assert len(regressions) == 3
+    assert any("p95_ms" in r for r in regressions)
+    assert any("throughput_rps" in r for r in regressions)
+    assert any("error_rate" in r for r in regressions)
+
+
+def test_fakes_are_deterministic():
+    a, b = LatencyModel(100, 30, seed=7), LatencyModel(100, 30, seed=7)
+    assert [a.sample() for _ in range(5)] == [b.sample() for _ in range(5)]
+    assert LatencyModel(100, 30, "fixed").sample() == 0.1
+
+    embeddings = FakeEmbeddings(dimensions=64)
+    near = embeddings.vector("my plan for a calm morning walk")
+    far = embeddings.vector("quarterly tax filing deadline")
+    query = embeddings.vector("a calm walk in the morning")
+    assert sum(x * y for x, y in zip(query, near)) > sum(x * y for x, y in zip(query, far))
+
+    llm = FakeChatModel(reply_tokens=5)
+    assert llm.invoke("hello").content == llm.invoke("hello").content
+    assert len(llm.invoke("hello").content.split()) == 5
+    assert "".join(chunk.content for chunk in llm.stream("hello")).strip() == llm.invoke("hello").content
+
+
+@pytest.mark.asyncio
+async def test_chat_benchmark_runs_app_with_fake_providers(monkeypatch):
+    monkeypatch.setenv("SKIP_AUTH", "true")
+    get_settings.cache_clear()
+    results = await run_in_process(
+        levels=[1, 3],
+        requests=6,
+        sessions=2,
+        llm=FakeChatModel(reply_tokens=3),
+        embeddings=FakeEmbeddings(dimensions=32),
+        create_tables=False,
+    )
+    get_settings.cache_clear()  # next caller re-reads the env without SKIP_AUTH
+
+    assert [r["concurrency"] for r in results] == [1, 3]
+    for result in results:
+        assert result["errors"] == 0
+        assert result["throughput_rps"] > 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+
+
+def test_synthetic_corpus_sizes_and_languages():
+    assert parse_size("1KB") == 1024
+    assert parse_size("2.5mb") == int(2.5 * 1024**2)
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+    english = synthetic_document("en", 4096, seed=1, index=0)
+    hebrew = synthetic_document("he", 4096, seed=1, index=0)
+    assert 4000 < len(english.encode("utf-8")) <= 4096
+    assert 4000 < len(hebrew.encode("utf-8")) <= 4096
+    assert any("\u0590" <= ch <= "\u05ff" for ch in hebrew)
+    assert "\n\n" in english
+    assert english == synthetic_document("en", 4096, seed=1, index=0)
+    assert english != synthetic_document("en", 4096, seed=1, index=1)
+    assert [doc_id for doc_id, _ in synthetic_corpus("he", 3, 100)] == ["bench-he-0-0", "bench-he-0-1", "bench-he-0-2"]
+
+
+@pytest.mark.asyncio
+async def test_ingest_benchmark_reports_stages_and_throughput():
+    scenarios = build_scenarios("processor", ["en", "he"], n_docs=4, doc_size="3KB")
+    with fake_providers(embeddings=FakeEmbeddings(dimensions=16)):
+        # Chunk counts are measured as collection growth, so start from an empty collection
+        DocumentProcessor("bench_ingest_test").delete_documents(where={"namespace": "bench_ingest_test"})
+        results = await run_processor(scenarios, namespace="bench_ingest_test", concurrency=2, seed=3)
+
+    assert [r["scenario"] for r in results] == ["processor/en/3KB/4", "processor/he/3KB/4"]
+    for result in results:
+        assert result["docs"] == 4 and result["errors"] == 0
+        assert result["chunks"] >= 4
+        assert result["upsert_s"] >= result["embed_s"] > 0
+        assert result["docs_per_s"] > 0 and result["peak_rss_mb"] > 0
+
+
+def test_labelled_corpus_has_one_answer_per_query():
+    documents, queries = labelled_corpus(docs_per_namespace=5, size_bytes=512, seed=2)
+    assert len(documents) == len(queries) == 20
+    assert {d.namespace for d in documents} == {"theory", "personal_plan", "session_data", "future_me"}
+    assert len({q.query for q in queries}) == 20
+    by_id = {d.doc_id: d for d in documents}
+    assert all(by_id[q.relevant_doc_id].namespace == q.namespace for q in queries)
+
+
+def test_retrieval_building_blocks():
+    docs = [Document(id=str(i), page_content=text) for i, text in enumerate(["calm walk", "tax form", "walk the dog"])]
+    assert [d.id for d in BM25(docs).search("a calm walk", k=2)] == ["0", "2"]
+    fused = reciprocal_rank_fusion([[docs[1], docs[0]], [docs[0], docs[2]]], k=2)
+    assert [d.id for d in fused] == ["0", "1"]
+
+    vector = [0.5, -0.25, 0.125, 0.0]
+    assert quantize(vector, "none") is vector
+    assert quantize(vector, "int8") == pytest.approx(vector, abs=0.5 / 127)
+    assert quantize(vector, "float16") == pytest.approx(vector, abs=1e-3)
+
+
+def test_retrieval_evaluation_reports_quality_and_latency(tmp_path):
+    documents, queries = labelled_corpus(docs_per_namespace=3, size_bytes=600, seed=1)
+    results = run_evaluation(
+        documents,
+        queries,
+        str(tmp_path),
+        FakeEmbeddings(dimensions=64),
+        dimensions=64,
+        ks=[1, 3],
+        chunk_sizes=[300],
+        quantizations=["none"],
+        hnsw_specs=["default"],
+        strategies=["vector", "adaptive", "hybrid"],
+    )
+
+    assert [(r["strategy"], r["k"]) for r in results] == [
+        ("vector", 1),
+        ("vector", 3),
+        ("adaptive", None),
+        ("hybrid", 1),
+        ("hybrid", 3),
+    ]
+    for result in results:
+        assert result["queries"] == 12
+        assert 0.0 <= result["mrr"] <= result["recall_at_k"] <= 1.0
+        assert result["p50_ms"] > 0 and result["index_mb"] > 0 and result["chunks"] > 12
+    hybrid_k3 = results[-1]
+    assert hybrid_k3["recall_at_k"] >= results[-2]["recall_at_k"] and hybrid_k3["recall_at_k"] > 0
+
+
+def _mock_client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock/v1")
+
+
+FAST = MockBehaviour(ttft_ms=0, jitter_ms=0, distribution="fixed", tokens_per_second=0, reply_tokens=5, embed_ms=0)
+
+
+@pytest.mark.asyncio
+async def test_openai_mock_serves_the_real_sdk():
+    app = create_mock_app(MockState(FAST))
+    client = _mock_client(app)
+    llm = ChatOpenAI(model="gpt-4o", api_key="mock", base_url="http://mock/v1", http_async_client=client)
+
+    reply = await llm.ainvoke("hello")
+    assert len(reply.content.split()) == 5
+    assert reply.usage_metadata["output_tokens"] == 5
+
+    chunks = [chunk async for chunk in llm.astream("hello", stream_usage=True)]
+    assert "".join(chunk.content for chunk in chunks).strip() == reply.content
+    assert sum(chunk.usage_metadata["output_tokens"] for chunk in chunks if chunk.usage_metadata) == 5
+
+    embeddings = OpenAIEmbeddings(
+        api_key="mock", base_url="http://mock/v1", http_async_client=client, check_embedding_ctx_length=False
+    )
+    vectors = await embeddings.aembed_documents(["a calm walk", "a calm walk", "something else"])
+    assert len(vectors[0]) == 1536 and vectors[0] == pytest.approx(vectors[1])
+    assert vectors[0] != pytest.approx(vectors[2])
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_openai_mock_rate_limits_and_the_sdk_retries():
+    state = MockState(dataclasses.replace(FAST, rate_limit_rps=1, retry_after_s=0.01))
+    client = _mock_client(create_mock_app(state))
+    first = await client.post("/chat/completions", json={"model": "m", "messages": [{"role": "user", "content": "x"}]})
+    limited = await client.post("/chat/completions", json={"model": "m", "messages": []})
+    assert first.status_code == 200
+    assert limited.status_code == 429
+    assert limited.headers["Retry-After"] == "0.01"
+    assert limited.json()["error"]["code"] == "rate_limit_exceeded"
+
+    llm = ChatOpenAI(model="m", api_key="mock", base_url="http://mock/v1", http_async_client=client, max_retries=3)
+    # An empty bucket refilling at 5/s: the SDK's first attempt gets a 429, the retry after 0.25s succeeds
+    state.base = dataclasses.replace(state.base, rate_limit_rps=5, retry_after_s=0.25)
+    state._tokens, state._refilled = 0.0, time.monotonic()
+    assert (await llm.ainvoke("again")).content
+    assert state.stats["rate_limited"] == 2
+
+    await client.post("http://mock/_mock/behaviour", json={"error_rate": 1.0, "rate_limit_rps": 0})
+    assert (await client.post("/embeddings", json={"input": "x"})).status_code == 500
+    assert (await client.post("http://mock/_mock/behaviour", json={"nope": 1})).status_code == 400
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_openai_mock_records_and_replays_a_cassette(tmp_path):
+    upstream = create_mock_app(MockState(FAST))
+    path = str(tmp_path / "cassette.jsonl")
+    recorder = create_mock_app(
+        MockState(FAST), "record", Cassette(path), "http://upstream/v1", httpx.ASGITransport(app=upstream)
+    )
+    body = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    async with _mock_client(recorder) as client:
+        recorded = (await client.post("/chat/completions", json=body)).json()
+        streamed = (await client.post("/chat/completions", json={**body, "stream": True})).text
+    assert streamed.rstrip().endswith("data: [DONE]")
+
+    replayer = create_mock_app(MockState(FAST), "replay", Cassette(path))
+    async with _mock_client(replayer) as client:
+        assert (await client.post("/chat/completions", json=body)).json() == recorded
+        assert (await client.post("/chat/completions", json={**body, "stream": True})).text == streamed
+        miss = await client.post("/chat/completions", json={**body, "model": "other"})
+        assert miss.status_code == 404
+
+
+def test_openai_base_url_reaches_the_embeddings_client(monkeypatch):
+    from app.rag import processor
+
+    monkeypatch.setattr(processor.cfg, "OPENAI_BASE_URL", "http://127.0.0.1:8090/v1")
+    monkeypatch.setattr(processor.cfg, "OPENAI_MAX_RETRIES", 5)
+    embeddings = processor._openai_embeddings()
+    assert embeddings.openai_api_base == "http://127.0.0.1:8090/v1"
+    assert embeddings.max_retries == 5
+    assert embeddings.check_embedding_ctx_length is False
@@ -0,0 +1,139 @@
+# tests/test_bulk_ingest.py
+import asyncio
+import json
+from unittest.mock import MagicMock, call
+
+import httpx
+import pytest
+from click.testing import CliRunner
+
+from app.clients.api_client import AsyncAPI
+from app.clients.bulk_ingest import (
+    IngestResult,
+    Manifest,
+    SourceFile,
+    discover,
+    doc_id_for,
+    http_worker,
+    pending_files,
+    processor_worker,
+    run_workers,
+)
+
+
+def _corpus(root, n):
+    (root / "notes").mkdir()
+    for i in range(n):
+        (root / ("notes" if i % 2 else ".") / f"Doc {i}.txt").write_text(f"text of document {i}")
+    (root / "skip.pdf").write_bytes(b"%PDF")
+    return root
+
+
+def test_discover_walks_lazily_and_doc_ids_are_stable(tmp_path):
+    _corpus(tmp_path, 4)
+    paths = discover(str(tmp_path), [".txt"])
+    assert next(paths).endswith("Doc 0.txt")  # yields before the subdirectory is listed
+    names = [p[len(str(tmp_path)) + 1 :] for p in discover(str(tmp_path), [".txt"])]
+    assert names == ["Doc 0.txt", "Doc 2.txt", "notes/Doc 1.txt", "notes/Doc 3.txt"]
+    assert doc_id_for(str(tmp_path / "notes" / "Doc 1.txt"), str(tmp_path), "corpus") == "corpus_notes_doc_1"
+
+
+@pytest.mark.asyncio
+async def test_run_workers_bounds_concurrency_and_pulls_jobs_on_demand():
+    pulled, in_flight, peak = [], 0, 0
+
+    def jobs():
+        for i in range(20):
+            pulled.append(i)
+            yield i
+
+    async def worker(job):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return [IngestResult(job)]
+
+    results = run_workers(jobs(), worker, concurrency=3)
+    await results.__anext__()
+    assert len(pulled) <= 6  # each of the three workers is at most one job ahead of the consumer
+    assert len([r async for r in results]) == 19 and peak == 3
+
+
+@pytest.mark.asyncio
+async def test_http_worker_uploads_form_fields_and_retries_overload(tmp_path):
+    (tmp_path / "a.txt").write_text("hello")
+    calls = []
+
+    def server(request: httpx.Request) -> httpx.Response:
+        calls.append(request.content)
+        if len(calls) == 1:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"status": "ok"})
+
+    async with AsyncAPI("http://api", transport=httpx.MockTransport(server), backoff_base=0.001) as api:
+        upload = http_worker(api, "theory", {"user_id": "u1"})
+        [result] = await upload(SourceFile(str(tmp_path / "a.txt"), "doc_a", "5:1", 5))
+    assert result.error is None and len(calls) == 2
+    body = calls[-1].decode()
+    assert 'name="namespace"\r\n\r\ntheory' in body and 'name="user_id"\r\n\r\nu1' in body and "hello" in body
+
+
+@pytest.mark.asyncio
+async def test_changed_files_replace_their_old_chunks(tmp_path):
+    _corpus(tmp_path, 2)
+    manifest = Manifest(str(tmp_path / "manifest.jsonl"))
+    files = list(pending_files(discover(str(tmp_path), [".txt"]), str(tmp_path), "doc", manifest, lambda _: None))
+    for source in files:
+        manifest.mark_done(source)
+    (tmp_path / "Doc 0.txt").write_text("shorter")  # changed: new size, new fingerprint
+    skipped = []
+
+    [changed] = pending_files(discover(str(tmp_path), [".txt"]), str(tmp_path), "doc", manifest, skipped.append)
+    processor = MagicMock()
+    [result] = await processor_worker(processor, "theory", {})([changed])
+
+    assert result.error is None and [s.doc_id for s in skipped] == ["doc_notes_doc_1"]
+    assert changed.replaces and not any(source.replaces for source in files)
+    assert processor.method_calls[0] == call.delete_documents(where={"doc_id": {"$in": ["doc_doc_0"]}})
+    assert [doc_id for doc_id, _, _ in processor.ingest_many.call_args.args[0]] == ["doc_doc_0"]
+    manifest.close()
+
+
+class _FlakyProcessor:
+    """Stands in for DocumentProcessor: records batches, fails any batch containing doc 3 on the first run."""
+
+    batches = []
+    fail_doc = "doc_notes_doc_3"
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def ingest_many(self, documents):
+        ids = [doc_id for doc_id, _, _ in documents]
+        if self.fail_doc in ids:
+            raise RuntimeError("embedding API unavailable")
+        _FlakyProcessor.batches.append(ids)
+
+
+def test_ingest_command_resumes_from_the_manifest(tmp_path, monkeypatch):
+    import app.cli
+
+    (tmp_path / "corpus").mkdir()
+    corpus = _corpus(tmp_path / "corpus", 6)
+    manifest = tmp_path / "manifest.jsonl"
+    monkeypatch.setattr(app.cli, "DocumentProcessor", _FlakyProcessor)
+    args = ["rag", "ingest", "--namespace", "theory", "--source-dir", str(corpus), "--in-process"]
+    args += ["--batch-size", "1", "--concurrency", "2", "--manifest", str(manifest)]
+
+    first = CliRunner().invoke(app.cli.cli, args)
+    assert first.exit_code == 1 and "embedding API unavailable" in first.output
+    done = {json.loads(line)["doc_id"] for line in manifest.read_text().splitlines()}
+    assert len(done) == 5 and "doc_notes_doc_3" not in done
+
+    _FlakyProcessor.batches, _FlakyProcessor.fail_doc = [], None
+    second = CliRunner().invoke(app.cli.cli, args)
+    assert second.exit_code == 0, second.output
+    assert _FlakyProcessor.batches == [["doc_notes_doc_3"]]  # only the failed document is embedded again
+    assert "Skipped 5 documents" in second.output
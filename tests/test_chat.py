@@ -1,9 +1,12 @@
 # tests/test_chat.py
+import asyncio
+import json
 import uuid
 
 import pytest
 from fastapi.testclient import TestClient
 
+from app.api.memory import SessionMemoryStore
 from app.api.orchestrator import Orchestrator
 
 # from app.main import app # app is used by the client fixture
@@ -17,7 +20,7 @@ async def test_chat_endpoint_authenticated(client: TestClient, monkeypatch):
     The endpoint now always requires authentication.
     """
 
-    async def mock_answer(self, message: str):
+    async def mock_answer(self, message: str, user_id=None, session_id=None):
         return {"reply": f"echo: {message}"}  # Return a dictionary
 
     monkeypatch.setattr(Orchestrator, "answer", mock_answer)
@@ -57,3 +60,172 @@ async def test_chat_endpoint_authenticated(client: TestClient, monkeypatch):
         reply_data = resp.json()
         assert "reply" in reply_data, "Reply key not found in chat response"
         assert reply_data["reply"].lower().startswith("echo:")
+
+
+class _StreamingOrchestrator:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.memory = SessionMemoryStore()
+
+    async def answer_stream(self, message, user_id=None, session_id=None):
+        for i, word in enumerate(["Hello", " from", " the", " future"]):
+            if i == self.fail_after:
+                raise RuntimeError("upstream went away")
+            yield word
+
+
+def test_chat_stream_sends_ndjson_deltas_then_the_full_reply(monkeypatch):
+    from app.api.orchestrator import get_orchestrator
+    from app.clients.api_client import APIError, SyncAPI
+    from app.core.settings import get_settings
+    from app.main import create_app
+
+    monkeypatch.setattr(get_settings(), "SKIP_AUTH", True)
+    app = create_app()
+    app.dependency_overrides[get_orchestrator] = lambda: _StreamingOrchestrator()
+    client = TestClient(app)
+
+    response = client.post("/chat/stream", json={"message": "hi", "session_id": "s1"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[:-1] == [{"delta": "Hello"}, {"delta": " from"}, {"delta": " the"}, {"delta": " future"}]
+    assert lines[-1] == {"reply": "Hello from the future", "session_id": "s1"}
+
+    api = SyncAPI()
+    api.client, api.token = client, "skipped"
+    assert list(api.chat_stream("hi")) == ["Hello", " from", " the", " future"]
+    app.dependency_overrides[get_orchestrator] = lambda: _StreamingOrchestrator(fail_after=2)
+    with pytest.raises(APIError, match="unexpected error"):
+        list(api.chat_stream("hi"))
+
+
+def test_chat_history_pages_backwards_through_the_callers_own_messages(monkeypatch):
+    from app.api.history import history_page, record_turn
+    from app.api.orchestrator import get_orchestrator
+    from app.clients.api_client import SyncAPI
+    from app.core.settings import get_settings
+    from app.main import create_app
+
+    monkeypatch.setattr(get_settings(), "SKIP_AUTH", True)
+    app = create_app()
+    app.dependency_overrides[get_orchestrator] = lambda: _StreamingOrchestrator()
+    client = TestClient(app)
+    session_id = f"history-{uuid.uuid4().hex[:8]}"
+    for i in range(3):
+        client.post("/chat/stream", json={"message": f"question {i}", "session_id": session_id})
+
+    api = SyncAPI(client=client)  # shared client: the token is sent per request, not stored on it
+    api.token = "skipped"
+    latest = api.history(session_id, limit=4)
+    assert [m["content"] for m in latest["messages"]] == [
+        "question 1",
+        "Hello from the future",
+        "question 2",
+        "Hello from the future",
+    ]
+    assert "authorization" not in client.headers
+    older = api.history(session_id, before=latest["next_before"], limit=4)
+    assert [m["role"] for m in older["messages"]] == ["user", "assistant"] and older["next_before"] is None
+
+    asyncio.run(record_turn(session_id, "other-user", "secret", "reply"))
+    assert [m["content"] for m in asyncio.run(history_page(session_id, "other-user"))["messages"]] == [
+        "secret",
+        "reply",
+    ]
+    assert "secret" not in {m["content"] for m in api.history(session_id, limit=100)["messages"]}
+
+
+class _SlowOrchestrator:
+    """Streams one chunk, then waits on the 'LLM' until cancelled."""
+
+    def __init__(self):
+        self.upstream_cancelled = False
+        self.memory = SessionMemoryStore()
+
+    async def answer_stream(self, message, user_id=None, session_id=None):
+        yield f"Thinking about {message}"
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.upstream_cancelled = True
+            raise
+
+
+def test_chat_websocket_streams_turns_and_cancels_the_upstream_call(monkeypatch):
+    from app.api.orchestrator import get_orchestrator
+    from app.core.settings import get_settings
+    from app.main import create_app
+
+    monkeypatch.setattr(get_settings(), "SKIP_AUTH", True)
+    monkeypatch.setattr(get_settings(), "CHAT_HISTORY_ENABLED", False)  # stored turns: see the history test
+    app = create_app()
+    slow = _SlowOrchestrator()
+    app.dependency_overrides[get_orchestrator] = lambda: slow
+    with TestClient(app).websocket_connect("/chat/ws") as ws:
+        ready = ws.receive_json()
+        assert ready["type"] == "ready" and ready["session_id"]
+        ws.send_json({"type": "message", "message": "life"})
+        assert ws.receive_json() == {"type": "delta", "delta": "Thinking about life"}
+        ws.send_json({"type": "message", "message": "again"})
+        assert ws.receive_json()["type"] == "error"  # one answer at a time per connection
+        ws.send_json({"type": "cancel"})
+        assert ws.receive_json() == {"type": "cancelled"}
+        assert slow.upstream_cancelled
+        ws.send_json({"type": "message", "message": "it all"})  # the connection outlives the cancelled turn
+        assert ws.receive_json() == {"type": "delta", "delta": "Thinking about it all"}
+
+    app.dependency_overrides[get_orchestrator] = lambda: _StreamingOrchestrator()
+    with TestClient(app).websocket_connect("/chat/ws?session_id=s1") as ws:
+        assert ws.receive_json() == {"type": "ready", "session_id": "s1"}
+        for _ in range(2):  # the same connection serves turn after turn
+            ws.send_json({"type": "message", "message": "hi"})
+            frames = [ws.receive_json() for _ in range(5)]
+            assert "".join(f["delta"] for f in frames[:4]) == "Hello from the future"
+            assert frames[4] == {"type": "reply", "reply": "Hello from the future", "session_id": "s1"}
+
+
+@pytest.mark.demo_mode(False)
+def test_chat_websocket_authenticates_once_when_it_opens(client: TestClient, monkeypatch):
+    import app.api.chat
+
+    # The fixture reloads settings; the chat module keeps the ones it was imported with
+    monkeypatch.setattr(app.api.chat.cfg, "CHAT_HISTORY_ENABLED", False)
+    from starlette.websockets import WebSocketDisconnect
+
+    from app.api.orchestrator import get_orchestrator
+
+    client.app.dependency_overrides[get_orchestrator] = lambda: _StreamingOrchestrator()
+    credentials = {"email": f"ws_{uuid.uuid4().hex[:8]}@example.com", "password": "testpassword"}
+    with client:
+        assert client.post("/auth/register", json=credentials).status_code == 201
+        login = client.post("/auth/login", data={"username": credentials["email"], "password": "testpassword"})
+        token = login.json()["access_token"]
+
+        with client.websocket_connect("/chat/ws") as ws:
+            ws.send_json({"type": "auth", "token": "not-a-jwt"})
+            assert ws.receive_json() == {"type": "error", "error": "Not authenticated"}
+            with pytest.raises(WebSocketDisconnect) as closed:
+                ws.receive_json()
+            assert closed.value.code == 1008
+
+        with client.websocket_connect("/chat/ws", headers={"Authorization": f"Bearer {token}"}) as ws:
+            assert ws.receive_json()["type"] == "ready"
+            ws.send_json({"type": "message", "message": "hi"})
+            assert [ws.receive_json()["type"] for _ in range(5)][-1] == "reply"
+
+
+def test_chat_refuses_a_session_started_by_another_user(monkeypatch):
+    from app.api.orchestrator import get_orchestrator
+    from app.core.settings import get_settings
+    from app.main import create_app
+
+    monkeypatch.setattr(get_settings(), "SKIP_AUTH", True)
+    app = create_app()
+    orchestrator = _StreamingOrchestrator()
+    asyncio.run(orchestrator.memory.get("taken", "someone-else"))
+    app.dependency_overrides[get_orchestrator] = lambda: orchestrator
+    client = TestClient(app)
+
+    assert client.post("/chat/stream", json={"message": "hi", "session_id": "taken"}).status_code == 403
+    with client.websocket_connect("/chat/ws?session_id=taken") as ws:
+        assert "belongs to another user" in ws.receive_json()["error"]
@@ -255,3 +255,42 @@
 #         doc_id="doc_doc1_1", text="This is test content.", metadata={"source_file": "doc1.txt"}
 #     )
 #     assert "Ingestion complete. Processed 2 documents" in result.output
+
+
+# ─── rag summarize (live) ─────────────────────────────────────────────
+import json  # noqa: E402
+
+import httpx  # noqa: E402
+from click.testing import CliRunner  # noqa: E402
+
+from app.cli import cli  # noqa: E402
+from app.clients.api_client import AsyncAPI  # noqa: E402
+
+
+def test_rag_summarize_streams_the_servers_ndjson(monkeypatch):
+    requests = []
+
+    def server(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        lines = [{"session_id": sid, "summary": f"S-{sid}", "outcome": "full"} for sid in ("a", "b")]
+        return httpx.Response(200, text="".join(json.dumps(line) + "\n" for line in lines))
+
+    monkeypatch.setattr(
+        "app.cli.AsyncAPI", lambda url, **kwargs: AsyncAPI(url, transport=httpx.MockTransport(server), **kwargs)
+    )
+
+    args = ["rag", "summarize", "--session-id", "a", "--session-id", "b", "--url", "http://api", "--token", "t"]
+    result = CliRunner().invoke(cli, args)
+
+    assert result.exit_code == 0, result.output
+    lines = [json.loads(line) for line in result.output.splitlines()]
+    assert sorted(line["summary"] for line in lines) == ["S-a", "S-b"]
+    assert requests[0].url.path == "/rag/sessions/summarize"
+    assert requests[0].headers["Authorization"] == "Bearer t"
+    assert json.loads(requests[0].content)["session_ids"] == ["a", "b"]
+
+
+def test_rag_summarize_requires_ids_or_range():
+    result = CliRunner().invoke(cli, ["rag", "summarize"])
+    assert result.exit_code != 0
+    assert "--session-id" in result.output
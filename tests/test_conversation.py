@@ -0,0 +1,128 @@
+# tests/test_conversation.py
+import math
+import uuid
+from unittest.mock import AsyncMock
+
+import chromadb
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.api.orchestrator import RagOrchestrator
+from app.rag.conversation import (
+    ConversationRetrievalCache,
+    cosine,
+    cosine_to_relevance,
+    drop_duplicates,
+)
+
+
+def doc(chunk_id: str) -> Document:
+    return Document(page_content=chunk_id, id=chunk_id)
+
+
+def test_cosine_helpers():
+    assert cosine([1.0, 0.0], [1.0, 0.0]) == pytest.approx(1.0)
+    assert cosine([1.0, 0.0], [0.0, 1.0]) == pytest.approx(0.0)
+    assert cosine([0.0, 0.0], [1.0, 0.0]) == 0.0
+    assert cosine_to_relevance(1.0) == pytest.approx(1.0)
+    assert cosine_to_relevance(0.0) == pytest.approx(1.0 - math.sqrt(2))
+
+
+class _FixedEmbeddings(Embeddings):
+    vectors = {"query": [1.0, 0.0], "close": [0.9, math.sqrt(1 - 0.81)], "far": [0.6, math.sqrt(1 - 0.36)]}
+
+    def embed_documents(self, texts):
+        return [self.vectors[t] for t in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def test_relevance_matches_chroma_scores():
+    store = Chroma(
+        collection_name=f"relevance_{uuid.uuid4().hex[:8]}",
+        embedding_function=_FixedEmbeddings(),
+        client=chromadb.EphemeralClient(),
+    )
+    store.add_texts(["close", "far"])
+    for doc, score in store.similarity_search_with_relevance_scores("query", k=2):
+        expected = cosine_to_relevance(
+            cosine(_FixedEmbeddings.vectors["query"], _FixedEmbeddings.vectors[doc.page_content])
+        )
+        assert score == pytest.approx(expected, abs=1e-4)
+
+
+def test_reuse_only_for_close_follow_ups():
+    cache = ConversationRetrievalCache(similarity_threshold=0.9)
+    assert cache.can_reuse(cache.get("c1"), [1.0, 0.0]) is False
+
+    cache.store("c1", [1.0, 0.0], [(doc("a"), [1.0, 0.0])])
+    assert cache.can_reuse(cache.get("c1"), [0.99, 0.05]) is True
+    assert cache.can_reuse(cache.get("c1"), [0.0, 1.0]) is False
+
+
+def test_rerank_orders_previous_candidates_by_new_query():
+    cache = ConversationRetrievalCache()
+    cache.store("c1", [1.0, 0.0], [(doc("a"), [1.0, 0.0]), (doc("b"), [0.6, 0.8]), (doc("c"), [0.0, 1.0])])
+
+    ranked = cache.rerank(cache.get("c1"), [0.6, 0.8], threshold=0.3, gap=1.0, min_k=1, max_k=5)
+
+    assert [d.id for d in ranked] == ["b", "c", "a"]
+
+
+def test_drop_duplicates_keeps_only_text_the_prompt_lacks():
+    docs = [doc("walks"), doc("sleep"), doc("walks"), Document(page_content="sleep"), doc("journaling")]
+    kept = drop_duplicates(docs, ["Future me keeps journaling daily."])
+    assert [d.page_content for d in kept] == ["walks", "sleep"]
+
+
+def test_lru_eviction():
+    cache = ConversationRetrievalCache(max_conversations=1)
+    cache.store("c1", [1.0], [])
+    cache.store("c2", [1.0], [])
+    assert cache.get("c1") is None
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_follow_up_turn_skips_vector_search(monkeypatch):
+    orch = RagOrchestrator()
+    vectors = {"my job stresses me": [1.0, 0.0], "work is still stressful": [0.98, 0.1]}
+    monkeypatch.setattr(orch.future_db.embeddings, "aembed_query", AsyncMock(side_effect=lambda q: vectors[q]))
+    search = AsyncMock(return_value=[doc("a"), doc("b")])
+    monkeypatch.setattr(orch, "_search", search)
+    monkeypatch.setattr(orch, "_with_embeddings", lambda docs: [(d, [1.0, 0.0]) for d in docs])
+
+    first = await orch._retrieve_docs("my job stresses me", "u1", "conv1")
+    second = await orch._retrieve_docs("work is still stressful", "u1", "conv1")
+
+    assert [d.id for d in first] == ["a", "b"]
+    assert [d.id for d in second] == ["a", "b"]  # still sent: the new prompt does not carry the previous one's chunks
+    assert search.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_context_skips_chunks_already_in_the_history(monkeypatch):
+    orch = RagOrchestrator()
+    monkeypatch.setattr(orch, "_retrieve_docs", AsyncMock(return_value=[doc("we talked about running"), doc("new")]))
+
+    context = await orch._gather_context({"input": "q", "history": "User: we talked about running, right?"})
+
+    assert [d.page_content for d in context] == ["User: we talked about running, right?", "new"]
+
+
+@pytest.mark.asyncio
+async def test_conversation_state_is_not_shared_across_users(monkeypatch):
+    orch = RagOrchestrator()
+    monkeypatch.setattr(orch.future_db.embeddings, "aembed_query", AsyncMock(return_value=[1.0, 0.0]))
+    search = AsyncMock(return_value=[doc("private")])
+    monkeypatch.setattr(orch, "_search", search)
+    monkeypatch.setattr(orch, "_with_embeddings", lambda docs: [(d, [1.0, 0.0]) for d in docs])
+
+    await orch._retrieve_docs("my diagnosis", "owner", "conv1")
+    await orch._retrieve_docs("my diagnosis", "intruder", "conv1")  # same session id, other user
+
+    assert search.await_count == 2  # no reuse of the owner's candidates
+    assert search.await_args_list[1].args == ("my diagnosis", "intruder")  # searched with the intruder's own filter
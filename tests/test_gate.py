@@ -0,0 +1,76 @@
+# tests/test_gate.py
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.api.orchestrator import BranchingChain
+from app.rag.gate import RetrievalGate, gate_decisions, load_classifier
+
+
+@pytest.mark.parametrize(
+    "message", ["Hello!", "thanks", "ok", "Thank you so much :)", "תודה רבה", "  ", "how are you?"]
+)
+def test_small_talk_skips_retrieval(message):
+    assert RetrievalGate().needs_retrieval(message) is False
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "What did we talk about in our last session?",
+        "I had a really rough day at work and I keep replaying the argument",
+        "hi, what should I do?",
+        "my sister",
+    ],
+)
+def test_substantive_messages_need_retrieval(message):
+    assert RetrievalGate().needs_retrieval(message) is True
+
+
+def test_classifier_decides_ambiguous_short_messages():
+    gate = RetrievalGate(classifier=lambda m: False)
+    assert gate.needs_retrieval("my sister") is False
+    # Lexical rules still win over the classifier for clear cases
+    assert RetrievalGate(classifier=lambda m: True).needs_retrieval("thanks") is False
+
+
+def test_gate_counts_decisions():
+    gate_decisions.reset()
+    gate = RetrievalGate()
+    gate.needs_retrieval("hi")
+    gate.needs_retrieval("ok")
+    gate.needs_retrieval("Tell me about my safety plan")
+    assert gate_decisions.value(decision="skip") == 2
+    assert gate_decisions.value(decision="retrieve") == 1
+
+
+def test_load_classifier_handles_bad_paths():
+    assert load_classifier(None) is None
+    assert load_classifier("no_such_module_xyz:fn") is None
+    assert load_classifier("os.path:isabs") is not None
+
+
+@pytest.mark.asyncio
+async def test_branching_chain_routes_small_talk_to_light_chain():
+    rag_chain = AsyncMock()
+    light_chain = AsyncMock()
+    light_chain.ainvoke = AsyncMock(return_value="Hi! What's on your mind?")
+    chain = BranchingChain(lambda q: False, AsyncMock(), rag_chain, RetrievalGate(), light_chain)
+
+    result = await chain.ainvoke({"query": "hello", "input": "hello"})
+
+    assert result == {"answer": "Hi! What's on your mind?"}
+    rag_chain.ainvoke.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_light_and_crisis_branches_get_the_session_history():
+    light_chain, crisis_chain = AsyncMock(), AsyncMock()
+    history = "Future me: Shall we plan a short walk for tomorrow?"
+    chain = BranchingChain(lambda q: "die" in q, crisis_chain, AsyncMock(), RetrievalGate(), light_chain)
+
+    await chain.ainvoke({"query": "yes", "history": history})
+    await chain.ainvoke({"query": "I want to die", "history": history})
+
+    assert light_chain.ainvoke.await_args.args[0] == {"input": "yes", "history": history}
+    assert crisis_chain.ainvoke.await_args.args[0]["history"] == history
@@ -0,0 +1,42 @@
+# tests/test_loop_monitor.py
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.core.loop_monitor import LoopLagMonitor, loop_lag_seconds, loop_stalls
+
+
+def _blocking_call_in_handler() -> None:
+    time.sleep(0.2)
+
+
+@pytest.mark.asyncio
+async def test_monitor_measures_lag_and_logs_the_blocking_stack(caplog):
+    monitor = LoopLagMonitor(interval_seconds=0.01, threshold_seconds=0.05)
+    stalls_before, ticks_before = loop_stalls.value(), loop_lag_seconds.count()
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        with caplog.at_level(logging.WARNING):
+            _blocking_call_in_handler()
+            await asyncio.sleep(0.05)
+    finally:
+        await monitor.stop()
+
+    assert loop_lag_seconds.count() > ticks_before
+    assert monitor.max_lag_seconds >= 0.1
+    assert loop_stalls.value() == stalls_before + 1  # one log line per stall, not per check
+    assert "_blocking_call_in_handler" in monitor.last_stall_stack
+    assert any("Event loop blocked" in r.message and "_blocking_call_in_handler" in r.message for r in caplog.records)
+
+
+@pytest.mark.asyncio
+async def test_monitor_stays_quiet_without_blocking_calls():
+    monitor = LoopLagMonitor(interval_seconds=0.01, threshold_seconds=0.1)
+    monitor.start()
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+    assert monitor.last_stall_stack is None
+    assert monitor.max_lag_seconds < 0.1
@@ -10,3 +10,11 @@ def test_ping():
     res = client.get("/ping")
     assert res.status_code == 200
     assert res.json() == {"ping": "pong"}
+
+
+def test_metrics_endpoint():
+    client.get("/ping")
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert "# TYPE dfm_retrieval_k histogram" in res.text
@@ -0,0 +1,79 @@
+# tests/test_memory.py
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.api.memory import SessionMemory, SessionMemoryStore, SessionOwnershipError
+from app.api.orchestrator import BranchingChain, Orchestrator
+
+
+def test_ring_buffer_keeps_last_turns_and_queues_overflow():
+    memory = SessionMemory(max_turns=2)
+    memory.add("user", "one")
+    memory.add("assistant", "two")
+    memory.add("user", "three")
+
+    assert list(memory.turns) == [("assistant", "two"), ("user", "three")]
+    assert memory.pending == [("user", "one")]
+    assert "Recent conversation:\nassistant: two\nuser: three" in memory.render()
+
+
+@pytest.mark.asyncio
+async def test_overflow_is_folded_into_rolling_summary():
+    summarizer = AsyncMock(side_effect=lambda summary, turns: f"{summary}+{len(turns)}")
+    store = SessionMemoryStore(max_turns=2, summarizer=summarizer)
+
+    await store.add_turn("s1", "hi", "hello")
+    await store.add_turn("s1", "I feel low", "I hear you")
+    await store.drain()
+
+    memory = await store.get("s1")
+    assert memory.summary == "+2"
+    assert memory.pending == []
+    assert len(memory.turns) == 2
+    assert (await store.render("s1")).startswith("Summary of earlier conversation:\n+2")
+
+
+@pytest.mark.asyncio
+async def test_summary_is_capped_and_idle_sessions_evicted():
+    store = SessionMemoryStore(
+        max_turns=1, max_sessions=1, summary_max_chars=5, summarizer=AsyncMock(return_value="x" * 50)
+    )
+    await store.add_turn("s1", "a", "b")
+    await store.drain()
+    assert (await store.get("s1")).summary == "xxxxx"
+
+    await store.get("s2")
+    assert len(store) == 1
+    assert (await store.get("s1")).summary == ""
+
+
+@pytest.mark.asyncio
+async def test_answer_passes_history_for_session(monkeypatch):
+    orch = Orchestrator()
+    rag_chain = AsyncMock()
+    rag_chain.ainvoke = AsyncMock(return_value={"answer": "ok"})
+    orch.chain = BranchingChain(lambda q: False, AsyncMock(), rag_chain)
+
+    await orch.answer("first message", session_id="s1")
+    await orch.answer("second message", session_id="s1")
+
+    history = rag_chain.ainvoke.await_args.args[0]["history"]
+    assert "user: first message" in history
+    assert "assistant: ok" in history
+
+
+@pytest.mark.asyncio
+async def test_a_session_belongs_to_the_user_who_started_it():
+    store = SessionMemoryStore(persist=True)
+    session_id = f"owned-{uuid.uuid4().hex[:8]}"
+    await store.add_turn(session_id, "my secret", "I will keep it", user_id="owner")
+    await store.drain()
+    with pytest.raises(SessionOwnershipError):
+        await store.render(session_id, "intruder")
+
+    restarted = SessionMemoryStore(persist=True)  # ownership survives in chat_session_memory
+    with pytest.raises(SessionOwnershipError):
+        await restarted.get(session_id, "intruder")
+    assert "my secret" in await restarted.render(session_id, "owner")
@@ -0,0 +1,59 @@
+# tests/test_metrics.py
+from uuid import uuid4
+
+import pytest
+
+from app.core.callbacks import LLMLatencyHandler, llm_latency
+from app.core.metrics import MetricsRegistry, render_prometheus
+
+
+def test_render_prometheus_counters_and_histograms():
+    registry = MetricsRegistry()
+    turns = registry.counter("dfm_turns_total", "Chat turns.", ("branch",))
+    latency = registry.histogram("dfm_stage_seconds", "Stage latency.", ("stage",), buckets=(0.1, 1.0))
+    turns.inc(branch="rag")
+    turns.inc(2, branch='cri"sis')
+    latency.observe(0.05, stage="embed")
+    latency.observe(0.5, stage="embed")
+    latency.observe(3.0, stage="embed")
+
+    text = render_prometheus(registry)
+
+    assert "# TYPE dfm_turns_total counter" in text
+    assert 'dfm_turns_total{branch="rag"} 1.0' in text
+    assert 'dfm_turns_total{branch="cri\\"sis"} 2.0' in text
+    assert "# TYPE dfm_stage_seconds histogram" in text
+    assert 'dfm_stage_seconds_bucket{stage="embed",le="0.1"} 1' in text
+    assert 'dfm_stage_seconds_bucket{stage="embed",le="1.0"} 2' in text
+    assert 'dfm_stage_seconds_bucket{stage="embed",le="+Inf"} 3' in text
+    assert 'dfm_stage_seconds_sum{stage="embed"} 3.55' in text
+    assert 'dfm_stage_seconds_count{stage="embed"} 3' in text
+    assert text.endswith("\n")
+
+
+def test_histogram_time_records_even_on_error():
+    registry = MetricsRegistry()
+    latency = registry.histogram("dfm_t_seconds", "t", ("stage",))
+    with latency.time(stage="ok"):
+        pass
+    with pytest.raises(RuntimeError):
+        with latency.time(stage="boom"):
+            raise RuntimeError()
+
+    assert latency.count(stage="ok") == 1
+    assert latency.count(stage="boom") == 1
+
+
+def test_llm_latency_handler_records_ttft_and_total():
+    handler = LLMLatencyHandler()
+    run_id = uuid4()
+    before_ttft = llm_latency.count(model="m1", phase="ttft")
+    before_total = llm_latency.count(model="m1", phase="total")
+
+    handler.on_chat_model_start({}, [[]], run_id=run_id, metadata={"ls_model_name": "m1"})
+    handler.on_llm_new_token("a", run_id=run_id)
+    handler.on_llm_new_token("b", run_id=run_id)
+    handler.on_llm_end(None, run_id=run_id)
+
+    assert llm_latency.count(model="m1", phase="ttft") == before_ttft + 1
+    assert llm_latency.count(model="m1", phase="total") == before_total + 1
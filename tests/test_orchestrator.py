@@ -1,12 +1,15 @@
 # tests/test_orchestrator.py
 
+import asyncio
 import logging  # For capturing log messages
 from typing import Any, Dict, List, Literal  # Import Literal, Dict, Any, List
 from unittest.mock import AsyncMock, MagicMock, mock_open
 
 import pytest
 from langchain.prompts import ChatPromptTemplate  # For mocking its class method
+from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever  # For mocking retriever
+from langchain_core.runnables import RunnableLambda
 
 from app.api.orchestrator import BranchingChain, Orchestrator, RagOrchestrator
 from app.core.settings import Settings  # Import Settings for mocking
@@ -47,6 +50,21 @@ async def test_risk_uses_crisis_chain(monkeypatch):
     assert response == {"reply": "CRISIS!!!"}
 
 
+@pytest.mark.asyncio
+async def test_crisis_prompt_includes_query_and_history():
+    orch = Orchestrator()
+    prompts = []
+    orch.llm = RunnableLambda(lambda prompt: prompts.append(prompt.to_string()) or "CRISIS")
+
+    reply = await orch._build_crisis_chain().ainvoke(
+        {"query": "I feel hopeless", "context": [], "history": "User: my exam went badly"}
+    )
+
+    assert reply == "CRISIS"
+    assert "I feel hopeless" in prompts[0] and "my exam went badly" in prompts[0]
+    assert "'query'" not in prompts[0]  # the message itself, not the whole input dict
+
+
 @pytest.mark.asyncio
 async def test_answer_fallback_on_error(monkeypatch):
     orch = Orchestrator()
@@ -59,9 +77,24 @@ async def test_answer_fallback_on_error(monkeypatch):
     assert response == {"reply": "I’m sorry, I’m unable to answer that right now. Please try again later."}
 
 
+def session_chunks(*texts: str) -> List[Document]:
+    return [
+        Document(id=f"t{i}", page_content=text, metadata={"doc_id": "t", "chunk": i, "user_id": "u1"})
+        for i, text in enumerate(texts)
+    ]
+
+
+def stub_session_store(monkeypatch, orch: RagOrchestrator, chunks: List[Document]) -> MagicMock:
+    monkeypatch.setattr(orch.session_db, "get_documents", lambda where: list(chunks))
+    summary_db = MagicMock(spec=DocumentProcessor)
+    monkeypatch.setattr(orch, "session_summary_db", summary_db)
+    return summary_db
+
+
 @pytest.mark.asyncio
 async def test_summarize_session_success(monkeypatch):
     orch = RagOrchestrator()
+    summary_db = stub_session_store(monkeypatch, orch, session_chunks("user: hi", "assistant: hello"))
     mock_summarize_chain = AsyncMock()
     # summarize_chain with StrOutputParser now returns a string directly
     mock_summarize_chain.ainvoke = AsyncMock(return_value="SESSION SUMMARY")
@@ -69,11 +102,15 @@ async def test_summarize_session_success(monkeypatch):
     monkeypatch.setattr(orch, "summarize_chain", mock_summarize_chain)
 
     assert await orch.summarize_session("sess1") == "SESSION SUMMARY"
+    summary_db.ingest.assert_called_once_with(
+        "sess1_summary", "SESSION SUMMARY", metadata={"session_id": "sess1", "user_id": "u1"}
+    )
 
 
 @pytest.mark.asyncio
 async def test_summarize_session_fallback(monkeypatch):
     orch = RagOrchestrator()
+    stub_session_store(monkeypatch, orch, session_chunks("user: hi"))
     mock_summarize_chain = AsyncMock()
     mock_summarize_chain.ainvoke.side_effect = RuntimeError("Simulated chain error")
 
@@ -82,6 +119,29 @@ async def test_summarize_session_fallback(monkeypatch):
     assert await orch.summarize_session("sessX") == "Summary for sessX (unavailable)"
 
 
+@pytest.mark.asyncio
+async def test_summarize_session_folds_only_new_turns(monkeypatch):
+    orch = RagOrchestrator()
+    chunks = session_chunks("user: work is hard", "assistant: tell me more")
+    stub_session_store(monkeypatch, orch, chunks)
+    full = AsyncMock(return_value="S1")
+    update = AsyncMock(return_value="S2")
+    monkeypatch.setattr(orch, "summarize_chain", MagicMock(ainvoke=full))
+    monkeypatch.setattr(orch, "summarize_update_chain", MagicMock(ainvoke=update))
+
+    assert await orch.summarize_session("s") == "S1"
+    assert await orch.summarize_session("s") == "S1"  # unchanged transcript: served from the checkpoint
+    assert full.await_count == 1 and update.await_count == 0
+
+    chunks.append(Document(id="t2", page_content="user: my boss yelled", metadata={"doc_id": "t", "chunk": 2}))
+    assert await orch.summarize_session("s") == "S2"
+    update.assert_awaited_once_with({"summary": "S1", "input": "user: my boss yelled"})
+
+    chunks[0] = Document(id="t0", page_content="user: work is fine", metadata={"doc_id": "t", "chunk": 0})
+    await orch.summarize_session("s")  # an already-summarized turn changed: full rebuild
+    assert full.await_count == 2
+
+
 def test_rag_orchestrator_has_future_db():
     orch = RagOrchestrator()
     assert hasattr(orch, "future_db"), "RagOrchestrator must have future_db"
@@ -281,3 +341,72 @@ def test_orchestrator_prompt_loading_by_language(
                     unexpected_fallback_logged = True
                     break
         assert not unexpected_fallback_logged, f"Unexpected fallback warning logged: {mock_log_warning.call_args_list}"
+
+
+def test_pack_groups_respects_token_budget():
+    from app.rag.summaries import pack_groups
+
+    assert pack_groups(["a" * 10, "b" * 10], max_tokens=100) == ["a" * 10 + "\n\n" + "b" * 10]
+    assert pack_groups(["a" * 30, "b" * 30], max_tokens=10) == ["a" * 30, "b" * 30]
+    assert pack_groups(["c" * 90], max_tokens=10) == ["c" * 40, "c" * 40, "c" * 10]  # oversized text is split
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_summarize_long_input(monkeypatch):
+    orch = RagOrchestrator()
+    monkeypatch.setattr(orch.settings, "SUMMARY_GROUP_MAX_TOKENS", 10)
+    batches: List[int] = []
+
+    async def fake_batch(inputs, config=None):
+        batches.append(len(inputs))
+        assert config == {"max_concurrency": orch.settings.SUMMARY_MAX_CONCURRENCY}
+        return ["p" * 15 for _ in inputs]
+
+    monkeypatch.setattr(orch, "summarize_chain", MagicMock(abatch=fake_batch))
+    monkeypatch.setattr(
+        orch, "summarize_reduce_chain", MagicMock(abatch=fake_batch, ainvoke=AsyncMock(return_value="FINAL"))
+    )
+
+    summary = await orch._summarize_docs_with_chain([Document(page_content="x" * 40) for _ in range(8)])
+
+    assert summary == "FINAL"
+    assert batches == [8, 4, 2]  # map, then reduce levels that halve the partials
+    orch.summarize_reduce_chain.ainvoke.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_summarize_sessions_bounds_concurrency(monkeypatch):
+    orch = RagOrchestrator()
+    in_flight = 0
+    peak = 0
+
+    async def fake_summarize(session_id):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return f"S-{session_id}", "full"
+
+    monkeypatch.setattr(orch, "_summarize_session", fake_summarize)
+
+    results = [r async for r in orch.summarize_sessions([f"s{i}" for i in range(7)], concurrency=2)]
+
+    assert sorted(r["session_id"] for r in results) == [f"s{i}" for i in range(7)]
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_answer_stream_yields_rag_answer_deltas_and_remembers_the_turn():
+    from langchain_core.language_models import FakeListChatModel
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnablePassthrough
+
+    orch = Orchestrator()
+    llm = FakeListChatModel(responses=["Future you is proud."])
+    rag_chain = RunnablePassthrough.assign(answer=ChatPromptTemplate.from_template("{input}") | llm | StrOutputParser())
+    orch.chain = BranchingChain(lambda q: False, orch._crisis_chain, rag_chain)
+
+    chunks = [chunk async for chunk in orch.answer_stream("hi", session_id="stream-session")]
+    assert len(chunks) > 1 and "".join(chunks) == "Future you is proud."
+    assert "Future you is proud." in await orch.memory.render("stream-session")
@@ -0,0 +1,118 @@
+# tests/test_persona.py
+from unittest.mock import MagicMock
+
+from langchain_core.documents import Document
+
+from app.rag.persona import PersonaDigestCache
+from app.rag.processor import DocumentProcessor
+
+
+def make_processor(docs_by_user):
+    """docs_by_user[None] holds the shared documents (ingested without a user_id)."""
+
+    def get_documents(where):
+        if where is not None:
+            return list(docs_by_user.get(where["user_id"], []))
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, **({"user_id": user} if user else {})})
+            for user, docs in docs_by_user.items()
+            for doc in docs
+        ]
+
+    proc = MagicMock(spec=DocumentProcessor)
+    proc.get_documents.side_effect = get_documents
+    return proc
+
+
+def test_digest_is_built_once_and_cached():
+    proc = make_processor(
+        {
+            "u1": [
+                Document(page_content="I run a small bakery. I wake up early. I love it.", metadata={"chunk": 1}),
+                Document(page_content="I reconnected with my brother.", metadata={"chunk": 0}),
+            ]
+        }
+    )
+    cache = PersonaDigestCache(proc)
+
+    digest = cache.get("u1")
+    assert digest == "I reconnected with my brother. I run a small bakery. I wake up early."
+    calls = proc.get_documents.call_count
+    assert cache.get("u1") == digest
+    assert proc.get_documents.call_count == calls
+
+
+def test_digest_respects_max_chars_and_lru():
+    proc = make_processor({f"u{i}": [Document(page_content="x" * 50)] for i in range(3)})
+    cache = PersonaDigestCache(proc, max_users=2, max_chars=20)
+
+    assert cache.get("u0") == "x" * 20
+    cache.get("u1")
+    cache.get("u2")
+    assert len(cache) == 2
+    assert cache.peek("u0") is None
+
+
+def test_invalidate_forces_rebuild():
+    docs = {"u1": [Document(page_content="Old persona.")]}
+    proc = make_processor(docs)
+    cache = PersonaDigestCache(proc)
+    assert cache.get("u1") == "Old persona."
+
+    docs["u1"] = [Document(page_content="New persona.")]
+    assert cache.get("u1") == "Old persona."
+    cache.invalidate("u1")
+    assert cache.get("u1") == "New persona."
+
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_shared_documents_reach_every_user():
+    docs = {None: [Document(page_content="You got through it.")], "u1": [Document(page_content="I paint.")]}
+    proc = make_processor(docs)
+    cache = PersonaDigestCache(proc)
+    assert cache.get("u1") == "I paint. You got through it."
+    assert cache.get("u2") == "You got through it."
+    calls = proc.get_documents.call_count
+    cache.get("u3")
+    assert proc.get_documents.call_count == calls + 1  # the shared chunks are read once, not per user
+
+    docs[None] = [Document(page_content="New shared words.")]
+    cache.invalidate()  # shared documents re-ingested
+    assert cache.get("u1") == "I paint. New shared words."
+
+
+def test_a_build_overlapping_invalidate_is_not_cached():
+    docs = {"u1": [Document(page_content="Old persona.")]}
+    proc = make_processor(docs)
+    cache = PersonaDigestCache(proc)
+    read = proc.get_documents.side_effect
+
+    def re_ingested_during_the_read(where):
+        result = read(where)
+        if where is not None:
+            docs["u1"] = [Document(page_content="New persona.")]
+            cache.invalidate("u1")  # /rag/ingest/ finishes while the old chunks are being digested
+        return result
+
+    proc.get_documents.side_effect = re_ingested_during_the_read
+    assert cache.get("u1") == "Old persona."
+    proc.get_documents.side_effect = read
+    assert cache.get("u1") == "New persona."
+
+
+def test_digest_expires_after_ttl(monkeypatch):
+    # An ingest through the CLI or --in-process never calls invalidate: the TTL bounds how stale a digest gets
+    now = [1000.0]
+    monkeypatch.setattr("app.rag.persona.time.monotonic", lambda: now[0])
+    docs = {"u1": [Document(page_content="Old persona.")], None: [Document(page_content="Shared old.")]}
+    cache = PersonaDigestCache(make_processor(docs), ttl_seconds=60)
+    assert cache.get("u1") == "Old persona. Shared old."
+
+    docs["u1"], docs[None] = [Document(page_content="New persona.")], [Document(page_content="Shared new.")]
+    now[0] += 59
+    assert cache.get("u1") == "Old persona. Shared old."
+    now[0] += 1
+    assert cache.peek("u1") is None
+    assert cache.get("u1") == "New persona. Shared new."
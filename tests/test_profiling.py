@@ -0,0 +1,80 @@
+# tests/test_profiling.py
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from app.api.orchestrator import get_orchestrator
+from app.core.profiling import StackSampler, sign_profile_token, verify_profile_token
+from app.core.settings import get_settings
+
+
+def _busy_for(seconds: float) -> int:
+    deadline, n = time.perf_counter() + seconds, 0
+    while time.perf_counter() < deadline:
+        n += 1
+    return n
+
+
+def test_profile_tokens_expire_and_cannot_be_forged():
+    token = sign_profile_token("secret", ttl_seconds=60, now=1000)
+    assert verify_profile_token("secret", token, now=1059)
+    assert not verify_profile_token("secret", token, now=1061)
+    assert not verify_profile_token("other-secret", token, now=1000)
+    assert not verify_profile_token("secret", "9999999999." + token.split(".")[1], now=1000)
+    assert not verify_profile_token("secret", None) and not verify_profile_token("secret", "garbage")
+
+
+def test_stack_sampler_attributes_time_to_the_busy_function():
+    sampler = StackSampler(interval_seconds=0.001).start()
+    _busy_for(0.1)
+    sampler.stop()
+
+    profile = sampler.speedscope("test")
+    main = next(p for p in profile["profiles"] if p["name"] == "MainThread")
+    frames = profile["shared"]["frames"]
+    busy = [i for i, frame in enumerate(frames) if frame["name"] == "_busy_for"]
+    in_busy = sum(w for stack, w in zip(main["samples"], main["weights"]) if busy[0] in stack)
+    assert in_busy > 0.5 * main["endValue"] > 0
+    assert any(
+        line.startswith("MainThread;") and "_busy_for (test_profiling.py" in line
+        for line in sampler.collapsed().splitlines()
+    )
+
+
+class _BusyOrchestrator:
+    async def answer(self, message, user_id=None, session_id=None):
+        _busy_for(0.05)
+        return {"reply": "done"}
+
+
+def test_profiler_writes_one_file_per_token_request_and_prunes(tmp_path, monkeypatch):
+    from app.main import create_app
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, "SKIP_AUTH", True)
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(settings, "PROFILING_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILING_INTERVAL_MS", 1.0)
+    monkeypatch.setattr(settings, "PROFILING_MAX_FILES", 2)
+    app = create_app()
+    app.dependency_overrides[get_orchestrator] = lambda: _BusyOrchestrator()
+    client = TestClient(app)
+
+    plain = client.post("/chat/text", json={"message": "hello"})
+    assert plain.status_code == 200 and "x-dfm-profile-file" not in plain.headers
+    assert list(tmp_path.iterdir()) == []
+    forged = client.post("/chat/text", json={"message": "hello"}, headers={"X-DFM-Profile": "1.abc"})
+    assert "x-dfm-profile-file" not in forged.headers
+
+    token = sign_profile_token(settings.SECRET_KEY)
+    names = []
+    for _ in range(3):
+        response = client.post("/chat/text", json={"message": "hello"}, headers={"X-DFM-Profile": token})
+        assert response.status_code == 200
+        names.append(response.headers["x-dfm-profile-file"])
+        time.sleep(0.01)  # distinct mtimes for pruning
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(names[1:])
+    profile = json.loads((tmp_path / names[-1]).read_text())
+    assert any(frame["name"] == "_busy_for" for frame in profile["shared"]["frames"])
@@ -1,5 +1,8 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
+from langchain_core.documents import Document
 
 from app.api.orchestrator import RagOrchestrator, get_orchestrator
 from app.main import app
@@ -11,6 +14,8 @@ def stub_processor(monkeypatch):
     monkeypatch.setenv("CHROMA_DIR", "/tmp/chroma_test")
     # stub ingest
     monkeypatch.setattr(DocumentProcessor, "ingest", lambda self, *args, **kwargs: None)
+    monkeypatch.setattr(DocumentProcessor, "delete_documents", lambda self, where: None)
+    monkeypatch.setattr(DocumentProcessor, "get_documents", lambda self, where: [])
 
     # stub summary
     async def fake_sum(self, sid):
@@ -26,10 +31,55 @@ def client():
     return TestClient(app)
 
 
-def test_ingest_text(client):
+@pytest.fixture
+def stored(monkeypatch):
+    """doc_id -> chunks already in the namespace; records delete and ingest calls in order."""
+    chunks, calls = {}, []
+    monkeypatch.setattr(DocumentProcessor, "get_documents", lambda self, where: chunks.get(where["doc_id"], []))
+    monkeypatch.setattr(DocumentProcessor, "delete_documents", lambda self, where: calls.append(("delete", where)))
+    monkeypatch.setattr(
+        DocumentProcessor, "ingest", lambda self, doc_id, *args, **kwargs: calls.append(("ingest", doc_id))
+    )
+    return chunks, calls
+
+
+def test_ingest_text(client, stored):
     res = client.post("/rag/ingest/", data={"namespace": "theory", "doc_id": "d1", "text": "x"})
     assert res.status_code == 200
     assert res.json()["doc_id"] == "d1"
+    assert stored[1] == [("ingest", "d1")]  # nothing to replace
+
+
+def test_replacing_a_shared_document_needs_a_superuser(client, stored):
+    chunks, calls = stored
+    chunks["shared"] = [Document(page_content="old", metadata={"doc_id": "shared"})]
+
+    assert (
+        client.post("/rag/ingest/", data={"namespace": "theory", "doc_id": "shared", "text": "new"}).status_code == 403
+    )
+    assert calls == []
+
+
+def test_reingest_replaces_only_the_owners_chunks(admin_client, stored):
+    chunks, calls = stored
+    chunks["shared"] = [Document(page_content="old", metadata={"doc_id": "shared"})]
+    chunks["mine"] = [Document(page_content="old", metadata={"doc_id": "mine", "user_id": "u1"})]
+    shared = {"namespace": "theory", "doc_id": "shared", "text": "new"}
+
+    assert admin_client.post("/rag/ingest/", data=shared).status_code == 200
+    mine = {"namespace": "future_me", "doc_id": "mine", "text": "new", "user_id": "u1"}
+    assert admin_client.post("/rag/ingest/", data=mine).status_code == 200
+    assert calls == [
+        ("delete", {"doc_id": "shared"}),  # the old chunks go first: a shorter version leaves none behind
+        ("ingest", "shared"),
+        ("delete", {"$and": [{"doc_id": "mine"}, {"user_id": "u1"}]}),
+        ("ingest", "mine"),
+    ]
+
+    calls.clear()
+    assert admin_client.post("/rag/ingest/", data={**mine, "user_id": "u2"}).status_code == 409
+    assert admin_client.post("/rag/ingest/", data={**shared, "doc_id": "mine"}).status_code == 409
+    assert calls == []
 
 
 def test_summarize_session(client):
@@ -52,3 +102,64 @@ def test_ingest_future_me_namespace(client):
     payload = res.json()
     assert payload["namespace"] == "future_me"
     assert payload["doc_id"] == "fm1"
+
+
+@pytest.fixture
+def admin_client(monkeypatch):
+    """An app built with SKIP_AUTH, so the superuser-only routes are open."""
+    from app.core.settings import get_settings
+    from app.main import create_app
+
+    get_settings.cache_clear()
+    monkeypatch.setattr(get_settings(), "SKIP_AUTH", True)
+    instance = create_app()
+    instance.dependency_overrides[get_orchestrator] = lambda: RagOrchestrator()
+    yield TestClient(instance)
+    get_settings.cache_clear()
+
+
+def test_batch_summarize_needs_a_superuser(client):
+    assert client.post("/rag/sessions/summarize", json={"session_ids": ["s1"]}).status_code == 401
+
+
+def test_batch_summarize_streams_ndjson(admin_client, monkeypatch):
+    async def fake_summarize(self, sid):
+        return f"SUM for {sid}", "cached" if sid == "s1" else "full"
+
+    monkeypatch.setattr(RagOrchestrator, "_summarize_session", fake_summarize)
+
+    res = admin_client.post("/rag/sessions/summarize", json={"session_ids": ["s1", "s2", "s1"]})
+
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    lines = sorted((json.loads(line) for line in res.text.splitlines()), key=lambda r: r["session_id"])
+    assert lines == [
+        {"session_id": "s1", "summary": "SUM for s1", "outcome": "cached"},
+        {"session_id": "s2", "summary": "SUM for s2", "outcome": "full"},
+    ]
+
+
+def test_batch_summarize_needs_ids_or_date_range(admin_client):
+    assert admin_client.post("/rag/sessions/summarize", json={}).status_code == 400
+    both = {"session_ids": ["s1"], "since": "2025-01-01T00:00:00"}
+    assert admin_client.post("/rag/sessions/summarize", json=both).status_code == 400
+
+
+def test_per_user_documents_need_that_users_token(client, monkeypatch):
+    from app.core.settings import get_settings
+    from app.main import create_app
+
+    anonymous = {"namespace": "future_me", "doc_id": "fm2", "text": "I am you.", "user_id": "someone"}
+    assert client.post("/rag/ingest/", data=anonymous).status_code == 403
+
+    monkeypatch.setenv("DEMO_MODE", "false")  # registration enabled
+    get_settings.cache_clear()
+    with TestClient(create_app()) as user_client:
+        credentials = {"email": "rag_owner@example.com", "password": "testpassword"}
+        user_id = user_client.post("/auth/register", json=credentials).json()["id"]
+        login = {"username": credentials["email"], "password": credentials["password"]}
+        headers = {"Authorization": f"Bearer {user_client.post('/auth/login', data=login).json()['access_token']}"}
+        own = {**anonymous, "user_id": user_id}
+        assert user_client.post("/rag/ingest/", data=own, headers=headers).status_code == 200
+        assert user_client.post("/rag/ingest/", data=anonymous, headers=headers).status_code == 403
+    get_settings.cache_clear()
@@ -2,6 +2,7 @@
 
 import uuid
 from typing import Any
+from unittest.mock import MagicMock
 
 import pytest
 from fastapi.testclient import TestClient
@@ -126,7 +127,7 @@ async def test_singleton_rag_orchestrator_instance():  # Make the test function
 @pytest.mark.demo_mode(False)  # This test needs registration enabled
 def test_chat_rag_endpoint(client_rag_pipeline: TestClient, monkeypatch):  # Use the renamed fixture
     # Stub Orchestrator.answer with an async function
-    async def fake_answer(self, q):
+    async def fake_answer(self, q, user_id=None, session_id=None):
         return {"reply": "Echo: " + q}  # Return a dictionary
 
     monkeypatch.setattr(Orchestrator, "answer", fake_answer)
@@ -179,3 +180,67 @@ def test_finalize_session_endpoint(client_rag_pipeline: TestClient):  # Use the
     payload = res.json()
     assert payload["session_id"] == session_id
     assert payload["summary"] == f"SUMMARY for {session_id}"
+
+
+# ─── Adaptive retrieval depth ─────────────────────────────────────────
+@pytest.mark.parametrize(
+    "scores, expected_k",
+    [
+        ([0.9, 0.88, 0.85, 0.4, 0.35], 3),  # cut at the large gap after the third chunk
+        ([0.9, 0.85, 0.8, 0.75, 0.7], 4),  # no gap, capped by max_k
+        ([0.2, 0.1], 0),  # nothing above the threshold → no context
+        ([0.9, 0.3], 2),  # gap cut never goes below the floor
+        ([], 0),
+    ],
+)
+def test_select_k(scores, expected_k):
+    from app.rag.processor import select_k
+
+    assert select_k(scores, threshold=0.3, gap=0.15, min_k=2, max_k=4) == expected_k
+
+
+def test_query_adaptive_sends_nothing_for_unrelated_query(monkeypatch):
+    class ScoredStore:
+        def __init__(self, **kwargs):
+            self.results = [
+                (Document(page_content="a"), 0.12),
+                (Document(page_content="b"), 0.1),
+            ]
+
+        def similarity_search_with_relevance_scores(self, query, k=4, **kwargs):
+            return self.results[:k]
+
+    monkeypatch.setattr("app.rag.processor.OpenAIEmbeddings", lambda **kwargs: object())
+    monkeypatch.setattr("app.rag.processor.Chroma", lambda **kwargs: ScoredStore(**kwargs))
+
+    proc = DocumentProcessor(namespace="future_me")
+    assert proc.query("what is the capital of France") == []
+
+    proc.vectordb.results = [(Document(page_content="c"), 0.9), (Document(page_content="d"), 0.85)]
+    assert [doc.page_content for doc in proc.query("my future self")] == ["c", "d"]
+
+
+def test_ingest_upserts_large_documents_in_batches(monkeypatch):
+    monkeypatch.setattr("app.rag.processor.cfg.INGEST_UPSERT_BATCH_SIZE", 3)
+    proc = DocumentProcessor(namespace="test_ns")
+    proc.vectordb = MagicMock(spec=["add_documents"])
+    proc.text_splitter._chunk_size, proc.text_splitter._chunk_overlap = 10, 0
+
+    proc.ingest("big", " ".join(f"word{i:04d}" for i in range(7)))
+
+    calls = proc.vectordb.add_documents.call_args_list
+    assert [len(c.kwargs["ids"]) for c in calls] == [3, 3, 1]
+    assert [i for c in calls for i in c.kwargs["ids"]] == [f"big_{i}" for i in range(7)]
+    assert [d.metadata["chunk"] for c in calls for d in c.args[0]] == list(range(7))
+
+
+def test_k_limits_follow_configured_namespaces(monkeypatch):
+    from app.core.settings import Settings
+
+    monkeypatch.setenv("CHROMA_NAMESPACE_THEORY", "theory_v2")
+    settings = Settings()  # type: ignore[call-arg]
+    assert settings.RAG_K_LIMITS["theory_v2"] == (1, 4) and "theory" not in settings.RAG_K_LIMITS
+
+    monkeypatch.setenv("RAG_K_LIMITS", '{"theory": [1, 3]}')  # the old name: its limits would never apply
+    with pytest.raises(ValueError, match="theory"):
+        Settings()  # type: ignore[call-arg]
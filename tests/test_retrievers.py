@@ -0,0 +1,91 @@
+# tests/test_retrievers.py
+import uuid
+from unittest.mock import MagicMock
+
+import chromadb
+from langchain_core.documents import Document
+
+from app.rag.processor import DocumentProcessor
+from app.rag.retrievers import HierarchicalSessionRetriever, and_filter
+
+
+def test_and_filter():
+    assert and_filter(None, {}) is None
+    assert and_filter({"a": 1}, None) == {"a": 1}
+    assert and_filter({"a": 1}, {"b": 2}) == {"$and": [{"a": 1}, {"b": 2}]}
+
+
+def test_hierarchical_retriever_drills_into_selected_sessions_only():
+    summary_db = MagicMock(spec=DocumentProcessor)
+    summary_db.query_adaptive.return_value = [
+        (Document(page_content="Talked about work stress.", metadata={"session_id": "s2"}), 0.9),
+        (Document(page_content="Also work.", metadata={"session_id": "s2"}), 0.8),
+        (Document(page_content="Sister visit.", metadata={"session_id": "s7"}), 0.7),
+        (Document(page_content="Sleep.", metadata={"session_id": "s9"}), 0.6),
+    ]
+    summary_db.get_documents.return_value = [
+        Document(page_content="summary", metadata={"session_id": sid, "ingested_at": 100.0}) for sid in ("s2", "s7")
+    ]
+    session_db = MagicMock(spec=DocumentProcessor)
+    session_db.query_adaptive.return_value = [(Document(page_content="raw turn", metadata={"session_id": "s2"}), 0.8)]
+
+    retriever = HierarchicalSessionRetriever(
+        summary_processor=summary_db,
+        session_processor=session_db,
+        max_sessions=2,
+        metadata_filter={"user_id": "u1"},
+    )
+    docs = retriever.invoke("work")
+
+    assert [d.page_content for d in docs] == ["Talked about work stress.", "Sister visit.", "raw turn"]
+    summary_db.query_adaptive.assert_called_once_with("work", metadata_filter={"user_id": "u1"})
+    sessions = {"$or": [{"session_id": {"$in": ["s2", "s7"]}}, {"session_id": {"$nin": ["s2", "s7"]}}]}
+    session_db.query_adaptive.assert_called_once_with("work", metadata_filter={"$and": [sessions, {"user_id": "u1"}]})
+
+
+def test_hierarchical_retriever_also_searches_chunks_no_summary_covers():
+    summary_db = MagicMock(spec=DocumentProcessor)
+    summary_db.query_adaptive.return_value = [(Document(page_content="Old job.", metadata={"session_id": "old"}), 0.9)]
+    summary_db.get_documents.return_value = [
+        Document(page_content=f"{sid} summary", metadata={"session_id": sid, "ingested_at": 100.0, "user_id": "u1"})
+        for sid in ("old", "later")
+    ]
+    session_db = MagicMock(spec=DocumentProcessor)
+    session_db.query_adaptive.return_value = []
+    chunks = {  # (session_id, ingested_at) -> reached by the raw search
+        ("old", 50.0): True,  # a selected session
+        ("new", 150.0): True,  # never summarized
+        ("later", 50.0): False,  # covered by the summary of "later"
+        ("later", 150.0): True,  # ingested after that summary
+    }
+
+    HierarchicalSessionRetriever(
+        summary_processor=summary_db, session_processor=session_db, metadata_filter={"user_id": "u1"}
+    ).invoke("work")
+
+    # Run the filter through a real Chroma collection to check both its syntax and what it matches
+    collection = chromadb.EphemeralClient().create_collection(f"raw_{uuid.uuid4().hex}")
+    collection.add(
+        ids=[f"{sid}_{at}" for sid, at in chunks] + ["other_user"],
+        embeddings=[[1.0, 0.0]] * (len(chunks) + 1),
+        metadatas=[{"session_id": sid, "ingested_at": at, "user_id": "u1"} for sid, at in chunks]
+        + [{"session_id": "new", "ingested_at": 150.0, "user_id": "u2"}],
+    )
+    where = session_db.query_adaptive.call_args.kwargs["metadata_filter"]
+    assert sorted(collection.get(where=where)["ids"]) == sorted(
+        f"{sid}_{at}" for (sid, at), hit in chunks.items() if hit
+    )
+
+
+def test_hierarchical_retriever_falls_back_to_raw_search_without_matching_summaries():
+    summary_db = MagicMock(spec=DocumentProcessor)
+    summary_db.query_adaptive.return_value = []
+    session_db = MagicMock(spec=DocumentProcessor)
+    session_db.query_adaptive.return_value = [(Document(page_content="raw turn", metadata={"session_id": "s1"}), 0.8)]
+
+    retriever = HierarchicalSessionRetriever(
+        summary_processor=summary_db, session_processor=session_db, metadata_filter={"user_id": "u1"}
+    )
+
+    assert [d.page_content for d in retriever.invoke("anything")] == ["raw turn"]
+    session_db.query_adaptive.assert_called_once_with("anything", metadata_filter={"user_id": "u1"})
@@ -0,0 +1,97 @@
+# tests/test_tracing.py
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.runnables import RunnableLambda
+
+from app.api.orchestrator import BranchingChain
+from app.core.settings import get_settings
+from app.core.tracing import InMemoryExporter, Tracer, parse_traceparent, tracer
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemoryExporter()
+    tracer.configure(enabled=True, sample_rate=1.0, exporter=exporter)
+    yield exporter
+    tracer.configure(enabled=False)
+
+
+def test_nested_spans_share_trace_and_record_errors():
+    exporter = InMemoryExporter()
+    local = Tracer(exporter, sample_rate=1.0, enabled=True)
+
+    with local.span("outer") as outer:
+        with pytest.raises(ValueError):
+            with local.span("inner", namespace="theory"):
+                raise ValueError("boom")
+
+    inner_span, outer_span = exporter.spans
+    assert inner_span.trace_id == outer_span.trace_id == outer.trace_id
+    assert inner_span.parent_span_id == outer_span.span_id
+    assert inner_span.status == "ERROR" and inner_span.attributes["exception.type"] == "ValueError"
+    assert inner_span.attributes["namespace"] == "theory"
+    assert outer_span.status == "OK" and outer_span.end_time_unix_nano >= outer_span.start_time_unix_nano
+
+
+def test_head_sampling_drops_whole_trace():
+    exporter = InMemoryExporter()
+    local = Tracer(exporter, sample_rate=0.0, enabled=True)
+
+    with local.span("root"):
+        with local.span("child") as child:
+            assert child is not None and child.sampled is False
+
+    assert exporter.spans == []
+
+
+def test_traceparent_continues_remote_trace():
+    remote = parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+    assert remote is not None and remote.sampled
+    assert parse_traceparent("garbage") is None
+
+    exporter = InMemoryExporter()
+    local = Tracer(exporter, sample_rate=0.0, enabled=True)  # the caller's sampling decision wins
+    with local.span("handler", parent=remote):
+        pass
+
+    (span,) = exporter.spans
+    assert span.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert span.parent_span_id == "00f067aa0ba902b7"
+
+
+@pytest.mark.asyncio
+async def test_branching_chain_records_runnable_spans(exporter):
+    rag_chain = RunnableLambda(lambda x: {"answer": x["input"]}, name="rag") | RunnableLambda(lambda x: x)
+    chain = BranchingChain(lambda q: False, crisis_chain=None, rag_chain=rag_chain)
+
+    assert await chain.ainvoke({"query": "hi"}) == {"answer": "hi"}
+
+    by_name = {span.name: span for span in exporter.spans}
+    root = by_name["BranchingChain.ainvoke"]
+    assert root.attributes["dfm.branch"] == "rag"
+    assert by_name["rag"].trace_id == root.trace_id
+    sequence = next(s for s in exporter.spans if s.parent_span_id == root.span_id)
+    assert by_name["rag"].parent_span_id == sequence.span_id
+
+
+def test_request_spans_written_to_jsonl(tmp_path, monkeypatch):
+    from app.main import create_app
+
+    settings = get_settings()
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "TRACING_EXPORT_PATH", str(path))
+    try:
+        res = TestClient(create_app()).get("/ping")
+    finally:
+        tracer.configure(enabled=False)
+
+    assert res.status_code == 200
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    (request_span,) = [s for s in spans if s["name"] == "GET /ping"]
+    assert request_span["attributes"]["http.status_code"] == 200
+    assert request_span["attributes"]["http.route"] == "/ping"
+    assert res.headers["traceparent"].split("-")[1] == request_span["trace_id"]
@@ -0,0 +1,102 @@
+# tests/test_traffic.py
+import json
+
+import httpx
+import pytest
+
+from app.api.orchestrator import get_orchestrator
+from app.clients.replay import RecordedTurn, load_turns, replay, sessions
+from app.core.settings import get_settings
+from app.core.traffic import note_branch, scrub_pii
+
+
+def test_scrub_pii_removes_contact_details_and_long_numbers():
+    text = "Mail me at dana.k+1@example.co.il or call 052-123 4567, see https://x.io/a?b=1 from 10.0.0.12"
+    assert scrub_pii(text) == "Mail me at [EMAIL] or call [NUMBER], see [URL] from [IP]"
+    # Short numbers are kept: they carry meaning (times, ages, counts)
+    assert scrub_pii("I slept 4 hours, woke at 05:30, I'm 27") == "I slept 4 hours, woke at 05:30, I'm 27"
+    assert scrub_pii("ת.ז. 123456782") == "ת.ז. [NUMBER]"
+
+
+class _EchoOrchestrator:
+    async def answer(self, message, user_id=None, session_id=None):
+        note_branch("light" if len(message.split()) < 4 else "rag")
+        return {"reply": f"echo: {message}"}
+
+
+def _recording_app(monkeypatch, path, sample_rate=1.0):
+    from app.main import create_app
+
+    settings = get_settings()
+    monkeypatch.setattr(settings, "SKIP_AUTH", True)
+    monkeypatch.setattr(settings, "TRAFFIC_RECORDING_ENABLED", True)
+    monkeypatch.setattr(settings, "TRAFFIC_RECORDING_PATH", str(path))
+    monkeypatch.setattr(settings, "TRAFFIC_RECORDING_SAMPLE_RATE", sample_rate)
+    app = create_app()
+    app.dependency_overrides[get_orchestrator] = lambda: _EchoOrchestrator()
+    return app
+
+
+@pytest.mark.asyncio
+async def test_recorder_writes_scrubbed_turns_and_replay_reports_them(tmp_path, monkeypatch):
+    path = tmp_path / "traffic.ndjson"
+    app = _recording_app(monkeypatch, path)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://dfm") as client:
+        await client.post("/chat/text", json={"message": "hi", "session_id": "s-1"})
+        await client.post("/chat/text", json={"message": "my number is 0521234567 please help", "session_id": "s-1"})
+        await client.post("/chat/text", json={"message": "", "session_id": "s-2"})  # rejected: 422
+        await client.get("/ping")  # not a chat turn
+
+        lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert [line["message"] for line in lines] == ["hi", "my number is [NUMBER] please help", ""]
+        assert [line["branch"] for line in lines] == ["light", "rag", None]
+        assert [line["status"] for line in lines] == [200, 200, 422]
+        assert lines[0]["session"] == lines[1]["session"] != "s-1"  # pseudonymous, but stable per session
+        assert "echo" not in path.read_text(encoding="utf-8")  # replies are never stored
+
+        turns, skipped = load_turns(str(path))
+        report = await replay(client, turns, speed=0, users=4, repeat=3)
+
+    assert skipped == 0 and len(turns) == 3
+    assert report["overall"]["requests"] == 9
+    assert report["branches"]["rag"]["requests"] == 3 and report["branches"]["rag"]["error_rate"] == 0
+    assert report["branches"]["unknown"]["errors"] == 3  # the empty message is still rejected
+    assert report["statuses"] == {"200": 6, "422": 3}
+    assert report["overall"]["p50_ms"] > 0
+
+
+def test_recorder_samples_whole_sessions(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    path = tmp_path / "traffic.ndjson"
+    client = TestClient(_recording_app(monkeypatch, path, sample_rate=0.5))
+    for session in range(40):
+        for turn in range(3):
+            client.post("/chat/text", json={"message": f"turn {turn}", "session_id": f"session-{session}"})
+
+    per_session = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        session = json.loads(line)["session"]
+        per_session[session] = per_session.get(session, 0) + 1
+    assert 5 < len(per_session) < 35
+    assert set(per_session.values()) == {3}
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_recorded_pacing_scaled_by_speed():
+    turns = [RecordedTurn(100.0, "a", "first"), RecordedTurn(100.4, "a", "second"), RecordedTurn(100.2, "b", "x")]
+    assert [t.message for t in sessions(sorted(turns), repeat=1)["a"]] == ["first", "second"]
+    assert set(sessions(turns, repeat=2)) == {"a-r0", "a-r1", "b-r0", "b-r1"}
+
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content)["message"])
+        return httpx.Response(200, json={"reply": "ok"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://dfm") as client:
+        report = await replay(client, sorted(turns), speed=2.0)  # 0.4s of recording in ~0.2s
+
+    assert sent == ["first", "x", "second"]
+    assert 0.2 <= report["elapsed_s"] < 0.4
+    assert report["overall"]["errors"] == 0
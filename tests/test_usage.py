@@ -0,0 +1,88 @@
+# tests/test_usage.py
+from uuid import uuid4
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from sqlalchemy import text
+
+from app.core.usage import (
+    TokenUsageHandler,
+    UsageKey,
+    UsageTracker,
+    template_version,
+    usage_scope,
+)
+from app.db.models import TokenUsageTable
+from app.db.session import AsyncSessionMaker
+
+PRICES = {"gpt-4o": (0.0025, 0.01), "gpt-4o-mini": (0.00015, 0.0006)}
+
+
+def test_records_are_labelled_from_scope_and_priced_by_model_prefix():
+    tracker = UsageTracker(prices=PRICES)
+    with usage_scope(user_id="u1"), usage_scope(branch="rag", template="system_prompt@abc"):
+        tracker.record("gpt-4o-2024-08-06", "llm", prompt_tokens=1000, completion_tokens=100)
+        tracker.record("gpt-4o-mini", "llm", prompt_tokens=1000)
+        tracker.record("gpt-4o", "context", prompt_tokens=400, namespace="theory", charge=False)
+    tracker.record("gpt-4o", "llm", prompt_tokens=10)  # outside any scope
+
+    pending = tracker.pending()
+    rag = pending[UsageKey("u1", "rag", "-", "system_prompt@abc", "gpt-4o-2024-08-06", "llm")]
+    assert rag.prompt_tokens == 1000 and rag.cost_usd == pytest.approx(0.0035)
+    mini = pending[UsageKey("u1", "rag", "-", "system_prompt@abc", "gpt-4o-mini", "llm")]
+    assert mini.cost_usd == pytest.approx(0.00015)
+    context = pending[UsageKey("u1", "rag", "theory", "system_prompt@abc", "gpt-4o", "context")]
+    assert context.prompt_tokens == 400 and context.cost_usd == 0.0
+    assert UsageKey("-", "-", "-", "-", "gpt-4o", "llm") in pending
+
+
+def test_template_version_changes_with_content():
+    assert template_version("system_prompt", "a").startswith("system_prompt@")
+    assert template_version("system_prompt", "a") != template_version("system_prompt", "b")
+
+
+def test_handler_reads_openai_token_usage():
+    tracker = UsageTracker(prices=PRICES)
+    handler = TokenUsageHandler(tracker)
+    run_id = uuid4()
+    handler.on_chat_model_start({}, [[]], run_id=run_id, metadata={"ls_model_name": "gpt-4o"})
+    handler.on_llm_end(
+        LLMResult(generations=[], llm_output={"token_usage": {"prompt_tokens": 50, "completion_tokens": 7}}),
+        run_id=run_id,
+    )
+    streamed = uuid4()
+    handler.on_chat_model_start({}, [[]], run_id=streamed, metadata={"ls_model_name": "gpt-4o"})
+    message = AIMessage(content="hi", usage_metadata={"input_tokens": 5, "output_tokens": 2, "total_tokens": 7})
+    handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=streamed)
+
+    totals = tracker.pending()[UsageKey("-", "-", "-", "-", "gpt-4o", "llm")]
+    assert (totals.calls, totals.prompt_tokens, totals.completion_tokens) == (2, 55, 9)
+
+
+@pytest.mark.asyncio
+async def test_flush_and_summary():
+    async with AsyncSessionMaker() as session:
+        await session.execute(text(f"DELETE FROM {TokenUsageTable.__tablename__}"))
+        await session.commit()
+    tracker = UsageTracker(prices=PRICES)
+    tracker.record("text-embedding-ada-002", "embedding", 100, namespace="theory")
+    tracker.record("text-embedding-ada-002", "embedding", 50, namespace="future_me")
+    tracker.record("text-embedding-ada-002", "embedding", 25, namespace="theory")
+
+    assert await tracker.flush() == 2
+    assert tracker.pending() == {}
+    tracker.record("gpt-4o", "llm", 10, namespace="theory")  # unflushed: summary flushes first
+
+    rows = await tracker.summary("namespace")
+
+    assert rows[0] == {
+        "namespace": "theory",
+        "calls": 3,
+        "prompt_tokens": 135,
+        "completion_tokens": 0,
+        "cost_usd": 0.000025,
+    }
+    assert rows[1]["namespace"] == "future_me"
+    with pytest.raises(ValueError):
+        await tracker.summary("password")